@@ -0,0 +1,214 @@
+import os
+import re
+from collections import deque
+from difflib import SequenceMatcher
+
+"""
+Description:
+    Aligns requirement texts returned by the LLM with the section text they were extracted from.
+
+    The section is normalized once (whitespace runs collapsed to a single space) while keeping a
+    mapping back to raw character offsets. All requirements are then located in a single pass
+    with an Aho–Corasick automaton. Identical requirement texts are assigned to successive
+    occurrences. Requirements the model reproduced inexactly fall back to a bounded fuzzy match
+    around anchor positions, so no requirement ever triggers a quadratic scan.
+"""
+
+# Minimum similarity (0..1) for a fuzzy match to be accepted
+FUZZY_MIN_RATIO = float(os.environ.get('ALIGNMENT_FUZZY_MIN_RATIO', '0.9'))
+# Maximum number of candidate positions compared per unmatched requirement
+FUZZY_MAX_CANDIDATES = 20
+# Length of the prefix/suffix used to find fuzzy candidates
+_ANCHOR_LENGTH = 16
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_with_map(text):
+    """
+    Collapses whitespace runs into single spaces and strips the text.
+
+    Args:
+        text (str): Raw text.
+
+    Returns:
+        tuple[str, list[int]]: The normalized text and, for each of its characters, the offset
+            of the corresponding character in `text`.
+    """
+    chars = []
+    offsets = []
+    position = 0
+    for match in _WHITESPACE.finditer(text):
+        if match.start() > position:
+            chars.append(text[position:match.start()])
+            offsets.extend(range(position, match.start()))
+        if offsets and match.end() < len(text):
+            # Inner whitespace run: keep one space, mapped to its first character
+            chars.append(' ')
+            offsets.append(match.start())
+        position = match.end()
+    if position < len(text):
+        chars.append(text[position:])
+        offsets.extend(range(position, len(text)))
+    return ''.join(chars), offsets
+
+def fold_case(text):
+    """Lower-cases text without changing its length, so offsets stay valid."""
+    return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher. Finds every occurrence of every pattern in one pass over
+    the text, in time linear in the text length plus the number of matches.
+    """
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns (Iterable[str]): The patterns; each is identified by its position.
+        """
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(pattern_id)
+
+        # Breadth-first construction of failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """
+        Yields every occurrence of every pattern in `text`.
+
+        Yields:
+            tuple[int, int]: (start offset, pattern id), ordered by end offset.
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        patterns = self.patterns
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                yield index - len(patterns[pattern_id]) + 1, pattern_id
+
+def _fuzzy_find(pattern, text, used):
+    """
+    Finds the best approximate occurrence of `pattern` in `text` near positions where its
+    prefix or suffix occurs. Both strings are expected to be normalized and case-folded.
+
+    Returns:
+        tuple[int, int] | None: (start, end) in `text`, or None if nothing is similar enough.
+    """
+    length = len(pattern)
+    anchor = min(_ANCHOR_LENGTH, length)
+    candidates = []
+    for needle, shift in ((pattern[:anchor], 0), (pattern[-anchor:], length - anchor)):
+        position = text.find(needle)
+        while position != -1 and len(candidates) < FUZZY_MAX_CANDIDATES:
+            candidates.append(max(position - shift, 0))
+            position = text.find(needle, position + 1)
+
+    best = None
+    best_ratio = FUZZY_MIN_RATIO
+    slack = max(length // 10, 1)
+    for candidate in dict.fromkeys(candidates):
+        window = text[candidate:candidate + length + slack]
+        matcher = SequenceMatcher(None, pattern, window, autojunk=False)
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        blocks = [block for block in matcher.get_matching_blocks() if block.size]
+        if not blocks:
+            continue
+        start = candidate + blocks[0].b
+        end = candidate + blocks[-1].b + blocks[-1].size
+        ratio = SequenceMatcher(None, pattern, text[start:end], autojunk=False).ratio()
+        if ratio >= best_ratio and (start, end) not in used:
+            best, best_ratio = (start, end), ratio
+    return best
+
+def align_requirements(section_text, requirement_texts):
+    """
+    Locates requirement texts in their section.
+
+    Args:
+        section_text (str): The section text the requirements were extracted from.
+        requirement_texts (list[str]): The requirement texts, in the order returned by the LLM.
+
+    Returns:
+        list[tuple[int, int] | None]: Raw (start, end) offsets in `section_text` per requirement,
+            or None if a requirement could not be located.
+    """
+    normalized_section, offsets = normalize_with_map(section_text)
+    normalized_requirements = [normalize_with_map(text)[0] for text in requirement_texts]
+
+    # One automaton over the distinct requirement texts, one pass over the section
+    patterns = list(dict.fromkeys(text for text in normalized_requirements if text))
+    pattern_ids = {pattern: i for i, pattern in enumerate(patterns)}
+    occurrences = [[] for _ in patterns]
+    if patterns:
+        for start, pattern_id in AhoCorasick(patterns).iter_matches(normalized_section):
+            occurrences[pattern_id].append(start)
+    for starts in occurrences:
+        starts.sort()
+
+    # Identical texts take successive occurrences
+    next_occurrence = [0] * len(patterns)
+    spans = []
+    used = set()
+    unmatched = []
+    for i, text in enumerate(normalized_requirements):
+        pattern_id = pattern_ids.get(text)
+        if pattern_id is not None and next_occurrence[pattern_id] < len(occurrences[pattern_id]):
+            start = occurrences[pattern_id][next_occurrence[pattern_id]]
+            next_occurrence[pattern_id] += 1
+            spans.append((start, start + len(text)))
+            used.add(spans[-1])
+        else:
+            spans.append(None)
+            if text:
+                unmatched.append(i)
+
+    # Bounded fuzzy fallback (case, punctuation or small wording differences)
+    if unmatched:
+        folded_section = fold_case(normalized_section)
+        for i in unmatched:
+            span = _fuzzy_find(fold_case(normalized_requirements[i]), folded_section, used)
+            if span is not None:
+                spans[i] = span
+                used.add(span)
+
+    # Map normalized offsets back to the raw section text
+    aligned = []
+    for span in spans:
+        if span is None:
+            aligned.append(None)
+        else:
+            start, end = span
+            aligned.append((offsets[start], offsets[end - 1] + 1))
+    return aligned
@@ -1,11 +1,35 @@
+import logging
+import os
 import re
-import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
 
+from alignment import align_requirements
 from datamodels import SectionType
-from llm.section_classification import classify_section
+from glossary import Glossary
+from llm.chunking import CHUNK_OVERLAP_TOKENS, MAX_SECTION_TOKENS
+from llm.chunking import extract_requirements_chunked, extract_terms_chunked, is_oversized, split_text
+from llm.batch_extraction import PROMPT_VERSION as BATCH_PROMPT_VERSION
+from llm.batch_extraction import classify_sections_batch, extract_requirements_batch
+from llm.section_classification import PROMPT_VERSION as CLASSIFICATION_PROMPT_VERSION
+from llm.section_classification import (
+    PRECLASSIFY_MIN_CONFIDENCE,
+    classify_locally,
+    classify_section,
+    local_decision_rate,
+    record_decision
+)
+from llm.section_extraction import PROMPT_VERSION as COMBINED_PROMPT_VERSION
+from llm.section_extraction import classify_and_extract
+from llm.tokens import count_tokens
+from llm.terminology_extraction import PROMPT_VERSION as TERMINOLOGY_PROMPT_VERSION
 from llm.terminology_extraction import extract_terms
+from llm.requirement_extraction import PROMPT_VERSION as REQUIREMENTS_PROMPT_VERSION
 from llm.requirement_extraction import extract_requirements
-from lxml import etree
+from metrics import increment, span, timed, timed_iter
+from result_records import RequirementRecord
+from xml_ingest import XmlSection, iter_sections
 
 """
 Description:
@@ -18,8 +42,8 @@ Description:
     or technical specification documents.
 
 Main Features:
-    - Parses XML using lxml for full XPath support.
-    - Locates <section> elements and extracts all contained text.
+    - Streams XML with lxml iterparse (file path, XML string/bytes or binary stream such as an S3 body).
+    - Emits <section> elements with their XPath and all contained text while parsing.
     - Sends the full section text to an LLM.
     - Prompts the LLM to classify each section as normative content, terminology or other.
     - Prompts the LLM to return all requirement-like blocks of text as a JSON array.
@@ -28,7 +52,8 @@ Main Features:
 
 Functions:
     - `extract_requirements(text)`: Sends text to OpenAI Chat API and parses the JSON result.
-    - `find_requirements_in_section_llm(text)`: Wrapper that calls `extract_requirements`.
+    - `find_requirements_in_section_llm(text, xpath)`: Wrapper that calls `extract_requirements`.
+    - `iter_section_results(source)`: Yields per-section results in document order while the document streams in.
 
 Setup:
     - Set your OpenAI API key via environment variable: `OPENAI_API_KEY=your-key`
@@ -39,118 +64,471 @@ Usage:
 Todo: Make generic (not just sections). 
 """
 
-def find_requirements_in_section_llm(section_node, tree):
+logger = logging.getLogger(__name__)
+
+# Bump whenever a change alters the result of a section, so stored section results are not reused
+PIPELINE_VERSION = "2"
+# Maximum number of sections sent to the LLM at the same time
+SECTION_CONCURRENCY = int(os.environ.get('SECTION_CONCURRENCY', '8'))
+# "two_step" (classify, then extract) or "combined" (one LLM call per section)
+PIPELINE_MODE = os.environ.get('PIPELINE_MODE', 'two_step')
+# "own" sends each section's own text only (nested sections are processed on their own),
+# "full" sends all text contained in a section, including its nested sections
+SECTION_TRAVERSAL = os.environ.get('SECTION_TRAVERSAL', 'own')
+# Prefix section titles with the titles of their enclosing sections when classifying
+INCLUDE_PARENT_CONTEXT = os.environ.get('INCLUDE_PARENT_CONTEXT', 'false').lower() == 'true'
+# Consecutive small sections are packed into one LLM request up to this many tokens (0 disables packing;
+# two_step mode only)
+BATCH_TOKEN_BUDGET = int(os.environ.get('BATCH_TOKEN_BUDGET', '4000'))
+# Sections up to this many tokens are considered small enough to be packed
+SMALL_SECTION_TOKENS = int(os.environ.get('SMALL_SECTION_TOKENS', '400'))
+
+class SectionResult(NamedTuple):
+    section: XmlSection
+    requirements: list   # requirement dicts, see `locate_requirements`
+    definitions: list    # ConceptsModel items
+    error: str | None = None  # set if the section could not be processed
+
+def classification_title(section):
+    """
+    Returns the title used to classify a section: its own title, prefixed with the titles of
+    its enclosing sections when INCLUDE_PARENT_CONTEXT is enabled.
+    """
+    if INCLUDE_PARENT_CONTEXT and section.context:
+        return " > ".join([*section.context, section.title])
+    return section.title
+
+@timed('align')
+def locate_requirements(section_text, section_xpath, extracted_requirements, spans=None):
     """
-    Extracts requirement blocks from a given <section> element in an XML tree using a Large Language Model (LLM).
+    Calculates the character offsets of extracted requirements within their section text,
+    using the single-pass alignment engine in `alignment`.
 
     Args:
-        section_node (lxml.etree._Element): The <section> element to process.
-        tree (lxml.etree._ElementTree): The entire parsed XML tree, used for XPath generation.
+        section_text (str): The text that was sent to the LLM.
+        section_xpath (str): The XPath of the <section> in the XML.
+        extracted_requirements (List[RequirementItem]): Requirements returned by the LLM.
+        spans (List[tuple[int, int] | None], optional): Known (start, end) offsets per
+            requirement (e.g. from chunked extraction). Requirements without known offsets
+            are searched for.
 
     Returns:
-        List[dict]: A list of dictionaries with the following keys:
-            - 'requirement': The extracted requirement block (string).
+        List[RequirementRecord]: Compact records (see `result_records`), used like dictionaries
+            with the following keys:
+            - 'requirement_text': The extracted requirement block (string).
+            - 'classification': The requirement type (string).
+            - 'section_relative_start': The start character offset of the requirement in the section text.
+            - 'section_relative_end': The end character offset of the requirement in the section text.
             - 'section_xpath': The XPath of the <section> in the XML.
-            - 'xml_start': The start character offset of the requirement in the section text.
-            - 'xml_end': The end character offset of the requirement in the section text.
-    """    
-    section_text = ''.join(section_node.itertext()).strip()
-    section_xpath = tree.getpath(section_node)
-
-    extracted_requirements = extract_requirements(section_text)
-    time.sleep(5)
+    """
+    spans = list(spans) if spans is not None else [None] * len(extracted_requirements)
+    unknown = [i for i, span in enumerate(spans) if span is None]
+    if unknown:
+        aligned = align_requirements(section_text, [extracted_requirements[i].text for i in unknown])
+        for i, span in zip(unknown, aligned):
+            spans[i] = span
 
     results = []
-
-    for req in extracted_requirements:
+    missing = 0
+    for req, span in zip(extracted_requirements, spans):
         # req is a RequirementItem object
-        req_text = req.text
-        classification = req.classification
-
-        start = section_text.find(req_text)
-        if start != -1:
-            end = start + len(req_text)
-            results.append({
-                'requirement_text': req_text,
-                'classification': classification.value,  # store as string
-                'section_relative_start': start,
-                'section_relative_end': end,
-                'section_xpath': section_xpath
-            })
-        else:
-            print(f"Requirement not found in section {section_xpath}: '{req_text}'")
-            results.append({
-                'requirement_text': req_text,
-                'classification': classification.value,  # store as string
-                'section_relative_start': None,
-                'section_relative_end': None,
-                'section_xpath': section_xpath                
-            })
+        if span is None:
+            missing += 1
+        results.append(RequirementRecord(
+            requirement_text=req.text,
+            classification=req.classification.value,  # store as string
+            section_relative_start=span[0] if span else None,
+            section_relative_end=span[1] if span else None,
+            section_xpath=section_xpath
+        ))
+
+    if missing:
+        logger.info(f"{missing} of {len(results)} requirements not found in section {section_xpath}")
 
     return results
 
-def extract_requirements_from_xml(xml_file_path):
+def find_requirements_in_section_llm(section_text, section_xpath):
     """
-    Parses an XML document, identifies relevant sections, and extracts requirements using an LLM.
+    Extracts requirement blocks from the text of a <section> element using a Large Language Model (LLM).
+    Oversized sections are split into overlapping chunks that are extracted in parallel.
 
     Args:
-        xml_file_path (str): The path to the XML file to be processed.
+        section_text (str): The text of the <section> element.
+        section_xpath (str): The XPath of the <section> in the XML.
 
     Returns:
-        None
+        List[dict]: Requirements with their offsets, see `locate_requirements`.
     """    
-    parser = etree.XMLParser(recover=True, encoding='utf-8')
-    with open(xml_file_path, 'r', encoding='utf-8') as f:
-        xml_data = f.read()
-    root = etree.fromstring(xml_data.encode('utf-8'), parser=parser)
-    tree = root.getroottree()
+    if is_oversized(section_text):
+        with span('extract'):
+            located = extract_requirements_chunked(section_text)
+        return locate_requirements(
+            section_text,
+            section_xpath,
+            [req for req, _ in located],
+            spans=[span for _, span in located]
+        )
 
-    sections = tree.xpath('//section')
-    if not sections:
-        print("No <section> elements found.")
-        return
+    with span('extract'):
+        extracted_requirements = extract_requirements(section_text)
 
-    all_requirements = []
-    all_definitions = []
+    return locate_requirements(section_text, section_xpath, extracted_requirements)
 
-    for section in sections:
-        # Get section title (if present)
-        title_node = section.find('.//title')
-        title = ""
-        if title_node is not None:
-            if title_node.text:
-                title = title_node.text.strip()
+def process_section(section, mode=None):
+    """
+    Classifies a single section and extracts its requirements or concepts.
 
-        # Get section text
-        section_text = " ".join(section.itertext()).strip()
+    Args:
+        section (XmlSection): The section to process.
+        mode (str, optional): "two_step" (classify, then extract) or "combined" (one LLM call
+            for both). Defaults to the PIPELINE_MODE environment variable.
 
+    Returns:
+        tuple[list[dict], list[ConceptsModel]]: The requirements and the definitions found in the section.
+    """
+    title = classification_title(section)
+    section_text = section.text
+    logger.debug(f"Section XPath: '{section.xpath}'")
+
+    # An oversized section is classified from its first chunk and extracted chunk by chunk
+    oversized = is_oversized(section_text)
+    classification_text = split_text(section_text)[0][1] if oversized else section_text
+
+    mode = mode or PIPELINE_MODE
+    if mode == 'combined' and not oversized:
+        category = classify_locally(section_text, title=title)
+        if category is None:
+            # Classification and extraction in one round trip
+            record_decision('llm')
+            with span('classify_extract'):
+                extraction = classify_and_extract(section_text, title=title)
+            if extraction.section_type == SectionType.normative:
+                return locate_requirements(section_text, section.xpath, extraction.requirements), []
+            if extraction.section_type == SectionType.terminology:
+                return [], extraction.concepts
+            logger.debug(f"Skipping section '{title}' ({extraction.section_type})")
+            return [], []
+    elif mode in ('two_step', 'combined'):
         # Classify section type
-        category = classify_section(section_text, title=title)
-        print(f"Section XPath: '{tree.getpath(section)}'")
-        print(f"Section classified as: {category}")
-        time.sleep(3)
+        with span('classify'):
+            category = classify_section(classification_text, title=title)
+    else:
+        raise ValueError(f"Unknown pipeline mode: '{mode}'")
+
+    logger.debug(f"Section classified as: {category}")
 
+    requirements = []
+    definitions = []
+    if category == SectionType.normative:
+        # Find requirements
+        requirements = find_requirements_in_section_llm(section_text, section.xpath)
+    elif category ==  SectionType.terminology:
+        # Find concepts
+        with span('extract'):
+            terms = extract_terms_chunked(section_text) if oversized else extract_terms(section_text)
+        definitions = terms.concepts if terms else []
+    else:
+        logger.debug(f"Skipping section '{title}' ({category})")
+
+    return requirements, definitions
+
+def process_section_batch(sections, mode=None):
+    """
+    Classifies several small sections and extracts their requirements with one LLM request
+    per stage instead of one per section.
+
+    Sections the rules classify confidently skip the classification request. Sections the
+    model leaves out of a batched response fall back to the single-section calls.
+
+    Args:
+        sections (list[XmlSection]): Consecutive small sections.
+        mode (str, optional): Pipeline mode, see `process_section`. The batched requests are
+            two-step ones; in "combined" mode each section gets its own combined request.
+
+    Returns:
+        list[tuple[list[dict], list[ConceptsModel]]]: Requirements and definitions per section,
+            in the order of `sections`.
+    """
+    if (mode or PIPELINE_MODE) == 'combined':
+        return [process_section(section, mode='combined') for section in sections]
+
+    ids = [f"S{i + 1}" for i in range(len(sections))]
+
+    # Classify: rules first, then one request for the undecided sections
+    categories = {}
+    undecided = []
+    for section_id, section in zip(ids, sections):
+        category = classify_locally(section.text, title=classification_title(section))
+        if category is not None:
+            categories[section_id] = category
+        else:
+            undecided.append((section_id, classification_title(section), section.text))
+    with span('classify'):
+        if undecided:
+            categories.update(classify_sections_batch(undecided))
+        for section_id, section in zip(ids, sections):
+            if section_id not in categories:
+                categories[section_id] = classify_section(section.text, title=classification_title(section))
+
+    # Extract requirements of all normative sections in one request
+    normative = [(section_id, section.title, section.text) for section_id, section in zip(ids, sections)
+                 if categories[section_id] == SectionType.normative]
+    with span('extract'):
+        extracted = extract_requirements_batch(normative) if normative else {}
+
+    results = []
+    for section_id, section in zip(ids, sections):
+        category = categories[section_id]
+        logger.debug(f"Section XPath: '{section.xpath}'")
+        logger.debug(f"Section classified as: {category}")
+        requirements = []
+        definitions = []
         if category == SectionType.normative:
-            # Find requirements
-            requirements = find_requirements_in_section_llm(section, tree)
-            all_requirements.extend(requirements)
-        elif category ==  SectionType.terminology:
-            # Find concepts
-            definitions = extract_terms(section_text)
-            all_definitions.extend(definitions)
-            # for item in definitions_list:
-            #     concept_list = item[0]  # take the first element of the tuple
-            #     all_definitions.extend(concept_list.concepts)
+            section_requirements = extracted.get(section_id)
+            if section_requirements is None:
+                with span('extract'):
+                    section_requirements = extract_requirements(section.text)
+            requirements = locate_requirements(section.text, section.xpath, section_requirements)
+        elif category == SectionType.terminology:
+            with span('extract'):
+                terms = extract_terms(section.text)
+            definitions = terms.concepts if terms else []
+        else:
+            logger.debug(f"Skipping section '{section.title}' ({category})")
+        results.append((requirements, definitions))
+
+    return results
+
+def pack_sections(sections, token_budget=None, small_section_tokens=None, mode=None):
+    """
+    Groups consecutive small sections into batches that fit a token budget.
+
+    Args:
+        sections (Iterable[XmlSection]): The sections, as they are parsed.
+        token_budget (int, optional): Maximum number of section tokens per batch.
+            Defaults to BATCH_TOKEN_BUDGET; 0 disables packing.
+        small_section_tokens (int, optional): Sections above this size are always sent alone.
+            Defaults to SMALL_SECTION_TOKENS.
+        mode (str, optional): Pipeline mode, see `process_section`. Packing only applies to
+            "two_step"; in "combined" mode every section is its own unit.
+
+    Yields:
+        list[XmlSection]: Work units; each unit holds one section or a batch of consecutive
+            small sections.
+    """
+    token_budget = BATCH_TOKEN_BUDGET if token_budget is None else token_budget
+    if (mode or PIPELINE_MODE) == 'combined':
+        token_budget = 0
+    small_section_tokens = SMALL_SECTION_TOKENS if small_section_tokens is None else small_section_tokens
+
+    batch = []
+    batch_tokens = 0
+    for section in sections:
+        tokens = count_tokens(section.text)
+        if token_budget <= 0 or tokens > small_section_tokens or tokens > token_budget:
+            if batch:
+                yield batch
+                batch, batch_tokens = [], 0
+            yield [section]
+            continue
+        if batch and batch_tokens + tokens > token_budget:
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(section)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+def process_unit(unit, mode=None):
+    """
+    Processes one work unit from `pack_sections`.
+
+    A failure is reported on every section of the unit instead of aborting the document.
+
+    Returns:
+        list[SectionResult]: Results per section of the unit.
+    """
+    try:
+        if len(unit) == 1:
+            results = [process_section(unit[0], mode=mode)]
         else:
-            print(f"Skipping section '{title}' ({category})")
+            results = process_section_batch(unit, mode=mode)
+    except Exception as e:
+        logger.error(f"Error processing section(s) {', '.join(section.xpath for section in unit)}: {e}")
+        increment('SectionsFailed', len(unit))
+        return [SectionResult(section, [], [], error=str(e)) for section in unit]
+    return [SectionResult(section, requirements, definitions)
+            for section, (requirements, definitions) in zip(unit, results)]
+
+def pipeline_version(mode=None, traversal=None):
+    """
+    Identifies everything that influences the result of a section: the pipeline and prompt
+    versions, the pipeline mode, the section traversal and the settings of classification,
+    packing and chunking.
+    """
+    return "/".join([
+        PIPELINE_VERSION,
+        mode or PIPELINE_MODE,
+        traversal or SECTION_TRAVERSAL,
+        CLASSIFICATION_PROMPT_VERSION,
+        REQUIREMENTS_PROMPT_VERSION,
+        TERMINOLOGY_PROMPT_VERSION,
+        COMBINED_PROMPT_VERSION,
+        BATCH_PROMPT_VERSION,
+        f"context={INCLUDE_PARENT_CONTEXT}",
+        f"preclassify={PRECLASSIFY_MIN_CONFIDENCE}",
+        f"packing={BATCH_TOKEN_BUDGET}:{SMALL_SECTION_TOKENS}",
+        f"chunks={MAX_SECTION_TOKENS}:{CHUNK_OVERLAP_TOKENS}"
+    ])
+
+def reuse_stored_sections(sections, section_store, completed):
+    """
+    Moves sections whose content is already in `section_store` straight into `completed`
+    and yields the others, which still have to be processed.
+    """
+    for section in sections:
+        try:
+            stored = section_store.get(section)
+        except Exception as e:
+            logger.warning(f"Error reading section store: {e}")
+            stored = None
+        if stored is None:
+            yield section
+        else:
+            completed[section.index] = SectionResult(section, *stored)
+
+def count_sections(sections, progress):
+    """
+    Passes sections through while counting them in progress['sectionsParsed']; the count is
+    copied to progress['sectionsTotal'] once the whole document has been parsed.
+    """
+    progress['sectionsParsed'] = 0
+    for section in sections:
+        progress['sectionsParsed'] += 1
+        yield section
+    progress['sectionsTotal'] = progress['sectionsParsed']
+
+def iter_section_results(source, max_workers=None, mode=None, traversal=None, section_store=None, progress=None,
+                         glossary=None):
+    """
+    Streams an XML document through the extraction pipeline.
+
+    Sections are submitted to a thread pool as soon as they have been parsed (leaf-first), so LLM
+    calls start before the whole document has been read. At most `2 * max_workers` work units are in flight,
+    which bounds memory. Results are yielded in document order, with their requirements linked to
+    the terms defined in the sections before them (see `glossary`).
+
+    Args:
+        source (str | bytes | file-like): File path, XML content or binary stream, see `xml_ingest.open_source`.
+        max_workers (int, optional): Maximum number of work units processed at the same time.
+            Defaults to the SECTION_CONCURRENCY environment variable.
+        mode (str, optional): Pipeline mode, see `process_section`.
+        traversal (str, optional): "own" or "full" handling of nested sections, see `xml_ingest`.
+            Defaults to the SECTION_TRAVERSAL environment variable.
+        section_store (SectionStore, optional): Results of previous versions of the document.
+            Unchanged sections are taken from the store; processed sections are added to it.
+        progress (dict, optional): Updated with 'sectionsParsed', the number of sections read
+            from the document so far, and 'sectionsTotal' once the whole document has been read
+            (the parser stays only a few work units ahead of the results).
+        glossary (Glossary, optional): Defined terms to link, e.g. seeded with the glossaries of
+            other documents; the definitions of this document are added to it. Defaults to a
+            new glossary.
+
+    Yields:
+        SectionResult: Each section with its requirements and definitions, or its error.
+    """
+    max_workers = max_workers or SECTION_CONCURRENCY
+    glossary = glossary if glossary is not None else Glossary()
+    in_flight = deque()
+    completed = {}
+    next_index = 0
+
+    def collect(future):
+        for section_result in future.result():
+            completed[section_result.section.index] = section_result
+            if section_store is not None and section_result.error is None:
+                try:
+                    section_store.put(section_result.section, section_result.requirements,
+                                      section_result.definitions)
+                except Exception as e:
+                    logger.warning(f"Error writing section store: {e}")
+
+    def ready():
+        nonlocal next_index
+        while next_index in completed:
+            with span('link_terms'):
+                section_result = glossary.link(completed.pop(next_index))
+            yield section_result
+            next_index += 1
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        sections = timed_iter('parse_xml', iter_sections(source, traversal=traversal or SECTION_TRAVERSAL))
+        if progress is not None:
+            sections = count_sections(sections, progress)
+        if section_store is not None:
+            sections = reuse_stored_sections(sections, section_store, completed)
+        for unit in pack_sections(sections, mode=mode):
+            in_flight.append(executor.submit(process_unit, unit, mode))
+            # Collect finished units; block on the oldest one only when the window is full
+            while in_flight and (in_flight[0].done() or len(in_flight) >= 2 * max_workers):
+                collect(in_flight.popleft())
+            yield from ready()
+
+        while in_flight:
+            collect(in_flight.popleft())
+            yield from ready()
+        yield from ready()
+
+def extract_requirements_from_xml(source, max_workers=None, mode=None, traversal=None, section_store=None):
+    """
+    Parses an XML document, identifies relevant sections, and extracts requirements using an LLM.
+
+    The document is streamed (see `iter_section_results`), sections are sent to the LLM
+    concurrently, bounded by `max_workers`, and consecutive small sections are packed into
+    shared requests (see `pack_sections`). Results are merged back in document order, so the
+    output does not depend on which request finishes first.
+
+    Args:
+        source (str | bytes | file-like): The path to the XML file to be processed, the XML
+            content itself, or a binary stream such as an S3 `StreamingBody`.
+        max_workers (int, optional): Maximum number of sections processed at the same time.
+            Defaults to the SECTION_CONCURRENCY environment variable.
+        mode (str, optional): Pipeline mode, see `process_section`.
+        traversal (str, optional): Handling of nested sections, see `iter_section_results`.
+        section_store (SectionStore, optional): Per-section results of previous versions of the
+            document, see `iter_section_results`.
+
+    Returns:
+        List[dict]: All extracted requirements, in document order.
+    """    
+    all_requirements = []
+    all_definitions = []
+    section_count = 0
+
+    for section_result in iter_section_results(
+            source, max_workers=max_workers, mode=mode, traversal=traversal, section_store=section_store):
+        section_count += 1
+        if section_result.error is not None:
+            logger.warning(f"Section {section_result.section.xpath} failed: {section_result.error}")
+        all_requirements.extend(section_result.requirements)
+        all_definitions.extend(section_result.definitions)
+
+    if not section_count:
+        logger.info("No <section> elements found.")
+        return []
 
     for req in all_requirements:
-        print(f"Requirement text: {req['requirement_text']}\n")
-        print(f"Requirement class: {req['classification']}\n")
-        print(f"Document section (XPath): {req['section_xpath']}")
-        print(f"Start: {req['section_relative_start']}, End: {req['section_relative_end']}")
-        print("-" * 50)
-    print(all_definitions)
+        logger.debug(f"Requirement text: {req['requirement_text']}\n")
+        logger.debug(f"Requirement class: {req['classification']}\n")
+        logger.debug(f"Document section (XPath): {req['section_xpath']}")
+        logger.debug(f"Start: {req['section_relative_start']}, End: {req['section_relative_end']}")
+        logger.debug("-" * 50)
+    logger.debug(f"Definitions: {all_definitions}")
+    logger.info(f"Sections classified without LLM: {local_decision_rate():.0%}")
+    if section_store is not None:
+        logger.info(f"Sections reused from previous versions: {section_store.stats['reused']} of {section_count}")
+
+    return all_requirements
 
 def normalize_text(text):
     """Normalize whitespace for consistent matching."""
@@ -0,0 +1,78 @@
+import functools
+import threading
+
+"""
+Description:
+    Lazily created AWS clients, shared by the handlers.
+
+    boto3 is imported and clients are created on first use, then reused across warm invocations
+    of the same Lambda container. Handlers therefore only pay for the clients their code path
+    actually uses, and importing a handler does not import boto3 at all.
+
+    Creation goes through the default boto3 session, which is not thread-safe, so it is
+    serialized by a lock. Low-level clients may then be shared by threads; Table resources may
+    not, so code running in worker threads (LLM cache, rate limiter, dedup store) uses
+    `get_client('dynamodb')`.
+"""
+
+_clients = {}
+_tables = {}
+_lock = threading.Lock()
+
+def get_client(service_name):
+    """Returns the boto3 client of an AWS service, e.g. 's3', 'sqs' or 'dynamodb'."""
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                import boto3
+                client = _clients[service_name] = boto3.client(service_name)
+    return client
+
+def get_s3_client():
+    return get_client('s3')
+
+def get_sqs_client():
+    return get_client('sqs')
+
+def get_table(table_name):
+    """Returns a boto3 DynamoDB Table resource, to be used from the handler thread only."""
+    table = _tables.get(table_name)
+    if table is None:
+        with _lock:
+            table = _tables.get(table_name)
+            if table is None:
+                import boto3
+                table = _tables[table_name] = boto3.resource('dynamodb').Table(table_name)
+    return table
+
+@functools.lru_cache(maxsize=1)
+def _deserializer():
+    from boto3.dynamodb.types import TypeDeserializer
+    return TypeDeserializer()
+
+def get_item(table_name, key, consistent_read=False):
+    """
+    Reads one item with the low-level DynamoDB client, which is much cheaper to create than
+    the Table resource. Meant for read-only endpoints.
+
+    Args:
+        table_name (str): The table.
+        key (dict[str, str]): The primary key, e.g. {'jobId': '...'} (string attributes only).
+        consistent_read (bool, optional): Strongly consistent read.
+
+    Returns:
+        dict | None: The item with plain Python values (numbers as Decimal, like the Table
+            resource), or None if it does not exist.
+    """
+    response = get_client('dynamodb').get_item(
+        TableName=table_name,
+        Key={name: {'S': value} for name, value in key.items()},
+        ConsistentRead=consistent_read
+    )
+    item = response.get('Item')
+    if item is None:
+        return None
+    deserializer = _deserializer()
+    return {name: deserializer.deserialize(value) for name, value in item.items()}
@@ -0,0 +1,256 @@
+import gzip
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+from app_main import SECTION_TRAVERSAL, SectionResult, process_section
+import metrics
+from glossary import job_glossary
+from llm.batch_api import BatchBackend, BatchPending, record_batch_usage
+from llm.llm_client import get_backend, set_backend
+from work_distribution import complete_job, delete_prefix
+from xml_ingest import iter_sections
+
+"""
+Description:
+    Batch execution mode of asynchronous jobs: the LLM requests of a document go through the
+    provider batch API (see `llm.batch_api`) instead of interactive calls. Jobs without a
+    latency requirement get the batch discount and a separate, much larger quota.
+
+    A job advances in passes. Each pass runs the whole document through the unchanged pipeline
+    against a BatchBackend holding the batch results received so far: sections whose requests
+    are all answered are complete, the others contribute the requests they are waiting for,
+    which are submitted together as the next batch. In two_step mode the first batch holds the
+    classification requests of all sections the rules cannot classify, the second their
+    extraction requests; the third pass completes the document. Sections are processed one by
+    one without packing (`app_main.pack_sections`), as the batch discount does not depend on
+    the number of requests.
+
+    The id of the batch in flight is stored on the job record; `poll_batch_job` (called by the
+    pollBatches function) collects its results and runs the next pass. Batch results
+    accumulate under `batches/<jobId>/` in the uploads bucket until the job is complete.
+
+    Job attributes used:
+        executionMode  'batch'
+        batchId        the batch in flight, removed when its results are claimed
+        batchPending   'pending' while a batch is in flight; key of the sparse index through
+                       which pollBatches finds the waiting jobs (BATCH_PENDING_INDEX)
+        batchPass      number of batches submitted so far
+        batchRequests  number of requests in the batch in flight
+        metrics        job metrics of all passes so far (LLM usage is recorded once per batch,
+                       by the pass that receives its results)
+"""
+
+logger = logging.getLogger(__name__)
+
+# A job still waiting for requests after this many batches is failed (two_step needs two)
+MAX_BATCH_PASSES = 5
+# Global secondary index of the jobs table on batchPending (see serverless.yml)
+BATCH_PENDING_INDEX = "batchPendingIndex"
+
+def batch_prefix(job_id):
+    """S3 key prefix under which the batch results of a job are stored."""
+    return f"batches/{job_id}/"
+
+def load_batch_results(s3_client, bucket, job_id):
+    """Returns the batch results received so far for a job (empty before its first batch)."""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=f"{batch_prefix(job_id)}results.json.gz")
+    except s3_client.exceptions.NoSuchKey:
+        return {}
+    return json.loads(gzip.decompress(response['Body'].read()))
+
+def save_batch_results(s3_client, bucket, job_id, results):
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=f"{batch_prefix(job_id)}results.json.gz",
+        Body=gzip.compress(json.dumps(results, ensure_ascii=False).encode('utf-8')),
+        ContentType='application/json',
+        ContentEncoding='gzip'
+    )
+
+def run_batch_pass(source, results, mode=None, traversal=None, section_store=None):
+    """
+    Runs a document through the pipeline against the batch results received so far.
+
+    Args:
+        source (str | bytes | file-like): See `xml_ingest.open_source`.
+        results (dict[str, dict]): Batch results by request key.
+        mode (str, optional): Pipeline mode, see `app_main.process_section`.
+        traversal (str, optional): Handling of nested sections, see `xml_ingest`.
+        section_store (SectionStore, optional): Unchanged sections are taken from the store;
+            completed sections are added to it.
+
+    Returns:
+        tuple[list[SectionResult] | None, dict[str, dict]]: The section results in document order
+            (None while any section is waiting for a batch) and the requests to submit next.
+    """
+    backend = BatchBackend(results)
+    previous_backend = get_backend()
+    set_backend(backend)
+    section_results = []
+    pending = 0
+    try:
+        for section in iter_sections(source, traversal=traversal or SECTION_TRAVERSAL):
+            stored = None
+            if section_store is not None:
+                try:
+                    stored = section_store.get(section)
+                except Exception as e:
+                    logger.warning(f"Error reading section store: {e}")
+            if stored is not None:
+                section_results.append(SectionResult(section, *stored))
+                continue
+
+            try:
+                requirements, definitions = process_section(section, mode=mode)
+            except BatchPending:
+                pending += 1
+                continue
+            except Exception as e:
+                logger.error(f"Error processing section {section.xpath}: {e}")
+                section_results.append(SectionResult(section, [], [], error=str(e)))
+                continue
+            section_results.append(SectionResult(section, requirements, definitions))
+            if section_store is not None:
+                try:
+                    section_store.put(section, requirements, definitions)
+                except Exception as e:
+                    logger.warning(f"Error writing section store: {e}")
+    finally:
+        set_backend(previous_backend)
+
+    logger.info(f"Batch pass: {len(section_results)} sections complete, {pending} waiting "
+                f"for {len(backend.requests)} requests")
+    # Sections are parsed leaf-first; results are reported in document order
+    section_results.sort(key=lambda section_result: section_result.section.index)
+    return (None if pending else section_results), backend.requests
+
+def advance_batch_job(s3_client, bucket, jobs_table, job, provider, results=None, section_store=None):
+    """
+    Runs the next pass of a batch job: submits the requests it is waiting for as a batch, or
+    writes its results and completes it once no request is left.
+
+    Args:
+        job (dict): The job record ('jobId', 's3Key', 'batchPass').
+        provider (OpenAIBatchProvider | LocalBatchProvider): The batch API.
+        results (dict[str, dict], optional): Batch results; loaded from S3 if not given.
+        section_store (SectionStore, optional): See `run_batch_pass`.
+
+    Returns:
+        str | None: The id of the submitted batch, or None if the job is complete.
+    """
+    job_id = job['jobId']
+    if results is None:
+        results = load_batch_results(s3_client, bucket, job_id)
+    response = s3_client.get_object(Bucket=bucket, Key=job['s3Key'])
+    section_results, requests = run_batch_pass(response['Body'], results, section_store=section_store)
+    job_metrics = metrics.current().to_item(previous=job.get('metrics'))
+
+    if section_results is not None:
+        complete_job(s3_client, bucket, jobs_table, job_id, section_results,
+                     glossary=job_glossary(s3_client, bucket, job), job_metrics=job_metrics)
+        delete_prefix(s3_client, bucket, batch_prefix(job_id))
+        return None
+
+    if int(job.get('batchPass', 0)) >= MAX_BATCH_PASSES:
+        raise RuntimeError(f"Job still waiting for {len(requests)} requests after {MAX_BATCH_PASSES} batches")
+    batch_id = provider.submit(requests)
+    logger.info(f"Submitted batch {batch_id} with {len(requests)} requests for job {job_id}")
+    jobs_table.update_item(
+        Key={'jobId': job_id},
+        UpdateExpression=("SET #s = :status, batchId = :batchId, batchPending = :pending, "
+                          "batchRequests = :requests, batchPass = if_not_exists(batchPass, :zero) + :one, "
+                          "metrics = :metrics, updatedAt = :updatedAt"),
+        ExpressionAttributeNames={"#s": "status"},
+        ExpressionAttributeValues={
+            ':status': 'processing',
+            ':batchId': batch_id,
+            ':pending': 'pending',
+            ':requests': len(requests),
+            ':zero': 0,
+            ':one': 1,
+            ':metrics': job_metrics,
+            ':updatedAt': datetime.now(timezone.utc).isoformat()
+        }
+    )
+    return batch_id
+
+def claim_batch(jobs_table, job_id, batch_id):
+    """
+    Removes the finished batch from the job record (and the job from the batchPending index).
+
+    Returns:
+        bool: True for the single caller that should process the batch results.
+    """
+    try:
+        jobs_table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression="REMOVE batchId, batchPending",
+            ConditionExpression="batchId = :batchId",
+            ExpressionAttributeValues={':batchId': batch_id}
+        )
+    except jobs_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+def poll_batch_job(s3_client, bucket, jobs_table, job, provider, section_store=None):
+    """
+    Checks the batch of a job and, once it has finished, stores its results and runs the next pass.
+
+    Args:
+        job (dict): The job record ('jobId', 's3Key', 'batchId').
+
+    Returns:
+        str: The batch status: 'in_progress', 'completed' or 'failed'.
+
+    Raises:
+        RuntimeError: If the batch failed or expired.
+    """
+    job_id = job['jobId']
+    batch_id = job['batchId']
+    status = provider.status(batch_id)
+    if status == 'in_progress' or not claim_batch(jobs_table, job_id, batch_id):
+        return status
+    if status == 'failed':
+        raise RuntimeError(f"Batch {batch_id} failed")
+
+    batch_results = provider.results(batch_id)
+    record_batch_usage(batch_results)
+    results = load_batch_results(s3_client, bucket, job_id)
+    results.update(batch_results)
+    save_batch_results(s3_client, bucket, job_id, results)
+    advance_batch_job(s3_client, bucket, jobs_table, job, provider, results=results, section_store=section_store)
+    return status
+
+def extract_requirements_batched(source, provider, mode=None, traversal=None, poll_interval=30):
+    """
+    Local equivalent of a batch job: passes and batches are run until the document is complete.
+
+    Args:
+        source (str | bytes): File path or XML content (read once per pass).
+        provider (OpenAIBatchProvider | LocalBatchProvider): The batch API.
+        poll_interval (float): Seconds between status checks of a batch in flight.
+
+    Returns:
+        tuple[list[SectionResult], int]: All section results in document order and the number
+            of batches submitted.
+    """
+    results = {}
+    batches = 0
+    while True:
+        section_results, requests = run_batch_pass(source, results, mode=mode, traversal=traversal)
+        if section_results is not None:
+            return section_results, batches
+        if batches >= MAX_BATCH_PASSES:
+            raise RuntimeError(f"Still waiting for {len(requests)} requests after {MAX_BATCH_PASSES} batches")
+        batch_id = provider.submit(requests)
+        batches += 1
+        while (status := provider.status(batch_id)) == 'in_progress':
+            time.sleep(poll_interval)
+        if status == 'failed':
+            raise RuntimeError(f"Batch {batch_id} failed")
+        batch_results = provider.results(batch_id)
+        record_batch_usage(batch_results)
+        results.update(batch_results)
@@ -0,0 +1,65 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alignment import align_requirements
+
+"""
+Micro-benchmark of requirement-to-offset alignment on sections with hundreds of requirements.
+
+Compares the previous approach (one `str.find` per requirement, first occurrence only, exact
+text only) with `alignment.align_requirements`, and reports how many requirements each locates.
+
+Usage:
+    python benchmarks/bench_alignment.py [requirements_per_section ...]
+"""
+
+VERBS = ["shall", "should", "may", "shall not", "must"]
+WORDS = ["widget", "lid", "housing", "connector", "label", "surface", "cable", "panel", "sensor", "frame"]
+
+def make_section(requirement_count, seed=0):
+    """Builds a section with filler text, repeated boilerplate rules and LLM-style whitespace drift."""
+    rng = random.Random(seed)
+    paragraphs = []
+    requirements = []
+    for i in range(requirement_count):
+        if i % 10 == 9:
+            # Boilerplate repeated verbatim across the section
+            text = "The manufacturer shall keep records of all tests."
+        else:
+            text = f"The {rng.choice(WORDS)} {rng.choice(VERBS)} comply with clause {i}.{rng.randint(1, 9)} of this part."
+        filler = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30)))
+        # The XML text has line breaks and double spaces; the LLM returns single-spaced text
+        paragraphs.append(f"{filler}.\n   {text.replace(' ', '  ', 1)}")
+        requirements.append(text)
+    return "\n\n".join(paragraphs), requirements
+
+def naive_alignment(section_text, requirement_texts):
+    spans = []
+    for text in requirement_texts:
+        start = section_text.find(text)
+        spans.append((start, start + len(text)) if start != -1 else None)
+    return spans
+
+def bench(function, section_text, requirements, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        spans = function(section_text, requirements)
+        best = min(best, time.perf_counter() - start)
+    located = sum(span is not None for span in spans)
+    distinct = len({span for span in spans if span is not None})
+    return best, located, distinct
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 300, 1000]
+    print(f"{'reqs':>6} {'chars':>8} | {'naive ms':>9} {'found':>6} {'distinct':>8} | {'aligned ms':>10} {'found':>6} {'distinct':>8}")
+    for size in sizes:
+        section_text, requirements = make_section(size)
+        naive = bench(naive_alignment, section_text, requirements)
+        aligned = bench(align_requirements, section_text, requirements)
+        print(f"{size:>6} {len(section_text):>8} | {naive[0] * 1000:>9.2f} {naive[1]:>6} {naive[2]:>8} | "
+              f"{aligned[0] * 1000:>10.2f} {aligned[1]:>6} {aligned[2]:>8}")
@@ -0,0 +1,91 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import Deduplicator, MemoryDedupStore
+
+"""
+Benchmark of the near-duplicate detection in `dedup` on synthetic requirements.
+
+Generates `--originals` distinct requirements and `--variants` restatements of each (clause
+numbering, casing, punctuation and one changed word, as in the editions of a standard series),
+shuffles them into jobs of `--job-size` results and annotates them job by job with a memory
+store. Reports the throughput per 10% of the corpus (flat when lookups do not grow with the
+corpus), the fraction of variants in the cluster of their original (recall) and the number of
+clusters holding requirements of different originals (false merges).
+
+Usage:
+    python benchmarks/bench_dedup.py --originals 50000 --variants 3
+"""
+
+VOCABULARY = [f"w{i}" for i in range(300)]
+VERBS = ["shall", "should", "may", "shall not", "must"]
+
+def original(rng):
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(12, 40))]
+    words.insert(rng.randint(1, 4), rng.choice(VERBS))
+    return "The " + " ".join(words) + "."
+
+def variant(rng, text):
+    words = text.split()
+    words[rng.randrange(1, len(words))] = rng.choice(VOCABULARY)
+    text = " ".join(words)
+    if rng.random() < 0.5:
+        text = text.upper() if rng.random() < 0.1 else text.replace(".", ";")
+    return f"{rng.randint(1, 20)}.{rng.randint(1, 9)}.{rng.randint(1, 9)} {text}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--originals', type=int, default=20000, help='distinct requirements')
+    parser.add_argument('--variants', type=int, default=3, help='near-duplicate restatements per requirement')
+    parser.add_argument('--job-size', type=int, default=1000, help='results per job')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = []
+    for i in range(args.originals):
+        text = original(rng)
+        corpus.append((i, text))
+        corpus.extend((i, variant(rng, text)) for _ in range(args.variants))
+    rng.shuffle(corpus)
+
+    store = MemoryDedupStore()
+    cluster_of = []
+    step = max(1, len(corpus) // 10)
+    print(f"{len(corpus)} requirements ({args.originals} originals x {1 + args.variants})")
+    print(f"{'annotated':>10} {'req/s':>8}")
+    start = time.perf_counter()
+    step_start = start
+    for job, offset in enumerate(range(0, len(corpus), args.job_size)):
+        deduplicator = Deduplicator(store, f"job-{job}")
+        for position, (_, text) in enumerate(corpus[offset:offset + args.job_size]):
+            result = {'requirement_text': text, 'section_xpath': '/doc[1]/section[1]'}
+            deduplicator.annotate([result], position)
+            cluster_of.append(result['cluster_id'])
+            if len(cluster_of) % step == 0:
+                now = time.perf_counter()
+                print(f"{len(cluster_of):>10} {step / (now - step_start):>8.0f}")
+                step_start = now
+    elapsed = time.perf_counter() - start
+
+    # Recall: results sharing the most common cluster of their original
+    by_original = {}
+    for (i, _), cluster in zip(corpus, cluster_of):
+        by_original.setdefault(i, []).append(cluster)
+    in_main_cluster = sum(max(clusters.count(c) for c in set(clusters)) for clusters in by_original.values())
+    originals_of_cluster = {}
+    for (i, _), cluster in zip(corpus, cluster_of):
+        originals_of_cluster.setdefault(cluster, set()).add(i)
+    false_merges = sum(1 for originals in originals_of_cluster.values() if len(originals) > 1)
+
+    print(f"total {elapsed:.1f} s, {len(corpus) / elapsed:.0f} req/s")
+    print(f"clusters {len(originals_of_cluster)} (ideal {args.originals}), "
+          f"recall {in_main_cluster / len(corpus):.3f}, false merges {false_merges}")
+
+if __name__ == '__main__':
+    main()
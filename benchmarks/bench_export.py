@@ -0,0 +1,80 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export import S3MultipartUpload, export_rows
+from result_records import RequirementRecord
+
+"""
+Benchmark of the streaming export in `export`: time and peak memory of exporting growing
+numbers of generated results in each format, through an `S3MultipartUpload` whose S3 client
+discards the parts. Peak memory should stay flat as the number of results grows (one batch
+of rows plus one part), unlike the previous CSV helpers, which needed the full result list.
+Formats that need pyarrow are skipped when it is not installed.
+
+Usage:
+    python benchmarks/bench_export.py --sizes 10000,100000,400000
+"""
+
+WORDS = ["widget", "lid", "housing", "connector", "label", "surface", "cable", "panel", "sensor", "frame"]
+
+class DiscardingS3:
+    """S3 client stub counting the bytes of multipart uploads."""
+
+    def __init__(self):
+        self.uploaded = 0
+
+    def create_multipart_upload(self, **kwargs):
+        return {'UploadId': 'benchmark'}
+
+    def upload_part(self, Body, **kwargs):
+        self.uploaded += len(Body)
+        return {'ETag': str(kwargs['PartNumber'])}
+
+    def complete_multipart_upload(self, **kwargs):
+        pass
+
+    def abort_multipart_upload(self, **kwargs):
+        pass
+
+def generate(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        text = f"The {rng.choice(WORDS)} shall be {rng.choice(WORDS)}-compatible according to clause {rng.randint(1, 99)} ({i})."
+        record = RequirementRecord(text, 'requirement', 0, len(text), f"/doc/section[{i // 400 + 1}]/section[{i // 20 % 20 + 1}]")
+        record['defined_terms'] = [{'term': WORDS[i % 10], 'start': 4, 'end': 4 + len(WORDS[i % 10])}]
+        yield record
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,400000', help='comma-separated numbers of results')
+    parser.add_argument('--formats', default='csv:gzip,jsonl:gzip,parquet:zstd,arrow:none')
+    args = parser.parse_args()
+
+    print(f"{'format':>14} {'results':>9} {'seconds':>8} {'rows/s':>9} {'MiB out':>8} {'peak MiB':>9}")
+    for spec in args.formats.split(','):
+        format, _, compression = spec.partition(':')
+        for size in (int(value) for value in args.sizes.split(',')):
+            s3_client = DiscardingS3()
+            tracemalloc.start()
+            start = time.perf_counter()
+            try:
+                with S3MultipartUpload(s3_client, 'bucket', 'key') as upload:
+                    export_rows(generate(size), upload, format, compression=compression)
+            except RuntimeError as e:
+                tracemalloc.stop()
+                print(f"{spec:>14} skipped ({e})")
+                break
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{spec:>14} {size:>9} {elapsed:>8.2f} {size / elapsed:>9.0f} "
+                  f"{s3_client.uploaded / 2**20:>8.1f} {peak / 2**20:>9.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from glossary import Glossary
+
+"""
+Benchmark of term linking in `glossary` for growing glossaries.
+
+For each glossary size, builds a glossary of random one- to three-word terms (a third with an
+abbreviation), then links `--requirements` synthetic requirements that use some of the terms.
+Reports the compile time of the automaton and the linking throughput. The scan is linear in the
+text; a larger glossary only costs the cache misses of a larger automaton.
+
+The last column is the time to link a document with `--sections` terminology sections (20 terms
+each, followed by a few requirements) against a glossary seeded with the generated one. Only
+the document's own entries are recompiled per terminology section, so it should hardly depend
+on the size of the seed.
+
+Usage:
+    python benchmarks/bench_glossary.py --sizes 1000,10000,50000 --requirements 20000 --sections 50
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000', help='comma-separated glossary sizes')
+    parser.add_argument('--requirements', type=int, default=20000, help='requirements linked per size')
+    parser.add_argument('--sections', type=int, default=50, help='terminology sections of the seeded document')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Filler words and term words are disjoint, so every requirement uses the same number of terms
+    vocabulary = [f"{rng.choice('bcdfgklmnprst')}{rng.choice('aeiou')}{rng.choice('lnrst')}{i}" for i in range(20000)]
+    term_vocabulary = [f"{word}x" for word in vocabulary]
+
+    print(f"{'entries':>8} {'compile s':>10} {'req/s':>8} {'terms/req':>10} {'seeded doc s':>13}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        definitions = []
+        for i in range(size):
+            term = " ".join(rng.choice(term_vocabulary) for _ in range(rng.randint(1, 3)))
+            abbreviations = [f"T{i}"] if i % 3 == 0 else []
+            definitions.append({'term': term, 'definition': f"definition {i}", 'abbreviations': abbreviations})
+        requirements = []
+        for _ in range(args.requirements):
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(15, 40))]
+            for _ in range(3):
+                words.insert(rng.randrange(len(words)), rng.choice(definitions)['term'])
+            requirements.append({'requirement_text': "The " + " ".join(words) + " shall apply."})
+
+        glossary = Glossary()
+        glossary.add(definitions)
+        start = time.perf_counter()
+        glossary.find_terms("compile")
+        compiled = time.perf_counter() - start
+
+        start = time.perf_counter()
+        glossary.annotate(requirements)
+        elapsed = time.perf_counter() - start
+        terms = sum(len(requirement['defined_terms']) for requirement in requirements)
+
+        seeded = Glossary()
+        seeded.update(glossary)
+        start = time.perf_counter()
+        for section in range(args.sections):
+            seeded.add({'term': f"{rng.choice(term_vocabulary)} {section} {i}", 'definition': "own", 'abbreviations': []}
+                       for i in range(20))
+            seeded.annotate(requirements[section * 5:section * 5 + 5])
+        seeded_elapsed = time.perf_counter() - start
+        print(f"{len(glossary):>8} {compiled:>10.2f} {len(requirements) / elapsed:>8.0f} "
+              f"{terms / len(requirements):>10.1f} {seeded_elapsed:>13.2f}")
+
+if __name__ == '__main__':
+    main()
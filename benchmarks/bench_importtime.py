@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+"""
+Cold-start import cost of each Lambda handler, measured with `python -X importtime`.
+
+Every handler is imported in a fresh interpreter (as in a new Lambda container) with dummy
+environment variables. Reports the cumulative import time of the handler module (median of
+several runs) and the heaviest modules it pulls in, so regressions such as an eager SDK import
+in a read endpoint show up immediately.
+
+Usage:
+    python benchmarks/bench_importtime.py [handler_module ...] [--repeat N] [--top N]
+"""
+
+HANDLERS = [
+    'handler_get_results',
+    'handler_submit_job',
+    'handler_parse_sync',
+    'handler_parse_job',
+    'handler_section_worker',
+]
+
+ENVIRONMENT = {
+    'JOBS_TABLE': 'bench-jobs',
+    'UPLOADS_BUCKET': 'bench-uploads',
+    'OPENAI_API_KEY': 'bench',
+    'LLM_CACHE': 'memory',
+}
+
+def import_times(module):
+    """
+    Imports `module` in a fresh interpreter.
+
+    Returns:
+        dict[str, tuple[int, int]]: (self, cumulative) import time in microseconds per module.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT,
+        env=dict(os.environ, **ENVIRONMENT),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+def bench(module, repeat=5, top=5):
+    runs = [import_times(module) for _ in range(repeat)]
+    totals = sorted(run[module][1] for run in runs)
+    median = totals[len(totals) // 2]
+    # Heaviest top-level packages of the median run
+    run = next(run for run in runs if run[module][1] == median)
+    packages = {}
+    for name, (self_us, _) in run.items():
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    heaviest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return median, heaviest
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    repeat = 5
+    top = 5
+    if '--repeat' in args:
+        i = args.index('--repeat')
+        repeat = int(args[i + 1])
+        del args[i:i + 2]
+    if '--top' in args:
+        i = args.index('--top')
+        top = int(args[i + 1])
+        del args[i:i + 2]
+
+    print(f"{'handler':<24} {'import ms':>10} | heaviest packages (self ms)")
+    for module in args or HANDLERS:
+        try:
+            median, heaviest = bench(module, repeat=repeat, top=top)
+        except RuntimeError as e:
+            print(f"{module:<24} {'n/a':>10} | {e}")
+            continue
+        packages = ", ".join(f"{name} {us / 1000:.1f}" for name, us in heaviest)
+        print(f"{module:<24} {median / 1000:>10.1f} | {packages}")
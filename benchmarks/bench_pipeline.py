@@ -0,0 +1,113 @@
+import argparse
+import contextlib
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Measure the pipeline, not the response cache
+os.environ.setdefault('LLM_CACHE', 'none')
+
+from app_main import iter_section_results
+from benchmarks.corpus import generate_document
+from llm.backends import FakeBackend, ReplayBackend
+from llm.llm_client import set_backend
+from llm.rate_limiter import MemoryRateStore, RateLimiter, set_rate_limiter
+from metrics import start_job
+
+"""
+Offline end-to-end benchmark of `extract_requirements_from_xml` with a fake LLM backend.
+
+Synthetic documents (see `benchmarks/corpus.py`) are processed one after the other. Reports
+sections/s, p50/p95 job latency, time to the first section result (the time to first byte of
+streamed /parse/sync responses), peak RSS, LLM calls and tokens per document, and the time
+per pipeline stage (see `metrics`). Use `--replay` to answer requests from a recorded trace
+(LLM_BACKEND=record:<path>) instead of the fake responses.
+
+Usage:
+    python benchmarks/bench_pipeline.py --docs 5 --sections 200 --latency 0.2 --latency-p95 0.8
+"""
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=5, help='number of documents')
+    parser.add_argument('--sections', type=int, default=200, help='sections per document')
+    parser.add_argument('--depth', type=int, default=3, help='maximum section nesting depth')
+    parser.add_argument('--words', type=int, default=80, help='average words per section')
+    parser.add_argument('--latency', type=float, default=0.05, help='median LLM latency in seconds')
+    parser.add_argument('--latency-p95', type=float, default=None, help='95th percentile LLM latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of LLM calls failing with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of LLM calls failing with 429')
+    parser.add_argument('--rpm', type=int, default=None, help='rate limit in requests per minute (default: none)')
+    parser.add_argument('--tpm', type=int, default=None, help='rate limit in tokens per minute')
+    parser.add_argument('--workers', type=int, default=None, help='SECTION_CONCURRENCY override')
+    parser.add_argument('--mode', default=None, help='pipeline mode (two_step or combined)')
+    parser.add_argument('--replay', default=None, help='replay a recorded trace instead of fake responses')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    backend = FakeBackend(
+        latency_p50=args.latency,
+        latency_p95=args.latency_p95,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed
+    )
+    if args.replay:
+        backend = ReplayBackend(args.replay, fallback=backend)
+    set_backend(backend)
+    set_rate_limiter(RateLimiter(MemoryRateStore(), rpm=args.rpm, tpm=args.tpm, headroom=1)
+                     if args.rpm or args.tpm else None)
+
+    documents = [generate_document(args.sections, args.depth, args.words, seed=args.seed + i) for i in range(args.docs)]
+    latencies = []
+    first_results = []
+    calls = []
+    requirements = 0
+    stages = {}
+    tokens = 0
+    cost = 0.0
+    failed = 0
+    with open(os.devnull, 'w') as devnull:
+        for document in documents:
+            calls_before = backend.stats['calls']
+            job_metrics = start_job()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(devnull):
+                for section_result in iter_section_results(document, max_workers=args.workers, mode=args.mode):
+                    if len(first_results) < len(latencies) + 1:
+                        first_results.append(time.perf_counter() - start)
+                    requirements += len(section_result.requirements)
+            latencies.append(time.perf_counter() - start)
+            calls.append(backend.stats['calls'] - calls_before)
+            summary = job_metrics.summary()
+            for name, stage in summary['stages'].items():
+                stages[name] = stages.get(name, 0) + stage['ms']
+            tokens += summary['llm']['inputTokens'] + summary['llm']['outputTokens']
+            cost += summary['llm']['costUsd']
+            failed += summary['counters'].get('SectionsFailed', 0)
+
+    total_sections = args.docs * args.sections
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"documents:          {args.docs} x {args.sections} sections (depth {args.depth}, ~{args.words} words)")
+    print(f"sections/s:         {total_sections / sum(latencies):.1f}")
+    print(f"job latency p50:    {percentile(latencies, 50):.2f} s")
+    print(f"job latency p95:    {percentile(latencies, 95):.2f} s")
+    print(f"first result p50:   {percentile(first_results, 50):.2f} s")
+    print(f"peak RSS:           {peak_rss_mb:.0f} MB")
+    print(f"LLM calls/document: {sum(calls) / len(calls):.1f}")
+    print(f"LLM errors / 429s:  {backend.stats['errors']} / {backend.stats['rate_limited']}")
+    print(f"failed sections:    {failed}")
+    print(f"LLM tokens/document: {tokens / args.docs:.0f} (${cost / args.docs:.4f})")
+    print(f"requirements:       {requirements}")
+    print("stage time (summed over threads, ms/document):")
+    for name, ms in sorted(stages.items(), key=lambda item: -item[1]):
+        print(f"  {name:<18}{ms / args.docs:>10.0f}")
+
+if __name__ == "__main__":
+    main()
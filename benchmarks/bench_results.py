@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_records import RecordEncoder, RequirementRecord
+
+"""
+Benchmark of the result representation: memory and JSON encoding time of `--requirements`
+results as plain dicts versus `result_records.RequirementRecord`s.
+
+Results are generated like the pipeline does (20 per section sharing one XPath string, each
+with its defined terms). Encoding is timed as JSON Lines (results shards) and as one JSON array
+(the /parse/sync body), with `json.dumps` on the dicts and with `RecordEncoder` on the records;
+both produce identical output. With boto3 installed, the DynamoDB type serializer (how results
+were stored on job items before the S3 shards) is timed as well.
+
+Usage:
+    python benchmarks/bench_results.py --requirements 50000
+"""
+
+WORDS = ["widget", "lid", "housing", "connector", "label", "surface", "cable", "panel", "sensor", "frame"]
+CLASSIFICATIONS = ["requirement", "recommendation", "permission", "possibility"]
+
+def generate(count, factory, seed=0):
+    rng = random.Random(seed)
+    results = []
+    for i in range(count):
+        if i % 20 == 0:
+            xpath = f"/doc/section[{i // 400 + 1}]/section[{i // 20 % 20 + 1}]"
+        text = f"The {rng.choice(WORDS)} shall be {rng.choice(WORDS)}-compatible according to clause {rng.randint(1, 99)} ({i})."
+        start = rng.randint(0, 5000)
+        result = factory(
+            requirement_text=text,
+            classification=CLASSIFICATIONS[i % 4],
+            section_relative_start=start,
+            section_relative_end=start + len(text),
+            section_xpath=xpath
+        )
+        result['defined_terms'] = [{'term': WORDS[i % 10], 'start': 4, 'end': 4 + len(WORDS[i % 10])}]
+        results.append(result)
+    return results
+
+def measure_memory(count, factory):
+    tracemalloc.start()
+    results = generate(count, factory)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, results
+
+def best_of(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function()
+        times.append(time.perf_counter() - start)
+    return min(times), output
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requirements', type=int, default=50000)
+    args = parser.parse_args()
+
+    dict_memory, dicts = measure_memory(args.requirements, dict)
+    record_memory, records = measure_memory(args.requirements, RequirementRecord)
+    print(f"{args.requirements} results")
+    print(f"memory             dicts {dict_memory / 2**20:7.1f} MiB   records {record_memory / 2**20:7.1f} MiB"
+          f"   ({1 - record_memory / dict_memory:.0%} less)")
+
+    dict_lines_time, dict_lines = best_of(
+        lambda: "".join(json.dumps(result, ensure_ascii=False) + "\n" for result in dicts))
+    record_lines_time, record_lines = best_of(lambda: RecordEncoder().encode_lines(records))
+    assert dict_lines == record_lines
+    print(f"JSON Lines         dicts {dict_lines_time * 1000:7.1f} ms    records {record_lines_time * 1000:7.1f} ms"
+          f"    ({dict_lines_time / record_lines_time:.1f}x)")
+
+    dict_array_time, dict_array = best_of(lambda: json.dumps({'results': dicts}, ensure_ascii=False))
+    record_array_time, record_array = best_of(lambda: '{"results": ' + RecordEncoder().encode_array(records) + '}')
+    assert dict_array == record_array
+    print(f"JSON array         dicts {dict_array_time * 1000:7.1f} ms    records {record_array_time * 1000:7.1f} ms"
+          f"    ({dict_array_time / record_array_time:.1f}x)")
+
+    try:
+        from boto3.dynamodb.types import TypeSerializer
+    except ImportError:
+        print("DynamoDB serializer skipped (boto3 not installed)")
+        return
+    serializer = TypeSerializer()
+    serializer_time, _ = best_of(lambda: serializer.serialize(dicts), repeat=1)
+    print(f"DynamoDB serializer dicts {serializer_time * 1000:6.1f} ms")
+
+if __name__ == '__main__':
+    main()
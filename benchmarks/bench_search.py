@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from benchmarks.bench_pipeline import percentile
+from llm.embeddings import normalize_rows
+from search_index import CLASSIFICATIONS, IndexWriter, VectorIndex, merge_indexes
+
+"""
+Benchmark of `search_index` queries on a synthetic corpus of clustered unit vectors.
+
+Builds a flat index of `--rows` vectors, merges it into an IVF index and reports the query
+latency (p50/p95) of both, with and without a classification filter, and the recall@k of the
+IVF index against the exact (flat) results.
+
+Usage:
+    python benchmarks/bench_search.py --rows 1000000 --dims 256 --nprobe 16
+"""
+
+def build_corpus(directory, rows, dims, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((clusters, dims)).astype(np.float32))
+    writer = IndexWriter(directory, dims, 'synthetic')
+    for start in range(0, rows, 65536):
+        n = min(65536, rows - start)
+        vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dims)).astype(np.float32) / np.sqrt(dims)
+        records = [{'jobId': 'bench', 'position': start + i, 'classification': CLASSIFICATIONS[(start + i) % len(CLASSIFICATIONS)]}
+                   for i in range(n)]
+        writer.add(normalize_rows(vectors), records)
+    writer.close()
+    return VectorIndex(directory), centers
+
+def time_queries(index, queries, k, classifications=None, nprobe=None):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([row for _, row in index.search(query, k, classifications, nprobe)])
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000, help='number of indexed requirements')
+    parser.add_argument('--dims', type=int, default=256, help='embedding dimensions')
+    parser.add_argument('--clusters', type=int, default=2000, help='topics in the synthetic corpus')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        flat, centers = build_corpus(os.path.join(directory, 'flat'), args.rows, args.dims, args.clusters, args.seed)
+        print(f"corpus:            {args.rows} x {args.dims} ({flat.vectors.nbytes / 2**20:.0f} MB), "
+              f"{time.perf_counter() - start:.1f} s")
+        start = time.perf_counter()
+        ivf = merge_indexes([flat], os.path.join(directory, 'ivf'), lists=int(np.sqrt(args.rows)))
+        print(f"IVF build:         {len(ivf.centroids)} lists, {time.perf_counter() - start:.1f} s")
+
+        rng = np.random.default_rng(args.seed + 1)
+        queries = normalize_rows(centers[rng.integers(0, args.clusters, args.queries)]
+                                 + 0.5 * rng.standard_normal((args.queries, args.dims)).astype(np.float32) / np.sqrt(args.dims))
+        # Rows of the IVF index are reordered; compare by record position
+        position = lambda index, rows: {index.record(row)['position'] for row in rows}
+
+        flat_latencies, flat_results = time_queries(flat, queries, args.k)
+        ivf_latencies, ivf_results = time_queries(ivf, queries, args.k, nprobe=args.nprobe)
+        filtered_latencies, _ = time_queries(ivf, queries, args.k, classifications=['requirement'], nprobe=args.nprobe)
+        recall = np.mean([len(position(flat, f) & position(ivf, i)) / args.k for f, i in zip(flat_results, ivf_results)])
+
+        for name, latencies in (('flat', flat_latencies), (f'IVF nprobe={args.nprobe}', ivf_latencies),
+                                ('IVF + filter', filtered_latencies)):
+            print(f"{name + ':':<19}p50 {percentile(latencies, 50) * 1000:7.2f} ms   p95 {percentile(latencies, 95) * 1000:7.2f} ms")
+        print(f"IVF recall@{args.k}:     {recall:.3f}")
+
+if __name__ == "__main__":
+    main()
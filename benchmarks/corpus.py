@@ -0,0 +1,97 @@
+import os
+import random
+import sys
+from xml.sax.saxutils import escape
+
+"""
+Synthetic XML corpus generator for offline benchmarks.
+
+Documents mimic technical specifications: front matter, a terminology clause, normative clauses
+with rule sentences (shall/should/may/can) between filler sentences, nested subclauses and a
+bibliography. The answers of `llm.backends.FakeBackend` are derived from the same text, so the
+full pipeline (classification, extraction, alignment) runs on them.
+
+Usage:
+    python benchmarks/corpus.py output_dir [documents] [sections] [depth] [section_words]
+"""
+
+WORDS = ["widget", "lid", "housing", "connector", "label", "surface", "cable", "panel", "sensor", "frame",
+         "bracket", "seal", "valve", "fastener", "coating", "enclosure", "terminal", "gasket", "rail", "clip"]
+VERBS = ["shall", "should", "may", "can", "shall not", "must"]
+
+def _sentence(rng, rule):
+    subject = f"The {rng.choice(WORDS)}"
+    if rule:
+        return f"{subject} {rng.choice(VERBS)} be {rng.choice(WORDS)}-compatible according to clause {rng.randint(1, 99)}."
+    return f"{subject} is described in relation to the {rng.choice(WORDS)} and the {rng.choice(WORDS)}."
+
+def _paragraphs(rng, words, rule_ratio=0.3):
+    sentences = []
+    count = 0
+    while count < words:
+        sentence = _sentence(rng, rng.random() < rule_ratio)
+        sentences.append(sentence)
+        count += len(sentence.split())
+    # Paragraphs of up to 4 sentences
+    return ["<p>" + escape(" ".join(sentences[i:i + 4])) + "</p>" for i in range(0, len(sentences), 4)]
+
+def _definitions(rng, words):
+    entries = []
+    count = 0
+    while count < words:
+        term = f"{rng.choice(WORDS)} {rng.choice(WORDS)}"
+        entry = f"{term} means a {rng.choice(WORDS)} used with the {rng.choice(WORDS)}."
+        entries.append(f"<p>{escape(entry)}</p>")
+        count += len(entry.split())
+    return entries
+
+def generate_document(sections=100, depth=3, section_words=80, seed=0):
+    """
+    Generates one synthetic document.
+
+    Args:
+        sections (int, optional): Number of <section> elements, including nested ones.
+        depth (int, optional): Maximum nesting depth of sections.
+        section_words (int, optional): Average number of words of each section's own text.
+        seed (int, optional): Seed; the same arguments always produce the same document.
+
+    Returns:
+        str: The XML document.
+    """
+    rng = random.Random(seed)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>', '<doc>']
+    level = 0
+    for i in range(sections):
+        # Next section: a sibling, a child of the previous section, or a sibling of an ancestor
+        target = rng.randint(1, min(depth, level + 1)) if i else 1
+        while level >= target:
+            parts.append('</section>')
+            level -= 1
+        words = max(1, int(rng.gauss(section_words, section_words / 3)))
+        if i == 0:
+            title, body = "Foreword", _paragraphs(rng, words, rule_ratio=0)
+        elif i == 1:
+            title, body = "Terms and definitions", _definitions(rng, words)
+        elif i == sections - 1:
+            title, body = "Bibliography", _paragraphs(rng, words, rule_ratio=0)
+        else:
+            title, body = f"Clause {i}: {rng.choice(WORDS)} {rng.choice(WORDS)}", _paragraphs(rng, words)
+        parts.append(f'<section><title>{escape(title)}</title>')
+        parts.extend(body)
+        level += 1
+    parts.extend('</section>' for _ in range(level))
+    parts.append('</doc>')
+    return "\n".join(parts)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    output_dir = sys.argv[1]
+    documents, sections, depth, section_words = (list(map(int, sys.argv[2:6])) + [10, 100, 3, 80][len(sys.argv[2:6]):])
+    os.makedirs(output_dir, exist_ok=True)
+    for seed in range(documents):
+        path = os.path.join(output_dir, f"doc-{seed:04d}.xml")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(generate_document(sections, depth, section_words, seed=seed))
+        print(path)
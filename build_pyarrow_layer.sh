@@ -0,0 +1,10 @@
+#!/bin/sh
+# Builds the pyarrow layer of the exportResults function (Parquet and Arrow exports) into
+# layers/pyarrow/python for the Lambda runtime (python3.11, x86_64). Run before `sls deploy`.
+set -e
+cd "$(dirname "$0")/layers/pyarrow"
+rm -rf python
+pip install -r requirements.txt --target python --platform manylinux2014_x86_64 \
+    --implementation cp --python-version 3.11 --only-binary=:all: --no-compile
+# Not used by the exports; the function package and its layers share the 250 MB limit
+rm -rf python/bin python/pyarrow/include python/pyarrow/tests python/pyarrow/*flight*
@@ -36,3 +36,26 @@ class SectionType(str, Enum):
 
 class SectionModel(BaseModel):
     section_type: SectionType
+
+### COMBINED (classification + extraction in one call)
+
+class SectionExtractionModel(BaseModel):
+    section_type: SectionType
+    requirements: list[RequirementItem]
+    concepts: List[ConceptsModel]
+
+### BATCHED (several small sections per call)
+
+class SectionTypeItem(BaseModel):
+    section_id: str
+    section_type: SectionType
+
+class SectionTypesModel(BaseModel):
+    sections: list[SectionTypeItem]
+
+class SectionRequirementsItem(BaseModel):
+    section_id: str
+    requirements: list[RequirementItem]
+
+class SectionRequirementsModel(BaseModel):
+    sections: list[SectionRequirementsItem]
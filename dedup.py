@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metrics import increment
+
+"""
+Description:
+    Near-duplicate detection of requirements across jobs with MinHash and locality-sensitive
+    hashing (LSH).
+
+    Standards of a series restate the same clauses almost verbatim. Every result written for a
+    job is annotated with the cluster of near-identical requirements it belongs to:
+        'cluster_id'        id of the cluster, the same for all its members in every job
+        'canonical_source'  {'jobId', 'position', 'section_xpath'} of the first requirement
+                            of the cluster (the requirement itself if it is new)
+
+    A requirement is normalized (case, clause numbering, punctuation) and reduced to the set of
+    its word pairs. Its MinHash signature holds, for each of DEDUP_PERMUTATIONS hash
+    functions, the minimum hash over that set; the fraction of equal values of two signatures
+    estimates the Jaccard similarity of the sets. The signature is cut into DEDUP_BANDS bands:
+    requirements sharing any band are candidates, and a candidate whose canonical requirement
+    has an estimated similarity of at least DEDUP_THRESHOLD gives the cluster. Lookups cost a
+    fixed number of key reads per requirement, independent of the size of the corpus.
+
+    With 24 bands of 5 values, pairs of similarity 0.7 become candidates with probability 0.99,
+    pairs of similarity 0.5 with 0.53 and pairs of similarity 0.3 with 0.06.
+
+    The clusters are kept in a store shared by all jobs:
+        - MemoryDedupStore: in process (tests, benchmarks, local runs).
+        - DynamoDBDedupStore: a DynamoDB table (prod).
+
+    The store is selected with the DEDUP_STORE environment variable:
+        "none" (default, no annotation), "memory" or "dynamodb:<table>".
+    The hash functions are part of the stored signatures: changing DEDUP_PERMUTATIONS or
+    DEDUP_BANDS requires a new store.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Requirements with at least this estimated Jaccard similarity of their word pairs are near-duplicates
+DEDUP_THRESHOLD = float(os.environ.get('DEDUP_THRESHOLD', '0.7'))
+# Hash functions per signature, and LSH bands they are cut into (bands x rows = permutations)
+DEDUP_PERMUTATIONS = 120
+DEDUP_BANDS = 24
+# Words per shingle
+SHINGLE_WORDS = 2
+# Seed of the hash functions; signatures of different seeds cannot be compared
+MINHASH_SEED = 1
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.default_rng(MINHASH_SEED)
+# a * hash + b stays below 2**64 for 32-bit hashes
+_A = _rng.integers(1, 1 << 31, size=(DEDUP_PERMUTATIONS, 1), dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, size=(DEDUP_PERMUTATIONS, 1), dtype=np.uint64)
+
+# Clause numbering such as "5.2.1", "5.2.1." "a)" or "(iv)"
+_NUMBERING = re.compile(r'^\s*(?:\d+(?:\.\d+)*\.?|\(?[a-z0-9]{1,4}\))\s+')
+_NON_WORD = re.compile(r'[\W_]+')
+
+def normalize_requirement(text):
+    """Lowercases a requirement, drops its leading clause numbering and reduces it to its words."""
+    text = _NUMBERING.sub('', text.lower())
+    return _NON_WORD.sub(' ', text).strip()
+
+def shingles(text):
+    """Returns the 32-bit hashes of the word n-grams of a normalized text (the text itself if shorter)."""
+    words = text.split()
+    if len(words) <= SHINGLE_WORDS:
+        grams = [text]
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    return np.array(sorted({zlib.crc32(gram.encode('utf-8')) for gram in grams}), dtype=np.uint64)
+
+def minhash(text):
+    """
+    Computes the MinHash signature of a requirement.
+
+    Args:
+        text (str): The requirement text.
+
+    Returns:
+        np.ndarray: DEDUP_PERMUTATIONS uint32 values.
+    """
+    hashes = shingles(normalize_requirement(text))
+    permuted = ((_A * hashes + _B) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32)
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of the texts of two signatures."""
+    return float(np.mean(signature == other))
+
+def band_keys(signature):
+    """Returns the LSH bucket key of every band of a signature."""
+    rows = DEDUP_PERMUTATIONS // DEDUP_BANDS
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(DEDUP_BANDS)
+    ]
+
+def cluster_id(signature):
+    """Id of a new cluster, derived from the signature of its canonical requirement."""
+    return hashlib.blake2b(signature.tobytes(), digest_size=8).hexdigest()
+
+class MemoryDedupStore:
+    """In-process clusters and LSH buckets."""
+
+    def __init__(self):
+        self._buckets = {}    # band key -> set of cluster ids
+        self._clusters = {}   # cluster id -> (signature, canonical source)
+        self._lock = threading.Lock()
+
+    def candidates(self, keys):
+        """Returns the ids of the clusters in any of the given buckets."""
+        with self._lock:
+            return set().union(*(self._buckets.get(key, ()) for key in keys))
+
+    def get_clusters(self, cluster_ids):
+        """Returns (signature, canonical source) by cluster id."""
+        with self._lock:
+            return {cid: self._clusters[cid] for cid in cluster_ids if cid in self._clusters}
+
+    def add_cluster(self, cid, signature, source, keys):
+        """Adds a cluster to its buckets; an existing cluster with the same id keeps its source."""
+        with self._lock:
+            self._clusters.setdefault(cid, (signature, source))
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(cid)
+
+class DynamoDBDedupStore:
+    """
+    Clusters and LSH buckets in a DynamoDB table with partition key 'dedupKey':
+        'band#<band>:<hash>'  string set 'clusters' of the clusters in the bucket
+        'cluster#<id>'        binary 'signature' and JSON 'source' of the canonical requirement
+    Reads use BatchGetItem, so a section's requirements need one round trip per 100 keys.
+    A new cluster is written with one PutItem and one UpdateItem per band (BatchWriteItem cannot
+    add to a set), sent in parallel so they cost about one round trip.
+    """
+
+    # Keys per BatchGetItem request
+    BATCH_SIZE = 100
+    # Parallel writes of a new cluster: its item and the bucket of every band
+    WRITE_CONCURRENCY = DEDUP_BANDS + 1
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        # Threads are only started on the first write
+        self._executor = ThreadPoolExecutor(max_workers=self.WRITE_CONCURRENCY)
+
+    @property
+    def _client(self):
+        from aws_clients import get_client
+        return get_client('dynamodb')
+
+    def _batch_get(self, keys):
+        items = []
+        keys = list(keys)
+        for start in range(0, len(keys), self.BATCH_SIZE):
+            request = {self.table_name: {'Keys': [{'dedupKey': {'S': key}} for key in keys[start:start + self.BATCH_SIZE]]}}
+            while request:
+                response = self._client.batch_get_item(RequestItems=request)
+                items.extend(response['Responses'].get(self.table_name, []))
+                request = response.get('UnprocessedKeys')
+        return items
+
+    def candidates(self, keys):
+        cluster_ids = set()
+        for item in self._batch_get(f"band#{key}" for key in keys):
+            cluster_ids.update(item.get('clusters', {}).get('SS', []))
+        return cluster_ids
+
+    def get_clusters(self, cluster_ids):
+        clusters = {}
+        for item in self._batch_get(f"cluster#{cid}" for cid in cluster_ids):
+            signature = np.frombuffer(item['signature']['B'], dtype=np.uint32)
+            clusters[item['dedupKey']['S'][len('cluster#'):]] = (signature, json.loads(item['source']['S']))
+        return clusters
+
+    def _put_cluster(self, cid, signature, source):
+        client = self._client
+        try:
+            client.put_item(
+                TableName=self.table_name,
+                Item={
+                    'dedupKey': {'S': f"cluster#{cid}"},
+                    'signature': {'B': signature.tobytes()},
+                    'source': {'S': json.dumps(source, ensure_ascii=False)}
+                },
+                ConditionExpression="attribute_not_exists(dedupKey)"
+            )
+        except client.exceptions.ConditionalCheckFailedException:
+            # Created concurrently by another job with the same canonical text
+            pass
+
+    def _add_to_bucket(self, key, cid):
+        self._client.update_item(
+            TableName=self.table_name,
+            Key={'dedupKey': {'S': f"band#{key}"}},
+            UpdateExpression="ADD clusters :cluster",
+            ExpressionAttributeValues={':cluster': {'SS': [cid]}}
+        )
+
+    def add_cluster(self, cid, signature, source, keys):
+        futures = [self._executor.submit(self._put_cluster, cid, signature, source)]
+        futures.extend(self._executor.submit(self._add_to_bucket, key, cid) for key in keys)
+        for future in futures:
+            future.result()
+
+def create_dedup_store(spec):
+    """
+    Creates a dedup store from a specification string (see module docstring).
+
+    Args:
+        spec (str): "none", "memory" or "dynamodb:<table>".
+
+    Returns:
+        MemoryDedupStore | DynamoDBDedupStore | None: The configured store, or None if
+            near-duplicate detection is disabled.
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'none':
+        return None
+    if kind == 'memory':
+        return MemoryDedupStore()
+    if kind == 'dynamodb':
+        return DynamoDBDedupStore(target)
+    raise ValueError(f"Unknown DEDUP_STORE specification: '{spec}'")
+
+dedup_store = create_dedup_store(os.environ.get('DEDUP_STORE', 'none'))
+
+class Deduplicator:
+    """
+    Annotates the results of one job with their near-duplicate clusters.
+
+    Usage:
+        deduplicator = Deduplicator(dedup_store, job_id)
+        deduplicator.annotate(section_requirements, first_position)
+    """
+
+    def __init__(self, store, job_id, threshold=None):
+        self.store = store
+        self.job_id = job_id
+        self.threshold = DEDUP_THRESHOLD if threshold is None else threshold
+        self.stats = {'duplicates': 0, 'clusters': 0}
+        # Clusters read or created by this job
+        self._clusters = {}
+
+    def annotate(self, results, first_position):
+        """
+        Adds 'cluster_id' and 'canonical_source' to results (in place). Results that match no
+        cluster start a new one, so later results of the same job can match them.
+
+        Args:
+            results (list[dict]): Consecutive results (e.g. of one section), see
+                `app_main.locate_requirements`.
+            first_position (int): Position of the first of them in the job results.
+
+        Returns:
+            list[dict]: The annotated results.
+        """
+        if not results:
+            return results
+        signatures = [minhash(result['requirement_text']) for result in results]
+        keys = [band_keys(signature) for signature in signatures]
+        candidates = self.store.candidates({key for result_keys in keys for key in result_keys})
+        missing = candidates - self._clusters.keys()
+        if missing:
+            self._clusters.update(self.store.get_clusters(missing))
+
+        for i, result in enumerate(results):
+            match = self._match(signatures[i], candidates)
+            if match is None:
+                match = cluster_id(signatures[i])
+                source = {
+                    'jobId': self.job_id,
+                    'position': first_position + i,
+                    'section_xpath': result.get('section_xpath')
+                }
+                self.store.add_cluster(match, signatures[i], source, keys[i])
+                self._clusters.setdefault(match, (signatures[i], source))
+                candidates.add(match)
+                self.stats['clusters'] += 1
+            else:
+                self.stats['duplicates'] += 1
+            result['cluster_id'] = match
+            result['canonical_source'] = self._clusters[match][1]
+
+        increment('RequirementsDeduplicated', len(results))
+        return results
+
+    def _match(self, signature, candidates):
+        """Returns the most similar candidate cluster at or above the threshold, or None."""
+        best = None
+        best_similarity = self.threshold
+        for cid in candidates:
+            cluster = self._clusters.get(cid)
+            if cluster is None:
+                continue
+            score = similarity(signature, cluster[0])
+            if score >= best_similarity:
+                best = cid
+                best_similarity = score
+        return best
@@ -0,0 +1,462 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+from collections.abc import Mapping
+
+from result_records import RecordEncoder, json_default
+
+"""
+Description:
+    Streaming export of job results (requirements) and glossaries (definitions) to files.
+
+    Rows are consumed from any iterable, e.g. `result_store.iter_results`, which streams a job's
+    results shard by shard, and written incrementally in one of the formats:
+        csv      one row per item, nested fields (defined_terms, canonical_source) as JSON
+        jsonl    one JSON object per line, as stored in the results shards
+        parquet  columnar, one row group per EXPORT_BATCH_ROWS rows (requires pyarrow)
+        arrow    Arrow IPC stream, one record batch per EXPORT_BATCH_ROWS rows (requires pyarrow)
+    csv and jsonl can be gzip-compressed; parquet and arrow compress their columns ('zstd',
+    'snappy', 'gzip' for parquet, 'zstd' or 'lz4' for arrow).
+
+    Writers write to any binary file object: a local file, or an `S3MultipartUpload`, which
+    uploads every EXPORT_PART_SIZE bytes as one part of a multipart upload. An export therefore
+    holds at most one batch of rows and one part in memory, however large the job:
+        with S3MultipartUpload(s3_client, bucket, key) as upload:
+            export_rows(iter_results(s3_client, bucket, manifest), upload, 'parquet')
+
+    Command line (local files):
+        python export.py document.xml requirements.csv --definitions definitions.csv
+"""
+
+logger = logging.getLogger(__name__)
+
+# Rows per Parquet row group / Arrow record batch
+EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', '10000'))
+# Bytes per part of S3 multipart uploads (S3 requires at least 5 MiB for all but the last part)
+EXPORT_PART_SIZE = max(int(os.environ.get('EXPORT_PART_SIZE', str(8 * 2**20))), 5 * 2**20)
+
+REQUIREMENT_COLUMNS = [
+    'requirement_text',
+    'classification',
+    'section_xpath',
+    'section_relative_start',
+    'section_relative_end',
+    'defined_terms',
+    'cluster_id',
+    'canonical_source'
+]
+DEFINITION_COLUMNS = ['term', 'definition', 'abbreviations']
+
+# Format -> (file extension, content type, accepted compressions; the first is the default)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv', (None, 'gzip')),
+    'jsonl': ('jsonl', 'application/x-ndjson', (None, 'gzip')),
+    'parquet': ('parquet', 'application/vnd.apache.parquet', ('zstd', 'snappy', 'gzip', None)),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.stream', (None, 'zstd', 'lz4'))
+}
+EXPORT_KINDS = ('requirements', 'definitions')
+
+def _columns(kind):
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Unknown export kind '{kind}', expected one of {', '.join(EXPORT_KINDS)}")
+    return REQUIREMENT_COLUMNS if kind == 'requirements' else DEFINITION_COLUMNS
+
+def check_format(format, compression=None):
+    """
+    Validates a format and compression.
+
+    Returns:
+        str | None: The compression to use (the format's default if none was given).
+
+    Raises:
+        ValueError: If the format is unknown or does not support the compression.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{format}', expected one of {', '.join(EXPORT_FORMATS)}")
+    compressions = EXPORT_FORMATS[format][2]
+    if compression in (None, ''):
+        return compressions[0]
+    if compression == 'none':
+        compression = None
+    if compression not in compressions:
+        accepted = ', '.join(value or 'none' for value in compressions)
+        raise ValueError(f"Format '{format}' supports the compressions {accepted}, not '{compression}'")
+    return compression
+
+def export_extension(format, compression=None):
+    """File extension of an export, e.g. 'csv.gz' or 'parquet'."""
+    extension = EXPORT_FORMATS[format][0]
+    return f"{extension}.gz" if compression == 'gzip' and format in ('csv', 'jsonl') else extension
+
+def _as_mapping(row):
+    # Result dicts and RequirementRecords as they are, ConceptsModel items as dicts
+    if isinstance(row, Mapping):
+        return row
+    return row.model_dump()
+
+### TEXT WRITERS
+
+class _TextWriter:
+    """Base of the CSV and JSON Lines writers: UTF-8 text, optionally gzip-compressed."""
+
+    def __init__(self, file, compression=None):
+        self._gzip = gzip.GzipFile(fileobj=file, mode='wb') if compression == 'gzip' else None
+        self._text = io.TextIOWrapper(self._gzip or file, encoding='utf-8', newline='', write_through=True)
+
+    def close(self):
+        """Flushes the writer; the underlying file is left open."""
+        self._text.flush()
+        self._text.detach()
+        if self._gzip is not None:
+            self._gzip.close()
+
+class CsvWriter(_TextWriter):
+    """
+    Writes rows as CSV with a header. Lists and objects (defined_terms, canonical_source) are
+    written as JSON, except the abbreviations of definitions, which are joined with ", ".
+    """
+
+    def __init__(self, file, kind='requirements', compression=None):
+        super().__init__(file, compression)
+        self.columns = _columns(kind)
+        self._writer = csv.writer(self._text)
+        self._writer.writerow(self.columns)
+
+    def write(self, rows):
+        for row in rows:
+            row = _as_mapping(row)
+            values = []
+            for column in self.columns:
+                value = row.get(column)
+                if column == 'abbreviations':
+                    value = ", ".join(value or [])
+                elif isinstance(value, (list, dict)):
+                    value = json.dumps(value, ensure_ascii=False, default=json_default)
+                values.append(value)
+            self._writer.writerow(values)
+
+class JsonLinesWriter(_TextWriter):
+    """Writes rows as JSON Lines, in the format of the results shards (see `RecordEncoder`)."""
+
+    def __init__(self, file, kind='requirements', compression=None):
+        super().__init__(file, compression)
+        _columns(kind)
+        self._encoder = RecordEncoder()
+
+    def write(self, rows):
+        self._text.write(self._encoder.encode_lines([
+            _as_mapping(row) for row in rows
+        ]))
+
+### COLUMNAR WRITERS
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError("The parquet and arrow export formats require pyarrow, which is not installed")
+    return pyarrow
+
+def arrow_schema(kind):
+    """Arrow schema of exported requirements or definitions."""
+    pa = _import_pyarrow()
+    if kind == 'definitions':
+        return pa.schema([
+            ('term', pa.string()),
+            ('definition', pa.string()),
+            ('abbreviations', pa.list_(pa.string()))
+        ])
+    _columns(kind)
+    return pa.schema([
+        ('requirement_text', pa.string()),
+        ('classification', pa.string()),
+        ('section_xpath', pa.string()),
+        ('section_relative_start', pa.int64()),
+        ('section_relative_end', pa.int64()),
+        ('defined_terms', pa.list_(pa.struct([
+            ('term', pa.string()),
+            ('start', pa.int64()),
+            ('end', pa.int64())
+        ]))),
+        ('cluster_id', pa.string()),
+        ('canonical_source', pa.struct([
+            ('jobId', pa.string()),
+            ('position', pa.int64()),
+            ('section_xpath', pa.string())
+        ]))
+    ])
+
+class _ArrowWriter:
+    """Base of the Parquet and Arrow writers: buffers rows into record batches of a fixed schema."""
+
+    def __init__(self, file, kind='requirements', batch_rows=None):
+        self._pa = _import_pyarrow()
+        self.schema = arrow_schema(kind)
+        self.batch_rows = batch_rows or EXPORT_BATCH_ROWS
+        self._file = file
+        self._pending = []
+
+    def write(self, rows):
+        for row in rows:
+            row = _as_mapping(row)
+            self._pending.append(row if isinstance(row, dict) else dict(row))
+            if len(self._pending) >= self.batch_rows:
+                self.flush()
+
+    def flush(self):
+        """Writes the pending rows as one row group / record batch."""
+        if self._pending:
+            self._write_table(self._pa.Table.from_pylist(self._pending, schema=self.schema))
+            self._pending = []
+
+    def close(self):
+        """Writes the last batch and the footer; the underlying file is left open."""
+        self.flush()
+        self._writer.close()
+
+    def _write_table(self, table):
+        self._writer.write_table(table)
+
+class ParquetWriter(_ArrowWriter):
+    """Writes rows as a Parquet file, one row group per batch."""
+
+    def __init__(self, file, kind='requirements', compression='zstd', batch_rows=None):
+        super().__init__(file, kind, batch_rows)
+        import pyarrow.parquet as pq
+        self._writer = pq.ParquetWriter(file, self.schema, compression=compression or 'none')
+
+    def _write_table(self, table):
+        self._writer.write_table(table, row_group_size=self.batch_rows)
+
+class ArrowStreamWriter(_ArrowWriter):
+    """Writes rows as an Arrow IPC stream, one record batch per batch."""
+
+    def __init__(self, file, kind='requirements', compression=None, batch_rows=None):
+        super().__init__(file, kind, batch_rows)
+        options = self._pa.ipc.IpcWriteOptions(compression=compression)
+        self._writer = self._pa.ipc.new_stream(file, self.schema, options=options)
+
+def create_writer(file, format, kind='requirements', compression=None):
+    """
+    Creates the writer of an export format.
+
+    Args:
+        file: Binary file object, e.g. an open local file or an S3MultipartUpload.
+        format (str): csv | jsonl | parquet | arrow.
+        kind (str, optional): requirements (job results) | definitions (glossary entries).
+        compression (str, optional): See EXPORT_FORMATS; the format's default if omitted.
+
+    Returns:
+        Writer with write(rows) and close() (which leaves `file` open).
+
+    Raises:
+        ValueError: If the format, kind or compression is invalid.
+        RuntimeError: If the format needs pyarrow and it is not installed.
+    """
+    compression = check_format(format, compression)
+    if format == 'csv':
+        return CsvWriter(file, kind, compression)
+    if format == 'jsonl':
+        return JsonLinesWriter(file, kind, compression)
+    if format == 'parquet':
+        return ParquetWriter(file, kind, compression)
+    return ArrowStreamWriter(file, kind, compression)
+
+def export_rows(rows, file, format, kind='requirements', compression=None, chunk_size=1000):
+    """
+    Streams rows into a file object in an export format.
+
+    Args:
+        rows (Iterable[dict]): Results or definitions, consumed once (a generator is fine).
+        file: Binary file object, see `create_writer`.
+        format (str): csv | jsonl | parquet | arrow.
+        kind (str, optional): requirements | definitions.
+        compression (str, optional): See EXPORT_FORMATS.
+        chunk_size (int, optional): Rows handed to the writer at a time.
+
+    Returns:
+        int: The number of rows written.
+    """
+    writer = create_writer(file, format, kind, compression)
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            writer.write(chunk)
+            count += len(chunk)
+            chunk = []
+    writer.write(chunk)
+    count += len(chunk)
+    writer.close()
+    return count
+
+def export_to_file(rows, path, format=None, kind='requirements', compression=None):
+    """
+    Streams rows into a local file. The format defaults to the file extension (".csv.gz" selects
+    gzip compression).
+
+    Returns:
+        int: The number of rows written.
+    """
+    if format is None:
+        name = path[:-3] if path.endswith('.gz') else path
+        format = os.path.splitext(name)[1].lstrip('.')
+        if path.endswith('.gz') and compression is None:
+            compression = 'gzip'
+    check_format(format, compression)
+    with open(path, 'wb') as file:
+        count = export_rows(rows, file, format, kind, compression)
+    logger.info(f"Exported {count} {kind} to {path}")
+    return count
+
+### S3
+
+class S3MultipartUpload:
+    """
+    Writable binary file object uploading to S3 with a multipart upload, one part per
+    EXPORT_PART_SIZE bytes. The object only appears once the upload is closed; if the export
+    fails, the upload is aborted so no incomplete parts are kept (and billed).
+
+    Usage:
+        with S3MultipartUpload(s3_client, bucket, key, content_type='text/csv') as upload:
+            upload.write(data)
+    """
+
+    def __init__(self, s3_client, bucket, key, content_type='application/octet-stream', part_size=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size or EXPORT_PART_SIZE
+        self.upload_id = s3_client.create_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            ContentType=content_type
+        )['UploadId']
+        self.closed = False
+        self._parts = []
+        self._buffer = bytearray()
+        self._position = 0
+
+    def readable(self):
+        return False
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to a closed upload")
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def _upload_part(self):
+        number = len(self._parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=number,
+            Body=bytes(self._buffer)
+        )
+        self._parts.append({'PartNumber': number, 'ETag': response['ETag']})
+        self._buffer = bytearray()
+
+    def close(self):
+        """Uploads the last part and completes the upload."""
+        if self.closed:
+            return
+        try:
+            if self._buffer or not self._parts:
+                self._upload_part()
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={'Parts': self._parts}
+            )
+        except Exception:
+            self.abort()
+            raise
+        self.closed = True
+
+    def abort(self):
+        """Discards the upload and its parts."""
+        if self.closed:
+            return
+        self.closed = True
+        self._buffer = bytearray()
+        self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+def export_key(job_id, format, kind='requirements', compression=None):
+    """S3 key of an export of a job, e.g. 'exports/<jobId>/requirements.csv.gz'."""
+    compression = check_format(format, compression)
+    # Columnar formats keep their extension whatever the codec, e.g. requirements.zstd.parquet
+    suffix = f".{compression}" if compression and format in ('parquet', 'arrow') else ""
+    return f"exports/{job_id}/{kind}{suffix}.{export_extension(format, compression)}"
+
+def export_to_s3(s3_client, bucket, key, rows, format, kind='requirements', compression=None):
+    """
+    Streams rows into an S3 object with a multipart upload.
+
+    Returns:
+        int: The number of rows written.
+    """
+    compression = check_format(format, compression)
+    content_type = EXPORT_FORMATS[format][1]
+    with S3MultipartUpload(s3_client, bucket, key, content_type=content_type) as upload:
+        count = export_rows(rows, upload, format, kind, compression)
+    logger.info(f"Exported {count} {kind} to s3://{bucket}/{key}")
+    return count
+
+### COMMAND LINE
+
+def main():
+    parser = argparse.ArgumentParser(description="Extracts the requirements of an XML document into a file.")
+    parser.add_argument('xml_path', help='the XML document')
+    parser.add_argument('output', help='requirements file (.csv, .jsonl, .parquet or .arrow, optionally .gz)')
+    parser.add_argument('--definitions', help='also write the defined terms to this file')
+    args = parser.parse_args()
+
+    from app_main import iter_section_results
+
+    definitions = []
+
+    def requirements():
+        # Requirements are written while the document is processed; definitions are kept
+        for section_result in iter_section_results(args.xml_path):
+            definitions.extend(section_result.definitions)
+            yield from section_result.requirements
+
+    export_to_file(requirements(), args.output)
+    if args.definitions:
+        export_to_file(definitions, args.definitions, kind='definitions')
+
+if __name__ == '__main__':
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='%(message)s')
+    main()
@@ -0,0 +1,236 @@
+import gzip
+import json
+import logging
+
+from alignment import AhoCorasick, fold_case, normalize_with_map
+from result_store import results_prefix
+
+"""
+Description:
+    Glossary of the terms defined in a document, and linking of requirements to the defined
+    terms they use.
+
+    Terminology sections yield ConceptsModel items (term, definition, abbreviations). A Glossary
+    collects them and compiles all terms and abbreviations into one Aho–Corasick automaton
+    (see `alignment.AhoCorasick`), so every requirement is scanned once, in time linear in its
+    length plus the number of matches, however many entries the glossary holds. No LLM calls
+    are involved. Each requirement gets:
+        'defined_terms'  [{'term', 'start', 'end'}, ...] character offsets in requirement_text
+
+    Terms match case-insensitively, abbreviations exactly; a match must start and end at word
+    boundaries (a plural "s"/"es" is included in the span), and overlapping matches are reduced
+    to the leftmost-longest ones, so "bracket seal" wins over "bracket" and "seal".
+
+    Sections are linked in document order with the terms defined before them, as standards
+    define their terms ahead of the normative clauses; results can be written while the document
+    is still streaming. A glossary can be seeded with the glossaries of other jobs (a standard
+    series sharing its vocabulary); the definitions of the document itself take precedence.
+    Seeded entries and the document's own entries are compiled into separate automata, so
+    adding the definitions of a terminology section only recompiles the (small) latter.
+
+    The glossary of a job is stored next to its results (`results/<jobId>/glossary.json.gz`).
+"""
+
+logger = logging.getLogger(__name__)
+
+# Terms and abbreviations shorter than this are not linked
+MIN_TERM_LENGTH = 2
+_PLURAL_SUFFIXES = ('es', 's')
+
+def _is_word_char(text, index):
+    return 0 <= index < len(text) and text[index].isalnum()
+
+class _EntrySet:
+    """Glossary entries compiled into one automaton, recompiled on first use after a change."""
+
+    def __init__(self):
+        # Folded term or exact abbreviation -> (term, definition, is_abbreviation)
+        self.entries = {}
+        self._automaton = None
+
+    def changed(self):
+        self._automaton = None
+
+    def iter_matches(self, folded):
+        """Yields (start, pattern, entry) for every occurrence of an entry in a folded text."""
+        if not self.entries:
+            return
+        if self._automaton is None:
+            self._patterns = list(self.entries)
+            self._automaton = AhoCorasick(fold_case(pattern) for pattern in self._patterns)
+        for start, pattern_id in self._automaton.iter_matches(folded):
+            pattern = self._patterns[pattern_id]
+            yield start, pattern, self.entries[pattern]
+
+class Glossary:
+    """
+    Defined terms and abbreviations of one or more documents.
+
+    Usage:
+        glossary = Glossary()
+        glossary.add(definitions)
+        glossary.annotate(requirements)
+    """
+
+    def __init__(self):
+        # Entries of other documents (`update`) and of this document (`add`)
+        self._seed = _EntrySet()
+        self._own = _EntrySet()
+
+    @property
+    def _entries(self):
+        return {**self._seed.entries, **self._own.entries}
+
+    def __len__(self):
+        return len(self._seed.entries.keys() | self._own.entries.keys())
+
+    def add(self, definitions):
+        """
+        Adds definitions; a term defined again replaces its previous definition.
+
+        Args:
+            definitions (Iterable[ConceptsModel | dict]): Items with term, definition and abbreviations.
+        """
+        for definition in definitions:
+            if not isinstance(definition, dict):
+                definition = definition.model_dump()
+            term = normalize_with_map(definition['term'])[0]
+            if len(term) < MIN_TERM_LENGTH:
+                continue
+            self._own.entries[fold_case(term)] = (term, definition['definition'], False)
+            for abbreviation in definition.get('abbreviations') or []:
+                abbreviation = normalize_with_map(abbreviation)[0]
+                if len(abbreviation) >= MIN_TERM_LENGTH:
+                    self._own.entries[abbreviation] = (term, definition['definition'], True)
+            self._own.changed()
+
+    def update(self, other):
+        """Adds all entries of another glossary as seed entries, see `job_glossary`."""
+        self._seed.entries.update(other._entries)
+        self._seed.changed()
+
+    def _iter_matches(self, folded):
+        # Entries of the document replace seeded entries with the same key
+        yield from self._own.iter_matches(folded)
+        for match in self._seed.iter_matches(folded):
+            if match[1] not in self._own.entries:
+                yield match
+
+    def find_terms(self, text):
+        """
+        Finds the defined terms used in a text.
+
+        Args:
+            text (str): E.g. a requirement text.
+
+        Returns:
+            list[dict]: {'term', 'start', 'end'} per match, ordered by start offset.
+        """
+        if not (self._seed.entries or self._own.entries) or not text:
+            return []
+        normalized, offsets = normalize_with_map(text)
+        folded = fold_case(normalized)
+
+        matches = []
+        for start, pattern, entry in self._iter_matches(folded):
+            end = start + len(pattern)
+            if _is_word_char(folded, start - 1):
+                continue
+            term, _, is_abbreviation = entry
+            if is_abbreviation and normalized[start:end] != pattern:
+                continue
+            if _is_word_char(folded, end) and not is_abbreviation:
+                for suffix in _PLURAL_SUFFIXES:
+                    if folded.startswith(suffix, end) and not _is_word_char(folded, end + len(suffix)):
+                        end += len(suffix)
+                        break
+            if _is_word_char(folded, end):
+                continue
+            matches.append((start, end, term))
+
+        # Leftmost-longest, non-overlapping
+        matches.sort(key=lambda match: (match[0], -match[1]))
+        found = []
+        covered = 0
+        for start, end, term in matches:
+            if start >= covered:
+                found.append({'term': term, 'start': offsets[start], 'end': offsets[end - 1] + 1})
+                covered = end
+        return found
+
+    def annotate(self, requirements):
+        """Adds 'defined_terms' to requirement dicts (in place), see `find_terms`."""
+        for requirement in requirements:
+            requirement['defined_terms'] = self.find_terms(requirement['requirement_text'])
+        return requirements
+
+    def link(self, section_result):
+        """
+        Adds the definitions of a section, then annotates its requirements. Sections must be
+        linked in document order.
+
+        Args:
+            section_result (SectionResult): See `app_main.SectionResult`.
+        """
+        if section_result.definitions:
+            self.add(section_result.definitions)
+        self.annotate(section_result.requirements)
+        return section_result
+
+    def definitions(self):
+        """Returns the entries as definition dicts (term, definition, abbreviations)."""
+        concepts = {}
+        for key, (term, definition, is_abbreviation) in self._entries.items():
+            concept = concepts.setdefault(term, {'term': term, 'definition': definition, 'abbreviations': []})
+            if is_abbreviation:
+                concept['abbreviations'].append(key)
+        return list(concepts.values())
+
+    def to_bytes(self):
+        return gzip.compress(json.dumps(self.definitions(), ensure_ascii=False).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, data):
+        glossary = cls()
+        glossary.add(json.loads(gzip.decompress(data)))
+        return glossary
+
+### S3
+
+def glossary_key(job_id):
+    """S3 key of the glossary of a job."""
+    return f"{results_prefix(job_id)}glossary.json.gz"
+
+def save_glossary(s3_client, bucket, job_id, glossary):
+    """
+    Stores the glossary of a job next to its results.
+
+    Returns:
+        str: The S3 key.
+    """
+    key = glossary_key(job_id)
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=glossary.to_bytes(),
+        ContentType='application/gzip'
+    )
+    return key
+
+def job_glossary(s3_client, bucket, job):
+    """
+    Returns a new glossary for a job, seeded with the glossaries of the jobs listed in its
+    'glossaryJobIds' attribute (jobs without a stored glossary are skipped).
+
+    Args:
+        job (dict): The job record.
+    """
+    glossary = Glossary()
+    for job_id in job.get('glossaryJobIds') or []:
+        try:
+            response = s3_client.get_object(Bucket=bucket, Key=glossary_key(job_id))
+        except s3_client.exceptions.NoSuchKey:
+            logger.warning(f"Job {job_id} has no glossary")
+            continue
+        glossary.update(Glossary.from_bytes(response['Body'].read()))
+    return glossary
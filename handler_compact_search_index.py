@@ -0,0 +1,19 @@
+import os
+from aws_clients import get_s3_client
+from metrics import configure_logging
+from search_index import compact_search_index
+
+# Environment variables from serverless.yml
+UPLOADS_BUCKET = os.environ['UPLOADS_BUCKET']
+# Working directory in the Lambda's ephemeral storage
+SEARCH_COMPACTION_DIR = os.environ.get('SEARCH_COMPACTION_DIR', '/tmp/search-compaction')
+
+configure_logging()
+
+def compact(event, context):
+    """
+    Scheduled Lambda. Merges the search index segments of the jobs completed since the last run
+    into a new base index, partitioned into IVF lists once it is large (see `search_index`).
+    """
+    prefix = compact_search_index(get_s3_client(), UPLOADS_BUCKET, SEARCH_COMPACTION_DIR)
+    print(f"New search index base: {prefix}" if prefix else "Search index already compact")
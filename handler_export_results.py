@@ -0,0 +1,125 @@
+import os
+from aws_clients import get_item, get_s3_client
+from export import EXPORT_KINDS, check_format, export_key, export_to_s3
+from glossary import Glossary
+from result_store import iter_results
+
+# Environment variables from serverless.yml
+JOBS_TABLE = os.environ['JOBS_TABLE']
+UPLOADS_BUCKET = os.environ['UPLOADS_BUCKET']
+# Lifetime of the download URLs returned by GET /jobs/{jobId}/export
+EXPORT_URL_EXPIRES_SECONDS = int(os.environ.get('EXPORT_URL_EXPIRES_SECONDS', '3600'))
+
+def export_exists(s3_client, key):
+    """Returns True if an export was already written to the key."""
+    try:
+        s3_client.head_object(Bucket=UPLOADS_BUCKET, Key=key)
+    except s3_client.exceptions.ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+    return True
+
+def job_rows(s3_client, item, kind):
+    """Streams the results or the glossary definitions of a completed job."""
+    manifest = item.get('resultsManifest')
+    if kind == 'definitions':
+        if not manifest or not manifest.get('glossary'):
+            return []
+        response = s3_client.get_object(Bucket=UPLOADS_BUCKET, Key=manifest['glossary'])
+        return Glossary.from_bytes(response['Body'].read()).definitions()
+    if manifest:
+        return iter_results(s3_client, UPLOADS_BUCKET, manifest)
+    # Jobs processed before results moved to S3 keep them in the item
+    return item.get('results', [])
+
+def export_results(event, context):
+    """
+    Lambda for GET /jobs/{jobId}/export
+    Writes all results (or the defined terms) of a completed job to one file in S3 and returns
+    a presigned download URL. The results are streamed from the result shards into a multipart
+    upload, so memory does not grow with the size of the job. An export is written once per
+    format and compression and reused by later requests.
+
+    Query parameters:
+    - format: csv (default), jsonl, parquet or arrow.
+    - compression: gzip for csv and jsonl; zstd (parquet default), snappy or gzip for parquet;
+      zstd or lz4 for arrow; none to disable.
+    - kind: requirements (default) or definitions.
+    """
+    try:
+        path_params = event.get('pathParameters', {})
+        job_id = path_params.get('jobId')
+
+        if not job_id:
+            return {
+                "statusCode": 400,
+                "body": "Missing jobId in path parameters"
+            }
+
+        query_params = event.get('queryStringParameters') or {}
+        format = query_params.get('format', 'csv')
+        kind = query_params.get('kind', 'requirements')
+        if kind not in EXPORT_KINDS:
+            return {
+                "statusCode": 400,
+                "body": f"kind must be one of {', '.join(EXPORT_KINDS)}"
+            }
+        try:
+            compression = check_format(format, query_params.get('compression'))
+        except ValueError as e:
+            return {
+                "statusCode": 400,
+                "body": str(e)
+            }
+
+        item = get_item(JOBS_TABLE, {'jobId': job_id})
+        if not item:
+            return {
+                "statusCode": 404,
+                "body": f"Job {job_id} not found"
+            }
+        if item.get('status') != 'complete':
+            return {
+                "statusCode": 409,
+                "body": f"Job {job_id} is {item.get('status', 'unknown')}, exports are available once it is complete"
+            }
+
+        s3_client = get_s3_client()
+        key = export_key(job_id, format, kind, compression)
+        reused = export_exists(s3_client, key)
+        if not reused:
+            try:
+                export_to_s3(s3_client, UPLOADS_BUCKET, key, job_rows(s3_client, item, kind), format, kind, compression)
+            except RuntimeError as e:
+                # Deployed without the pyarrow layer (see build_pyarrow_layer.sh)
+                return {
+                    "statusCode": 501,
+                    "body": str(e)
+                }
+
+        url = s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': UPLOADS_BUCKET, 'Key': key},
+            ExpiresIn=EXPORT_URL_EXPIRES_SECONDS
+        )
+        return {
+            "statusCode": 200,
+            "body": {
+                "jobId": job_id,
+                "kind": kind,
+                "format": format,
+                "compression": compression,
+                "key": key,
+                "url": url,
+                "expiresIn": EXPORT_URL_EXPIRES_SECONDS,
+                "reused": reused
+            }
+        }
+
+    except Exception as e:
+        print(f"Error exporting job results: {e}")
+        return {
+            "statusCode": 500,
+            "body": f"Internal server error: {str(e)}"
+        }
@@ -1,17 +1,53 @@
-import boto3
 import os
+from collections import OrderedDict
+from aws_clients import get_item, get_s3_client
+from result_store import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    ResultIndex,
+    decode_cursor,
+    encode_cursor,
+    load_index,
+    project,
+    read_page
+)
 
 # Environment variables from serverless.yml
 JOBS_TABLE = os.environ['JOBS_TABLE']
+UPLOADS_BUCKET = os.environ['UPLOADS_BUCKET']
 
-# AWS resources
-dynamodb = boto3.resource('dynamodb')
-jobs_table = dynamodb.Table(JOBS_TABLE)
+# Result indexes of completed jobs, kept across warm invocations (dashboards poll the same jobs)
+_index_cache = OrderedDict()
+INDEX_CACHE_SIZE = 32
+
+def get_index(job_id, manifest):
+    """Returns the (cached) result index of a completed job, or None if it has none."""
+    if job_id in _index_cache:
+        _index_cache.move_to_end(job_id)
+        return _index_cache[job_id]
+    index = load_index(get_s3_client(), UPLOADS_BUCKET, manifest)
+    if index is not None:
+        _index_cache[job_id] = index
+        if len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+def split_param(value):
+    """Splits a comma-separated query parameter into a list of non-empty values."""
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
 
 def get_results(event, context):
     """
     Lambda for GET /jobs/{jobId}/results
-    Retrieves job status and results from DynamoDB using the jobId path parameter.
+    Retrieves job status, progress and one page of results using the jobId path parameter.
+    While a job is 'processing', the results flushed so far are returned.
+
+    Query parameters:
+    - limit: page size (default 100, at most 1000).
+    - cursor: the nextCursor of the previous page (with the same filters).
+    - classification: comma-separated classifications to return (e.g. requirement,recommendation).
+    - xpathPrefix: only results of this section and the sections nested in it.
+    - fields: comma-separated result fields to return (all fields by default).
     """
     try:
         # Extract jobId from path parameters
@@ -24,9 +60,24 @@ def get_results(event, context):
                 "body": "Missing jobId in path parameters"
             }
 
-        # Fetch job record from DynamoDB
-        response = jobs_table.get_item(Key={'jobId': job_id})
-        item = response.get('Item')
+        # Pagination parameters
+        query_params = event.get('queryStringParameters') or {}
+        try:
+            limit = int(query_params.get('limit', DEFAULT_PAGE_SIZE))
+            offset = decode_cursor(query_params['cursor']) if query_params.get('cursor') else 0
+        except ValueError as e:
+            return {
+                "statusCode": 400,
+                "body": f"Invalid pagination parameters: {e}"
+            }
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            return {
+                "statusCode": 400,
+                "body": f"limit must be between 1 and {MAX_PAGE_SIZE}"
+            }
+
+        # Fetch job record from DynamoDB (manifest only, not the results themselves)
+        item = get_item(JOBS_TABLE, {'jobId': job_id})
 
         # Return 404 if the job does not exist.
         if not item:
@@ -35,13 +86,52 @@ def get_results(event, context):
                 "body": f"Job {job_id} not found"
             }
 
-        # Return job status and results
+        # Filters and projection
+        classifications = split_param(query_params.get('classification'))
+        xpath_prefix = query_params.get('xpathPrefix')
+        fields = split_param(query_params.get('fields'))
+
+        manifest = item.get('resultsManifest')
+        if manifest:
+            positions = None
+            if classifications or xpath_prefix:
+                index = get_index(job_id, manifest)
+                if index is None:
+                    return {
+                        "statusCode": 409,
+                        "body": "Filtering is available once the job is complete"
+                    }
+                positions = index.positions(classifications, xpath_prefix)
+            results, next_offset, total = read_page(
+                get_s3_client(), UPLOADS_BUCKET, manifest, offset, limit, positions=positions
+            )
+        else:
+            # Jobs processed before results moved to S3 keep them in the item
+            all_results = item.get('results', [])
+            if classifications or xpath_prefix:
+                index = ResultIndex()
+                for position, result in enumerate(all_results):
+                    index.add(position, result)
+                index.finish()
+                all_results = [all_results[i] for i in index.positions(classifications, xpath_prefix)]
+            results = all_results[offset:offset + limit]
+            next_offset = offset + limit if offset + limit < len(all_results) else None
+            total = len(all_results)
+
+        # Return job status and one page of results
         return {
             "statusCode": 200,
             "body": {
                 "jobId": job_id,
                 "status": item.get('status', 'unknown'),
-                "results": item.get('results', [])
+                "sectionsTotal": int(item['sectionsTotal']) if 'sectionsTotal' in item else None,
+                "sectionsParsed": int(item.get('sectionsParsed', item.get('sectionsTotal', 0))),
+                "sectionsDone": int(item.get('sectionsDone', 0)),
+                "failedSections": item.get('failedSections', []),
+                "executionMode": item.get('executionMode', 'interactive'),
+                "total": total,
+                "results": project(results, fields),
+                "nextCursor": encode_cursor(next_offset) if next_offset is not None else None
             }
         }
 
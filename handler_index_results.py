@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+from aws_clients import get_s3_client
+from llm.embeddings import get_embedder
+from metrics import configure_logging, start_job
+from search_index import SEGMENTS_PREFIX, build_segment, read_job_results, upload_index
+
+# Environment variables from serverless.yml
+UPLOADS_BUCKET = os.environ['UPLOADS_BUCKET']
+
+configure_logging()
+
+def index_results(event, context):
+    """
+    Lambda triggered by the S3 'ObjectCreated:*' event of 'results/<jobId>/index.json.gz', which
+    is written when a job completes. Embeds the job's requirements and uploads them as a search
+    index segment (see `search_index`).
+    """
+    s3_client = get_s3_client()
+    for record in event.get('Records', []):
+        s3_key = record['s3']['object']['key']
+        job_id = s3_key.split('/')[1]
+        job_metrics = start_job()
+
+        results = read_job_results(s3_client, UPLOADS_BUCKET, job_id)
+        directory = tempfile.mkdtemp(prefix='segment-')
+        try:
+            segment = build_segment(get_embedder(), job_id, results, directory)
+            upload_index(s3_client, UPLOADS_BUCKET, directory, f"{SEGMENTS_PREFIX}{job_id}/")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        print(f"Indexed {segment.count} requirements of job {job_id}")
+        job_metrics.emit({'Function': 'indexResults'}, jobId=job_id, requirements=segment.count)
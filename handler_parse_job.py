@@ -1,22 +1,140 @@
-import boto3
 import os
+import time
 from datetime import datetime, timezone
-from app_main import extract_requirements_from_xml
+from aws_clients import get_s3_client, get_sqs_client, get_table
+from app_main import iter_section_results, pipeline_version
+import dedup
+from batch_execution import advance_batch_job
+from glossary import job_glossary, save_glossary
+from llm.llm_client import get_batch_provider
+from metrics import configure_logging, span, start_job, timed
+from result_store import ShardWriter
+from section_store import DynamoDBSectionStore
+from work_distribution import SQSWorkQueue, claim_aggregation, iter_tasks, run_aggregation
 
 # Environment variables from serverless.yml
 UPLOADS_BUCKET = os.environ['UPLOADS_BUCKET']
 JOBS_TABLE = os.environ['JOBS_TABLE']
+SECTIONS_TABLE = os.environ.get('SECTIONS_TABLE')
+WORK_QUEUE_URL = os.environ.get('WORK_QUEUE_URL')
+# Dispatch the sections of a document to section workers instead of processing them here
+DISTRIBUTED_PROCESSING = os.environ.get('DISTRIBUTED_PROCESSING', 'false').lower() == 'true'
+# Partial results are flushed to S3 and the job record after this many sections or seconds
+RESULTS_FLUSH_SECTIONS = int(os.environ.get('RESULTS_FLUSH_SECTIONS', '25'))
+RESULTS_FLUSH_SECONDS = float(os.environ.get('RESULTS_FLUSH_SECONDS', '10'))
+# At most this many failed sections are listed on the job record
+MAX_FAILED_SECTIONS = 100
 
-# AWS resources
-s3_client = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
-jobs_table = dynamodb.Table(JOBS_TABLE)
+configure_logging()
+
+@timed('write_job')
+def update_progress(job_id, status, writer, progress, sections_done, failed_sections, extra=None):
+    """
+    Writes the current results manifest and progress counters to the job record.
+
+    Args:
+        job_id (str): The job.
+        status (str): 'processing' or 'complete'.
+        writer (ShardWriter): Writer holding the manifest of the shards flushed so far.
+        progress (dict): Progress of the pipeline ('sectionsParsed', 'sectionsTotal' once the
+            document has been parsed; sectionsTotal is removed from the record until then).
+        sections_done (int): Number of sections whose results have been flushed.
+        failed_sections (list[dict]): Sections that could not be processed.
+        extra (dict, optional): Additional attributes to set.
+    """
+    values = {
+        ':status': status,
+        ':manifest': writer.manifest,
+        ':count': writer.manifest['total'],
+        ':parsed': progress.get('sectionsParsed', 0),
+        ':done': sections_done,
+        ':failed': failed_sections[:MAX_FAILED_SECTIONS],
+        ':failedCount': len(failed_sections),
+        ':updatedAt': datetime.now(timezone.utc).isoformat()
+    }
+    expression = ("SET #s = :status, resultsManifest = :manifest, resultsCount = :count, "
+                  "sectionsParsed = :parsed, sectionsDone = :done, failedSections = :failed, "
+                  "failedSectionsCount = :failedCount, updatedAt = :updatedAt")
+    for i, (name, value) in enumerate((extra or {}).items()):
+        expression += f", {name} = :extra{i}"
+        values[f':extra{i}'] = value
+    if 'sectionsTotal' in progress:
+        expression += ", sectionsTotal = :total"
+        values[':total'] = progress['sectionsTotal']
+    else:
+        expression += " REMOVE sectionsTotal"
+
+    get_table(JOBS_TABLE).update_item(
+        Key={'jobId': job_id},
+        UpdateExpression=expression,
+        ExpressionAttributeNames={
+            "#s": "status"
+        },
+        ExpressionAttributeValues=values
+    )
+
+def dispatch_job(job_id, body):
+    """
+    Streams the document into tasks on the work queue (see `work_distribution`). The job is
+    completed by whoever finishes its last task.
+
+    Args:
+        job_id (str): The job.
+        body (file-like): The XML document.
+    """
+    s3_client = get_s3_client()
+    jobs_table = get_table(JOBS_TABLE)
+    jobs_table.update_item(
+        Key={'jobId': job_id},
+        UpdateExpression="SET #s = :status, sectionsDone = :zero REMOVE doneTasks, tasksTotal, sectionsTotal",
+        ExpressionAttributeNames={"#s": "status"},
+        ExpressionAttributeValues={':status': 'processing', ':zero': 0}
+    )
+
+    queue = SQSWorkQueue(get_sqs_client(), WORK_QUEUE_URL, s3_client, UPLOADS_BUCKET)
+    tasks_total = 0
+    sections_total = 0
+    for task in iter_tasks(body, job_id):
+        queue.send(task)
+        tasks_total += 1
+        sections_total += len(task['sections'])
+    queue.flush()
+    print(f"Dispatched {sections_total} sections as {tasks_total} tasks")
+
+    jobs_table.update_item(
+        Key={'jobId': job_id},
+        UpdateExpression="SET tasksTotal = :tasks, sectionsTotal = :sections",
+        ExpressionAttributeValues={':tasks': tasks_total, ':sections': sections_total}
+    )
+    # All tasks may already be done (or the document may have no sections at all)
+    if tasks_total == 0:
+        run_aggregation(s3_client, UPLOADS_BUCKET, jobs_table, job_id, 0)
+    elif claim_aggregation(jobs_table, job_id):
+        run_aggregation(s3_client, UPLOADS_BUCKET, jobs_table, job_id, tasks_total)
 
 def parse_job(event, context):
     """
-    Lambda triggered by S3 'ObjectCreated:*' event.
-    Fetches XML file from S3, parses it, and updates DynamoDB with results.
+    Lambda triggered by S3 'ObjectCreated:*' event for uploaded '.xml' files.
+    Fetches XML file from S3, parses it, writes the results to S3 as compressed JSON Lines
+    shards (see `result_store`) and stores their manifest on the job in DynamoDB.
+
+    Results are flushed in batches while the document is processed: the job is 'processing'
+    with sectionsParsed/sectionsDone counters (and sectionsTotal once the whole document has been
+    parsed) and partial results until it becomes 'complete'.
+    Sections that fail are listed in failedSections instead of failing the whole job.
+    Requirements are linked to the terms defined in the document (and in the jobs listed in
+    glossaryJobIds), whose glossary is stored with the results (see `glossary`). Results are
+    annotated with their near-duplicate clusters across jobs when DEDUP_STORE is set (see `dedup`).
+
+    With DISTRIBUTED_PROCESSING, the sections are dispatched to section workers instead (see
+    `dispatch_job`); results become available when the job is complete.
+
+    Jobs submitted with executionMode 'batch' only submit their first batch of LLM requests here;
+    the pollBatches function takes them further (see `batch_execution`).
     """
+    job_id = None
+    s3_client = get_s3_client()
+    jobs_table = get_table(JOBS_TABLE)
     try:
         # S3 event payload contains bucket and object key
         records = event.get('Records', [])
@@ -26,31 +144,96 @@ def parse_job(event, context):
 
             # Extract jobId from filename (assuming format: jobId.xml)
             job_id = os.path.splitext(s3_key)[0]
+            job_metrics = start_job()
 
-            # Download XML from S3
+            # Sections unchanged since a previous version of the document are reused
+            job = jobs_table.get_item(Key={'jobId': job_id}).get('Item') or {}
+            section_store = None
+            if SECTIONS_TABLE:
+                section_store = DynamoDBSectionStore(
+                    SECTIONS_TABLE,
+                    job.get('documentId', job_id),
+                    pipeline_version()
+                )
+
+            if job.get('executionMode') == 'batch':
+                advance_batch_job(s3_client, UPLOADS_BUCKET, jobs_table, job, get_batch_provider(),
+                                  section_store=section_store)
+                continue
+
+            # Stream XML from S3; sections are processed while the object downloads
             response = s3_client.get_object(Bucket=s3_bucket, Key=s3_key)
-            xml_content = response['Body'].read()
-
-            # Parse XML and extract requirements
-            results = extract_requirements_from_xml(xml_content)
-
-            # Update DynamoDB with results and status
-            jobs_table.update_item(
-                Key={'jobId': job_id},
-                UpdateExpression="SET #s = :status, results = :results, processedAt = :processedAt",
-                ExpressionAttributeNames={
-                    "#s": "status"
-                },
-                ExpressionAttributeValues={
-                    ':status': 'complete',
-                    ':results': results,
-                    ':processedAt': datetime.now(timezone.utc).isoformat()
-                }
-            )
+
+            if DISTRIBUTED_PROCESSING and WORK_QUEUE_URL:
+                dispatch_job(job_id, response['Body'])
+                continue
+
+            # Parse XML, extract requirements and flush them in batches as sections complete
+            writer = ShardWriter(s3_client, UPLOADS_BUCKET, job_id)
+            glossary = job_glossary(s3_client, UPLOADS_BUCKET, job)
+            deduplicator = dedup.Deduplicator(dedup.dedup_store, job_id) if dedup.dedup_store else None
+            progress = {}
+            failed_sections = []
+            sections_done = 0
+            unflushed = 0
+            last_flush = time.monotonic()
+            update_progress(job_id, 'processing', writer, progress, sections_done, failed_sections)
+
+            for section_result in iter_section_results(
+                    response['Body'], section_store=section_store, progress=progress, glossary=glossary):
+                if deduplicator:
+                    with span('dedup'):
+                        deduplicator.annotate(section_result.requirements, writer.count)
+                with span('write_results'):
+                    for requirement in section_result.requirements:
+                        writer.add(requirement)
+                if section_result.error is not None:
+                    failed_sections.append({
+                        'section_xpath': section_result.section.xpath,
+                        'error': section_result.error
+                    })
+                unflushed += 1
+
+                if unflushed >= RESULTS_FLUSH_SECTIONS or time.monotonic() - last_flush >= RESULTS_FLUSH_SECONDS:
+                    with span('write_results'):
+                        writer.flush()
+                    sections_done += unflushed
+                    unflushed = 0
+                    last_flush = time.monotonic()
+                    update_progress(job_id, 'processing', writer, progress, sections_done, failed_sections)
+
+            with span('write_results'):
+                writer.close()
+                writer.manifest['glossary'] = save_glossary(s3_client, UPLOADS_BUCKET, job_id, glossary)
+            sections_done += unflushed
+
+            # Final manifest (with index), counters, status and job metrics
+            update_progress(job_id, 'complete', writer, progress, sections_done, failed_sections, extra={
+                'processedAt': datetime.now(timezone.utc).isoformat(),
+                'sectionsReused': section_store.stats['reused'] if section_store else 0,
+                'sectionsProcessed': section_store.stats['processed'] if section_store else 0,
+                'duplicateRequirements': deduplicator.stats['duplicates'] if deduplicator else 0,
+                'metrics': job_metrics.to_item()
+            })
+            job_metrics.emit({'Function': 'parseJob'}, jobId=job_id, sections=sections_done)
 
     except Exception as e:
         print(f"Error processing S3 event: {e}")
-        # Optionally update DynamoDB status to 'failed'
-        # jobs_table.update_item(...)
+        if job_id:
+            try:
+                jobs_table.update_item(
+                    Key={'jobId': job_id},
+                    UpdateExpression="SET #s = :status, #e = :error",
+                    ExpressionAttributeNames={
+                        "#s": "status",
+                        "#e": "error"
+                    },
+                    ExpressionAttributeValues={
+                        ':status': 'failed',
+                        ':error': str(e)
+                    }
+                )
+            except Exception as update_error:
+                print(f"Error marking job {job_id} as failed: {update_error}")
 
         raise e
@@ -1,10 +1,77 @@
-from app_main import extract_requirements_from_xml
+import json
+from app_main import extract_requirements_from_xml, iter_section_results
+from metrics import configure_logging, start_job
+from result_records import RecordEncoder
+
+# Content type of streamed results: one JSON record per line
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+configure_logging()
+
+def iter_ndjson(source, job_metrics):
+    """
+    Yields the results of a document as NDJSON lines while its sections are processed.
+
+    Every section with requirements, definitions or an error becomes one 'section' record, in
+    document order, as soon as it and all sections before it are done. A final 'summary'
+    record holds the totals, the failed sections and the job metrics.
+
+    Args:
+        source (str | bytes | file-like): The XML document, see `xml_ingest.open_source`.
+        job_metrics (JobMetrics): Metrics of the request, summarized in the last record.
+
+    Yields:
+        str: One JSON record followed by a newline.
+    """
+    encoder = RecordEncoder()
+    sections = 0
+    requirements = 0
+    definitions = 0
+    failed_sections = []
+    for section_result in iter_section_results(source):
+        sections += 1
+        requirements += len(section_result.requirements)
+        definitions += len(section_result.definitions)
+        if section_result.error is not None:
+            failed_sections.append({'section_xpath': section_result.section.xpath, 'error': section_result.error})
+        elif not section_result.requirements and not section_result.definitions:
+            continue
+        yield "".join([
+            '{"type": "section", "section_xpath": ', json.dumps(section_result.section.xpath, ensure_ascii=False),
+            ', "title": ', json.dumps(section_result.section.title, ensure_ascii=False),
+            ', "requirements": ', encoder.encode_array(section_result.requirements),
+            ', "definitions": ', json.dumps([definition.model_dump() for definition in section_result.definitions],
+                                            ensure_ascii=False),
+            ', "error": ', json.dumps(section_result.error, ensure_ascii=False),
+            "}\n"
+        ])
+
+    yield json.dumps({
+        'type': 'summary',
+        'sections': sections,
+        'requirements': requirements,
+        'definitions': definitions,
+        'failedSections': failed_sections,
+        'metrics': job_metrics.summary()
+    }, ensure_ascii=False) + "\n"
+
+def wants_ndjson(event):
+    """True if the client asked for streamed results (?stream=true or Accept: application/x-ndjson)."""
+    query_params = event.get('queryStringParameters') or {}
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    return (query_params.get('stream', '').lower() == 'true'
+            or NDJSON_CONTENT_TYPE in headers.get('accept', ''))
 
 def parse_sync(event, context):
     """
     Lambda for POST /parse/sync
     Receives XML content in the request body, parses it synchronously,
     and returns results immediately.
+
+    With ?stream=true or Accept: application/x-ndjson, the results are returned as NDJSON
+    section records followed by a summary record (see `iter_ndjson`). The Python Lambda runtime
+    buffers the response, so the records arrive together; local callers and streaming-capable
+    hosts can consume `iter_ndjson` as the sections complete.
     """
     try:
         # Get raw XML content from request body
@@ -15,15 +82,25 @@ def parse_sync(event, context):
                 "body": "Missing XML content in request body"
             }
 
+        job_metrics = start_job()
+        if wants_ndjson(event):
+            body = "".join(iter_ndjson(xml_content, job_metrics))
+            job_metrics.emit({'Function': 'parseSync'})
+            return {
+                "statusCode": 200,
+                "headers": {"Content-Type": NDJSON_CONTENT_TYPE},
+                "body": body
+            }
+
         # Parse XML and extract requirements
         results = extract_requirements_from_xml(xml_content)
+        job_metrics.emit({'Function': 'parseSync'}, requirements=len(results))
 
-        # Returns a JSON response containing a results array.
+        # Returns a JSON response containing a results array, encoded without intermediate dicts
         return {
             "statusCode": 200,
-            "body": {
-                "results": results
-            }
+            "headers": {"Content-Type": "application/json"},
+            "body": '{"results": ' + RecordEncoder().encode_array(results) + '}'
         }
 
     except Exception as e:
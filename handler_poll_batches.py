@@ -0,0 +1,59 @@
+import os
+from aws_clients import get_s3_client, get_table
+from app_main import pipeline_version
+from batch_execution import BATCH_PENDING_INDEX, poll_batch_job
+from llm.llm_client import get_batch_provider
+from metrics import configure_logging, start_job
+from section_store import DynamoDBSectionStore
+
+# Environment variables from serverless.yml
+UPLOADS_BUCKET = os.environ['UPLOADS_BUCKET']
+JOBS_TABLE = os.environ['JOBS_TABLE']
+SECTIONS_TABLE = os.environ.get('SECTIONS_TABLE')
+
+configure_logging()
+
+def poll_batches(event, context):
+    """
+    Scheduled Lambda. Checks the provider batches of all batch jobs waiting for one and runs the
+    next pass of each job whose batch has finished (see `batch_execution`): it either submits
+    the next batch or completes the job. The waiting jobs are read from the sparse batchPending
+    index, so the cost of a poll does not grow with the number of jobs ever submitted.
+
+    A job whose batch failed, or whose next pass raises, is marked 'failed'.
+    """
+    s3_client = get_s3_client()
+    jobs_table = get_table(JOBS_TABLE)
+    provider = get_batch_provider()
+
+    query_kwargs = {
+        'IndexName': BATCH_PENDING_INDEX,
+        'KeyConditionExpression': "batchPending = :pending",
+        'FilterExpression': "attribute_exists(batchId) AND #s = :processing",
+        'ExpressionAttributeNames': {"#s": "status"},
+        'ExpressionAttributeValues': {':pending': 'pending', ':processing': 'processing'}
+    }
+    while True:
+        page = jobs_table.query(**query_kwargs)
+        for job in page.get('Items', []):
+            job_id = job['jobId']
+            job_metrics = start_job()
+            section_store = None
+            if SECTIONS_TABLE:
+                section_store = DynamoDBSectionStore(SECTIONS_TABLE, job.get('documentId', job_id), pipeline_version())
+            try:
+                status = poll_batch_job(s3_client, UPLOADS_BUCKET, jobs_table, job, provider, section_store=section_store)
+                print(f"Batch {job['batchId']} of job {job_id}: {status}")
+                if status != 'in_progress':
+                    job_metrics.emit({'Function': 'pollBatches'}, jobId=job_id, batchId=job['batchId'])
+            except Exception as e:
+                print(f"Error advancing batch job {job_id}: {e}")
+                jobs_table.update_item(
+                    Key={'jobId': job_id},
+                    UpdateExpression="SET #s = :status, #e = :error REMOVE batchPending",
+                    ExpressionAttributeNames={"#s": "status", "#e": "error"},
+                    ExpressionAttributeValues={':status': 'failed', ':error': str(e)}
+                )
+        if 'LastEvaluatedKey' not in page:
+            break
+        query_kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
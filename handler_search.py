@@ -0,0 +1,82 @@
+import os
+import time
+from aws_clients import get_s3_client
+from llm.embeddings import get_embedder
+from search_index import CLASSIFICATIONS, load_search_indexes, search_indexes
+
+# Environment variables from serverless.yml
+UPLOADS_BUCKET = os.environ['UPLOADS_BUCKET']
+# Local copy of the index in the Lambda's ephemeral storage, kept across warm invocations
+SEARCH_INDEX_DIR = os.environ.get('SEARCH_INDEX_DIR', '/tmp/search-index')
+# Seconds before a warm instance checks S3 for new segments
+SEARCH_INDEX_REFRESH_SECONDS = float(os.environ.get('SEARCH_INDEX_REFRESH_SECONDS', '60'))
+DEFAULT_SEARCH_RESULTS = 10
+MAX_SEARCH_RESULTS = 100
+
+_indexes = None
+_loaded_at = 0.0
+
+def get_indexes():
+    """Returns the memory-mapped search indexes, refreshed every SEARCH_INDEX_REFRESH_SECONDS."""
+    global _indexes, _loaded_at
+    if _indexes is None or time.monotonic() - _loaded_at > SEARCH_INDEX_REFRESH_SECONDS:
+        os.makedirs(SEARCH_INDEX_DIR, exist_ok=True)
+        _indexes = load_search_indexes(get_s3_client(), UPLOADS_BUCKET, SEARCH_INDEX_DIR)
+        _loaded_at = time.monotonic()
+    return _indexes
+
+def search(event, context):
+    """
+    Handles GET /search
+    Returns the requirements of all completed jobs most similar to a query text.
+
+    Query parameters:
+    - q: the query text (required).
+    - k: number of results, 1 to MAX_SEARCH_RESULTS (default 10).
+    - classification: comma-separated classifications to search (e.g. requirement,permission).
+    """
+    try:
+        query_params = event.get('queryStringParameters') or {}
+        query = (query_params.get('q') or '').strip()
+        if not query:
+            return {
+                "statusCode": 400,
+                "body": "Missing query parameter q"
+            }
+        try:
+            k = int(query_params.get('k', DEFAULT_SEARCH_RESULTS))
+        except ValueError:
+            k = 0
+        if not 1 <= k <= MAX_SEARCH_RESULTS:
+            return {
+                "statusCode": 400,
+                "body": f"k must be between 1 and {MAX_SEARCH_RESULTS}"
+            }
+        classifications = [c.strip() for c in (query_params.get('classification') or '').split(',') if c.strip()]
+        unknown = [c for c in classifications if c not in CLASSIFICATIONS]
+        if unknown:
+            return {
+                "statusCode": 400,
+                "body": f"Unknown classification(s): {', '.join(unknown)}"
+            }
+
+        embedder = get_embedder()
+        indexes = [index for index in get_indexes() if index.embedder == embedder.name]
+        query_vector = embedder.embed([query])[0]
+        results = search_indexes(indexes, query_vector, k=k, classifications=classifications or None)
+
+        return {
+            "statusCode": 200,
+            "body": {
+                "query": query,
+                "indexed": sum(index.count for index in indexes),
+                "results": results
+            }
+        }
+
+    except Exception as e:
+        print(f"Error searching requirements: {e}")
+        return {
+            "statusCode": 500,
+            "body": f"Internal server error: {str(e)}"
+        }
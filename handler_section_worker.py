@@ -0,0 +1,81 @@
+import os
+from aws_clients import get_s3_client, get_sqs_client, get_table
+from app_main import pipeline_version
+from metrics import configure_logging, start_job
+from section_store import DynamoDBSectionStore
+from work_distribution import (
+    SQSWorkQueue,
+    claim_aggregation,
+    encode_task_result,
+    record_task_done,
+    run_aggregation,
+    run_task,
+    task_result_key
+)
+
+# Environment variables from serverless.yml
+UPLOADS_BUCKET = os.environ['UPLOADS_BUCKET']
+JOBS_TABLE = os.environ['JOBS_TABLE']
+SECTIONS_TABLE = os.environ.get('SECTIONS_TABLE')
+WORK_QUEUE_URL = os.environ.get('WORK_QUEUE_URL')
+
+configure_logging()
+
+def process_tasks(event, context):
+    """
+    Lambda triggered by the work queue (SQS). Processes the section tasks dispatched by
+    `parse_job`, stores their results and records them on the job. The worker that finishes
+    the last task of a job aggregates its results (see `work_distribution`).
+
+    Tasks that raise are retried by SQS and end up in the dead-letter queue; failures of single
+    sections are part of the task result instead. A failed or timed-out aggregation is retried
+    with the redelivered task message of the worker that claimed it; a redelivered task that is
+    already recorded on the job is not processed again.
+    """
+    s3_client = get_s3_client()
+    jobs_table = get_table(JOBS_TABLE)
+    queue = SQSWorkQueue(get_sqs_client(), WORK_QUEUE_URL, s3_client, UPLOADS_BUCKET)
+
+    for record in event.get('Records', []):
+        task = queue.load(record['body'])
+        job_id = task['jobId']
+        task_metrics = start_job()
+        job = jobs_table.get_item(Key={'jobId': job_id}, ConsistentRead=True).get('Item') or {}
+
+        # A redelivered task may belong to an aggregation that timed out or failed; it is retried
+        # through the claim below, without processing the task again
+        redelivered = task['taskId'] in job.get('doneTasks', set())
+        if not redelivered:
+            section_store = None
+            if SECTIONS_TABLE:
+                section_store = DynamoDBSectionStore(
+                    SECTIONS_TABLE,
+                    job.get('documentId', job_id),
+                    pipeline_version(mode=task.get('mode'))
+                )
+
+            section_results = run_task(task, section_store=section_store)
+            s3_client.put_object(
+                Bucket=UPLOADS_BUCKET,
+                Key=task_result_key(job_id, task['taskId']),
+                Body=encode_task_result(section_results, task_metrics.summary()),
+                ContentType='application/gzip'
+            )
+
+            # Per task; CloudWatch aggregates the tasks of a job by the jobId property
+            task_metrics.emit({'Function': 'sectionWorker'}, jobId=job_id, taskId=task['taskId'])
+
+            # A concurrent delivery of the same task may have finished first
+            redelivered = not record_task_done(jobs_table, job_id, task['taskId'], len(section_results))
+        if redelivered:
+            print(f"Task {task['taskId']} of job {job_id} was already done")
+        if claim_aggregation(jobs_table, job_id):
+            # The task metrics are part of its result; the aggregation is measured separately
+            start_job()
+            job = jobs_table.get_item(Key={'jobId': job_id}, ConsistentRead=True)['Item']
+            run_aggregation(s3_client, UPLOADS_BUCKET, jobs_table, job_id, int(job['tasksTotal']))
+        elif redelivered:
+            job = jobs_table.get_item(Key={'jobId': job_id}, ConsistentRead=True).get('Item') or {}
+            if job.get('status') == 'aggregating':
+                # Keep the message until the aggregation completed or its lease expired
+                raise RuntimeError(f"Job {job_id} is still being aggregated, retrying task {task['taskId']} later")
@@ -1,24 +1,35 @@
-import boto3
 import uuid
 import os
 from datetime import datetime, timezone
+from aws_clients import get_s3_client, get_table
 
 # Environment variables set in serverless.yml
 UPLOADS_BUCKET = os.environ['UPLOADS_BUCKET']
 JOBS_TABLE = os.environ['JOBS_TABLE']
-
-# AWS resources
-s3_client = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
-jobs_table = dynamodb.Table(JOBS_TABLE)
+# Default execution mode of jobs: interactive (LLM requests one by one) or batch (provider batch API)
+JOB_EXECUTION_MODE = os.environ.get('JOB_EXECUTION_MODE', 'interactive')
+EXECUTION_MODES = ('interactive', 'batch')
 
 def submit_job(event, context):
     """
     Handles POST /jobs
     Expects a multipart/form-data with 'file' field containing XML.
     Note: Send your XML as Content-Type: application/xml or text/plain, API Gateway passes it as raw text.
+
+    Optional query parameters link the job to a document lineage, so that a revised version only
+    re-processes the sections that changed:
+    - documentId: identifier of the document (all its versions share it).
+    - baseJobId: a previous job of the same document; its documentId is reused.
+
+    - executionMode: 'interactive' (default) or 'batch', which sends the LLM requests through the
+      provider batch API: cheaper and with a larger quota, but results can take up to 24 hours.
+    - glossaryFrom: comma-separated jobs (e.g. other parts of a standard series) whose defined
+      terms are linked in this document's requirements, in addition to its own.
     """
     try:
+        s3_client = get_s3_client()
+        jobs_table = get_table(JOBS_TABLE)
+
         # Extract the file from the event
         xml_content = event.get('body', '')
         if not xml_content:
@@ -30,6 +41,29 @@ def submit_job(event, context):
         # Generate a unique job ID
         job_id = str(uuid.uuid4())
 
+        # Resolve the document lineage (defaults to a new lineage for this job)
+        query_params = event.get('queryStringParameters') or {}
+        document_id = query_params.get('documentId')
+        base_job_id = query_params.get('baseJobId')
+        if base_job_id and not document_id:
+            base_job = jobs_table.get_item(Key={'jobId': base_job_id}).get('Item')
+            if not base_job:
+                return {
+                    "statusCode": 404,
+                    "body": f"Base job {base_job_id} not found"
+                }
+            document_id = base_job.get('documentId', base_job_id)
+        document_id = document_id or job_id
+
+        execution_mode = query_params.get('executionMode', JOB_EXECUTION_MODE)
+        if execution_mode not in EXECUTION_MODES:
+            return {
+                "statusCode": 400,
+                "body": f"executionMode must be one of: {', '.join(EXECUTION_MODES)}"
+            }
+
+        glossary_job_ids = [job.strip() for job in (query_params.get('glossaryFrom') or '').split(',') if job.strip()]
+
         # Upload XML to S3
         s3_key = f"{job_id}.xml"
         s3_client.put_object(
@@ -40,20 +74,22 @@ def submit_job(event, context):
         )
 
         # Store job metadata in DynamoDB
-        jobs_table.put_item(
-            Item={
-                'jobId': job_id,
-                'status': 'pending',
-                's3Key': s3_key,
-                'createdAt': datetime.now(timezone.utc).isoformat(),
-                'results': []
-            }
-        )
+        item = {
+            'jobId': job_id,
+            'status': 'pending',
+            's3Key': s3_key,
+            'documentId': document_id,
+            'executionMode': execution_mode,
+            'createdAt': datetime.now(timezone.utc).isoformat()
+        }
+        if glossary_job_ids:
+            item['glossaryJobIds'] = glossary_job_ids
+        jobs_table.put_item(Item=item)
 
         # Return job ID to client
         return {
             "statusCode": 201,
-            "body": f'{{"jobId": "{job_id}", "status": "pending"}}'
+            "body": f'{{"jobId": "{job_id}", "documentId": "{document_id}", "executionMode": "{execution_mode}", "status": "pending"}}'
         }
 
     except Exception as e:
@@ -0,0 +1,337 @@
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+
+import metrics
+from llm import rate_limiter
+from llm.tokens import count_tokens
+
+"""
+Description:
+    LLM backends behind `llm_client.get_backend()`. A backend turns a structured request (model,
+    messages, pydantic response format) into a parsed response:
+
+        backend.parse(model=..., input=[...], text_format=SomeModel, **kwargs) -> SomeModel
+
+    Every call goes through the shared rate limiter and is retried on 429/5xx errors (see
+    `rate_limiter`), and is reported to `metrics` with its latency and token usage.
+
+    - OpenAIBackend: the OpenAI Responses API (production).
+    - FakeBackend: deterministic offline stand-in. It answers from the section text embedded in
+      the prompt (rule sentences, "X means Y" definitions, keyword-based section types) and can
+      simulate latency, errors and rate limiting, for benchmarks and local runs.
+    - RecordingBackend / ReplayBackend: record the responses of another backend to a JSON Lines
+      trace and replay them later without network access.
+
+    The backend is selected with the LLM_BACKEND environment variable:
+        "openai" (default), "fake", "record:<path>" (OpenAI, recorded) or "replay:<path>".
+"""
+
+class BackendError(Exception):
+    """Error returned by a backend, with the HTTP status code of the equivalent API error."""
+
+    def __init__(self, message, status_code=500, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+class Backend:
+    """Base class of the backends; counts calls and failures in `stats`."""
+
+    # Requests go through the rate limiter and are retried (False for backends without quota)
+    rate_limited = True
+
+    def __init__(self):
+        self.stats = {'calls': 0, 'errors': 0, 'rate_limited': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    def parse(self, model, input, text_format, **kwargs):
+        """
+        Sends a request, waiting for the rate limiter and retrying transient errors.
+
+        Raises:
+            Exception: The error of the last attempt, or a BackendError if the model returned
+                no parsed output (e.g. a refusal).
+        """
+        def call():
+            return self._call(model, input, text_format, **kwargs)
+
+        if self.rate_limited:
+            estimated_tokens = (sum(count_tokens(message['content']) for message in input)
+                                + kwargs.get('max_output_tokens', rate_limiter.LLM_OUTPUT_TOKENS_ESTIMATE))
+            parsed, _, _ = rate_limiter.call_with_retries(call, estimated_tokens)
+        else:
+            parsed, _, _ = call()
+        if parsed is None:
+            raise BackendError(f"The model returned no parsed {text_format.__name__}", status_code=422)
+        return parsed
+
+    def _call(self, model, input, text_format, **kwargs):
+        """One attempt, counted in `stats` and reported to `metrics`."""
+        self._count('calls')
+        start = time.perf_counter()
+        try:
+            parsed, usage, headers = self._parse(model, input, text_format, **kwargs)
+        except Exception as e:
+            self._count('rate_limited' if getattr(e, 'status_code', None) == 429 else 'errors')
+            metrics.record_llm_call(model, time.perf_counter() - start)
+            raise
+        metrics.record_llm_call(model, time.perf_counter() - start, usage)
+        return parsed, usage, headers
+
+    def _parse(self, model, input, text_format, **kwargs):
+        """
+        Returns:
+            tuple[BaseModel | None, dict | None, Mapping | None]: The parsed response, its token
+                usage ('input_tokens', 'output_tokens', 'cached_tokens') and the response headers.
+        """
+        raise NotImplementedError
+
+class OpenAIBackend(Backend):
+    """Calls `client.responses.parse` of the OpenAI client."""
+
+    def _parse(self, model, input, text_format, **kwargs):
+        from llm.llm_client import get_client
+        # The raw response carries the x-ratelimit-* headers the rate limiter adapts to
+        raw = get_client().responses.with_raw_response.parse(model=model, input=input, text_format=text_format, **kwargs)
+        response = raw.parse()
+        usage = None
+        if response.usage is not None:
+            details = getattr(response.usage, 'input_tokens_details', None)
+            usage = {
+                'input_tokens': response.usage.input_tokens,
+                'output_tokens': response.usage.output_tokens,
+                'cached_tokens': getattr(details, 'cached_tokens', 0) or 0
+            }
+        return response.output_parsed, usage, raw.headers
+
+def request_key(model, input, text_format, **kwargs):
+    """Identifies a request in recorded traces."""
+    payload = json.dumps({
+        'model': model,
+        'input': input,
+        'format': text_format.__name__,
+        'params': kwargs
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+### FAKE BACKEND
+
+_QUOTED = re.compile(r'"""\s*(.*?)\s*"""', re.DOTALL)
+_SECTION_BLOCK = re.compile(r'<section id="([^"]+)">\n(.*?)\n</section>', re.DOTALL)
+_SENTENCE = re.compile(r'[^.!?]+[.!?]')
+_RULE_KEYWORDS = [
+    ('requirement', re.compile(r'\b(?:shall|must|required)\b', re.IGNORECASE)),
+    ('recommendation', re.compile(r'\b(?:should|recommended)\b', re.IGNORECASE)),
+    ('permission', re.compile(r'\b(?:may|optional)\b', re.IGNORECASE)),
+    ('possibility', re.compile(r'\b(?:can|might)\b', re.IGNORECASE)),
+]
+_DEFINITION = re.compile(r'^\s*(.+?)\s+means\s+(.+?)\.?\s*$', re.IGNORECASE)
+_TERMINOLOGY_TITLE = re.compile(r'\b(?:terms|definitions|glossary|terminology|abbreviations)\b', re.IGNORECASE)
+_OTHER_TITLE = re.compile(r'\b(?:foreword|preface|bibliography|references|index|contents)\b', re.IGNORECASE)
+
+def _split_title(block):
+    """Splits a "Title: ...\\n\\n<text>" block into (title, text)."""
+    if block.startswith('Title: '):
+        title, _, text = block[len('Title: '):].partition('\n\n')
+        return title.strip(), text
+    return "", block
+
+def _fake_rules(text):
+    rules = []
+    for match in _SENTENCE.finditer(text):
+        sentence = match.group().strip()
+        for classification, keyword in _RULE_KEYWORDS:
+            if keyword.search(sentence):
+                rules.append({'text': sentence, 'classification': classification})
+                break
+    return rules
+
+def _fake_concepts(text):
+    concepts = []
+    for match in _SENTENCE.finditer(text):
+        definition = _DEFINITION.match(match.group())
+        if definition:
+            concepts.append({'term': definition.group(1), 'definition': definition.group(2), 'abbreviations': []})
+    return concepts
+
+def _fake_section_type(title, text):
+    if _TERMINOLOGY_TITLE.search(title) or _fake_concepts(text):
+        return 'terminology'
+    if _OTHER_TITLE.search(title):
+        return 'other'
+    return 'normative_content' if _fake_rules(text) else 'other'
+
+def fake_response(input, text_format):
+    """
+    Builds a plausible response from the section text(s) embedded in the last user message.
+
+    Returns:
+        dict: The response, to be validated with `text_format`.
+    """
+    prompt = input[-1]['content']
+    name = text_format.__name__
+
+    blocks = _SECTION_BLOCK.findall(prompt)
+    if name == 'SectionTypesModel':
+        return {'sections': [
+            {'section_id': section_id, 'section_type': _fake_section_type(*_split_title(block))}
+            for section_id, block in blocks
+        ]}
+    if name == 'SectionRequirementsModel':
+        return {'sections': [
+            {'section_id': section_id, 'requirements': _fake_rules(_split_title(block)[1])}
+            for section_id, block in blocks
+        ]}
+
+    quoted = _QUOTED.findall(prompt)
+    title, text = _split_title(quoted[-1] if quoted else prompt)
+    if name == 'SectionModel':
+        return {'section_type': _fake_section_type(title, text)}
+    if name == 'RequirementsModel':
+        return {'requirements': _fake_rules(text)}
+    if name == 'ConceptsListModel':
+        return {'concepts': _fake_concepts(text)}
+    if name == 'SectionExtractionModel':
+        section_type = _fake_section_type(title, text)
+        return {
+            'section_type': section_type,
+            'requirements': _fake_rules(text) if section_type == 'normative_content' else [],
+            'concepts': _fake_concepts(text) if section_type == 'terminology' else []
+        }
+    raise NotImplementedError(f"FakeBackend has no response for {name}")
+
+class FakeBackend(Backend):
+    """
+    Deterministic offline backend.
+
+    Latency follows a log-normal distribution with the given median and 95th percentile. Errors
+    and 429s are drawn per request and attempt, so a run is reproducible for a given seed even
+    when requests complete in a different order.
+    """
+
+    def __init__(self, latency_p50=0.0, latency_p95=None, error_rate=0.0, rate_limit_rate=0.0, seed=0):
+        """
+        Args:
+            latency_p50 (float, optional): Median latency in seconds.
+            latency_p95 (float, optional): 95th percentile latency in seconds. Defaults to the median.
+            error_rate (float, optional): Fraction of requests failing with a 500 error.
+            rate_limit_rate (float, optional): Fraction of requests failing with a 429 error.
+            seed (int, optional): Seed of the random draws.
+        """
+        super().__init__()
+        self.latency_p50 = latency_p50
+        self.latency_p95 = latency_p95 if latency_p95 is not None else latency_p50
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.seed = seed
+        self._attempts = {}
+        self._attempts_lock = threading.Lock()
+
+    def _latency(self, rng):
+        if self.latency_p50 <= 0:
+            return 0.0
+        sigma = math.log(max(self.latency_p95, self.latency_p50) / self.latency_p50) / 1.645
+        return rng.lognormvariate(math.log(self.latency_p50), sigma)
+
+    def _parse(self, model, input, text_format, **kwargs):
+        key = request_key(model, input, text_format, **kwargs)
+        with self._attempts_lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+        rng = random.Random(f"{self.seed}:{key}:{attempt}")
+
+        time.sleep(self._latency(rng))
+        draw = rng.random()
+        if draw < self.rate_limit_rate:
+            raise BackendError("Rate limit reached (fake)", status_code=429)
+        if draw < self.rate_limit_rate + self.error_rate:
+            raise BackendError("Internal server error (fake)", status_code=500)
+        response = fake_response(input, text_format)
+        # Token usage estimated like the real API would count it
+        usage = {
+            'input_tokens': sum(count_tokens(message['content']) for message in input),
+            'output_tokens': count_tokens(json.dumps(response)),
+            'cached_tokens': 0
+        }
+        return text_format.model_validate(response), usage, None
+
+### RECORD / REPLAY
+
+class RecordingBackend(Backend):
+    """Passes requests to another backend and appends each response to a JSON Lines trace."""
+
+    def __init__(self, backend, path):
+        super().__init__()
+        self.backend = backend
+        self.path = path
+        self._file_lock = threading.Lock()
+
+    def _parse(self, model, input, text_format, **kwargs):
+        parsed, usage, headers = self.backend._parse(model, input, text_format, **kwargs)
+        line = json.dumps({
+            'key': request_key(model, input, text_format, **kwargs),
+            'format': text_format.__name__,
+            'response': parsed.model_dump(mode='json') if parsed is not None else None,
+            'usage': usage
+        }, ensure_ascii=False)
+        with self._file_lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        return parsed, usage, headers
+
+class ReplayBackend(Backend):
+    """
+    Answers requests from a trace written by `RecordingBackend`. Requests that are not in the
+    trace go to `fallback`, or fail with a BackendError if there is none.
+    """
+
+    rate_limited = False
+
+    def __init__(self, path, fallback=None):
+        super().__init__()
+        self.fallback = fallback
+        self.responses = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.responses[entry['key']] = (entry['response'], entry.get('usage'))
+
+    def _parse(self, model, input, text_format, **kwargs):
+        key = request_key(model, input, text_format, **kwargs)
+        if key in self.responses:
+            response, usage = self.responses[key]
+            return (text_format.model_validate(response) if response is not None else None), usage, None
+        if self.fallback is not None:
+            return self.fallback._parse(model, input, text_format, **kwargs)
+        raise BackendError(f"Request {key[:12]} is not in the trace", status_code=404)
+
+def create_backend(spec):
+    """
+    Creates a backend from a specification string (see module docstring).
+
+    Args:
+        spec (str): "openai", "fake", "record:<path>" or "replay:<path>".
+
+    Returns:
+        Backend: The configured backend.
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'openai':
+        return OpenAIBackend()
+    if kind == 'fake':
+        return FakeBackend()
+    if kind == 'record':
+        return RecordingBackend(OpenAIBackend(), target or 'llm_trace.jsonl')
+    if kind == 'replay':
+        return ReplayBackend(target or 'llm_trace.jsonl')
+    raise ValueError(f"Unknown LLM_BACKEND specification: '{spec}'")
@@ -0,0 +1,293 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import uuid
+
+import datamodels
+import metrics
+from llm.backends import Backend, BackendError, request_key
+
+"""
+Description:
+    Execution of LLM requests through a provider batch API (asynchronous, at a discount and
+    under a separate quota) instead of one interactive request at a time.
+
+    The pipeline code stays unchanged: it runs against a `BatchBackend`, which answers requests
+    whose batch results are known and collects the others (raising `BatchPending` for them).
+    The collected requests are submitted as one batch; once its results have arrived the
+    pipeline runs again and gets further (see `batch_execution`).
+
+    Providers:
+        - OpenAIBatchProvider: the OpenAI Batch API on /v1/responses (production).
+        - LocalBatchProvider: stand-in that answers a batch with the configured LLM backend
+          (e.g. LLM_BACKEND=fake) and keeps its files in a local directory, for tests and
+          local runs.
+
+    The provider is selected with the LLM_BATCH_PROVIDER environment variable:
+        "openai" (default) or "local:<directory>".
+
+    Batch results are plain dicts per request key:
+        {'response': dict | None, 'usage': dict | None, 'model': str | None, 'error': str | None}
+
+    The usage of a batch is recorded in the job metrics once, when its results are received
+    (`record_batch_usage`); BatchBackend answers the same results again on every later pass.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Time within which the provider completes a batch
+BATCH_COMPLETION_WINDOW = "24h"
+
+class BatchPending(Exception):
+    """Raised for a request that has been collected for the next batch."""
+
+class BatchBackend(Backend):
+    """
+    Answers requests from batch results; requests without a result are collected in
+    `requests` (by request key) and raise BatchPending.
+    """
+
+    rate_limited = False
+
+    def __init__(self, results=None):
+        super().__init__()
+        self.results = results if results is not None else {}
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def parse(self, model, input, text_format, **kwargs):
+        key = request_key(model, input, text_format, **kwargs)
+        result = self.results.get(key)
+        if result is None:
+            with self._lock:
+                self.requests[key] = {'model': model, 'input': input, 'text_format': text_format, 'params': kwargs}
+            raise BatchPending(key)
+
+        self._count('calls')
+        if result.get('error'):
+            self._count('errors')
+            raise BackendError(result['error'])
+        if result.get('response') is None:
+            raise BackendError(f"The model returned no parsed {text_format.__name__}", status_code=422)
+        return text_format.model_validate(result['response'])
+
+def record_batch_usage(results):
+    """
+    Records the LLM calls of newly received batch results in the current job metrics.
+
+    Args:
+        results (dict[str, dict]): The results of one batch, as returned by the provider.
+    """
+    for result in results.values():
+        metrics.record_llm_call(result.get('model'), 0.0, result.get('usage'), batch=True)
+
+### OPENAI
+
+def _strict_schema(node):
+    """
+    Adapts a pydantic JSON schema to the rules of strict structured outputs: every object lists
+    all its properties as required and allows no others, and defaults are dropped.
+    """
+    if isinstance(node, list):
+        return [_strict_schema(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    strict = {}
+    for name, value in node.items():
+        if name == 'default':
+            continue
+        if name in ('properties', '$defs'):
+            strict[name] = {key: _strict_schema(schema) for key, schema in value.items()}
+        else:
+            strict[name] = _strict_schema(value)
+    if 'properties' in strict:
+        strict['required'] = list(strict['properties'])
+        strict['additionalProperties'] = False
+    # A single allOf entry only wraps a reference (e.g. a field with a description)
+    if len(strict.get('allOf', ())) == 1:
+        strict.update(strict.pop('allOf')[0])
+    return strict
+
+def text_format_param(text_format):
+    """
+    Returns the Responses API text format requesting output that matches a pydantic model,
+    as sent by `client.responses.parse`.
+    """
+    return {
+        'type': 'json_schema',
+        'name': text_format.__name__,
+        'schema': _strict_schema(text_format.model_json_schema()),
+        'strict': True
+    }
+
+def _response_output(body):
+    """Returns the parsed JSON output (None for a refusal) and the usage of a Responses API body."""
+    parsed = None
+    for item in body.get('output') or []:
+        if item.get('type') != 'message':
+            continue
+        for content in item.get('content') or []:
+            if content.get('type') == 'output_text':
+                parsed = json.loads(content['text'])
+    usage = body.get('usage')
+    if usage:
+        usage = {
+            'input_tokens': usage.get('input_tokens', 0),
+            'output_tokens': usage.get('output_tokens', 0),
+            'cached_tokens': (usage.get('input_tokens_details') or {}).get('cached_tokens', 0)
+        }
+    return parsed, usage
+
+class OpenAIBatchProvider:
+    """Submits requests through the OpenAI Batch API on the /v1/responses endpoint."""
+
+    def submit(self, requests):
+        """
+        Submits a batch.
+
+        Args:
+            requests (dict[str, dict]): Requests by request key, as collected by BatchBackend.
+
+        Returns:
+            str: The batch id.
+        """
+        from llm.llm_client import get_client
+
+        lines = []
+        for key, request in requests.items():
+            body = {
+                'model': request['model'],
+                'input': request['input'],
+                'text': {'format': text_format_param(request['text_format'])},
+                **request['params']
+            }
+            lines.append(json.dumps({'custom_id': key, 'method': 'POST', 'url': '/v1/responses', 'body': body},
+                                    ensure_ascii=False))
+        client = get_client()
+        input_file = client.files.create(
+            file=('batch.jsonl', "\n".join(lines).encode('utf-8')),
+            purpose='batch'
+        )
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/responses',
+            completion_window=BATCH_COMPLETION_WINDOW
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        """
+        Returns:
+            str: 'in_progress', 'completed' or 'failed'.
+        """
+        from llm.llm_client import get_client
+        status = get_client().batches.retrieve(batch_id).status
+        if status in ('validating', 'in_progress', 'finalizing'):
+            return 'in_progress'
+        return 'completed' if status == 'completed' else 'failed'
+
+    def results(self, batch_id):
+        """
+        Returns:
+            dict[str, dict]: Batch results by request key (see module docstring).
+        """
+        from llm.llm_client import get_client
+        client = get_client()
+        batch = client.batches.retrieve(batch_id)
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get('response') or {}
+                if entry.get('error') or response.get('status_code') != 200:
+                    error = entry.get('error') or (response.get('body') or {}).get('error')
+                    results[entry['custom_id']] = {'response': None, 'usage': None, 'model': None,
+                                                   'error': str(error)}
+                    continue
+                parsed, usage = _response_output(response['body'])
+                results[entry['custom_id']] = {'response': parsed, 'usage': usage,
+                                               'model': response['body'].get('model'), 'error': None}
+        return results
+
+### LOCAL
+
+class LocalBatchProvider:
+    """
+    Local stand-in for a batch API. Batches are stored as gzip JSON Lines files in `directory`
+    and answered by `backend` (default: the configured LLM backend) when their status is first
+    polled.
+    """
+
+    def __init__(self, directory, backend=None):
+        self.directory = directory
+        self.backend = backend
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, batch_id, kind):
+        return os.path.join(self.directory, f"{batch_id}.{kind}.jsonl.gz")
+
+    def submit(self, requests):
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        with gzip.open(self._path(batch_id, 'input'), 'wt', encoding='utf-8') as f:
+            for key, request in requests.items():
+                f.write(json.dumps({
+                    'custom_id': key,
+                    'model': request['model'],
+                    'input': request['input'],
+                    'format': request['text_format'].__name__,
+                    'params': request['params']
+                }, ensure_ascii=False) + "\n")
+        return batch_id
+
+    def status(self, batch_id):
+        if not os.path.exists(self._path(batch_id, 'output')):
+            self._run(batch_id)
+        return 'completed'
+
+    def _run(self, batch_id):
+        from llm.llm_client import get_backend
+        backend = self.backend or get_backend()
+        with gzip.open(self._path(batch_id, 'input'), 'rt', encoding='utf-8') as f_in, \
+                gzip.open(self._path(batch_id, 'output'), 'wt', encoding='utf-8') as f_out:
+            for line in f_in:
+                request = json.loads(line)
+                text_format = getattr(datamodels, request['format'])
+                try:
+                    parsed, usage, _ = backend._parse(request['model'], request['input'], text_format,
+                                                      **request['params'])
+                    result = {'response': parsed.model_dump(mode='json') if parsed is not None else None,
+                              'usage': usage, 'model': request['model'], 'error': None}
+                except Exception as e:
+                    result = {'response': None, 'usage': None, 'model': request['model'], 'error': str(e)}
+                f_out.write(json.dumps({'custom_id': request['custom_id'], **result}, ensure_ascii=False) + "\n")
+
+    def results(self, batch_id):
+        results = {}
+        with gzip.open(self._path(batch_id, 'output'), 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                results[entry.pop('custom_id')] = entry
+        return results
+
+def create_batch_provider(spec):
+    """
+    Creates a batch provider from a specification string (see module docstring).
+
+    Args:
+        spec (str): "openai" or "local:<directory>".
+
+    Returns:
+        OpenAIBatchProvider | LocalBatchProvider: The configured provider.
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'openai':
+        return OpenAIBatchProvider()
+    if kind == 'local':
+        return LocalBatchProvider(target or 'llm_batches')
+    raise ValueError(f"Unknown LLM_BATCH_PROVIDER specification: '{spec}'")
@@ -0,0 +1,129 @@
+import logging
+from llm.llm_cache import cached_parse
+from llm.section_classification import record_decision
+from datamodels import SectionRequirementsModel, SectionType, SectionTypesModel
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the prompts below change, so cached responses are not reused
+PROMPT_VERSION = "1"
+
+def _format_sections(sections):
+    """Wraps each (section_id, title, text) in an id-tagged block the model can refer to."""
+    blocks = []
+    for section_id, title, text in sections:
+        blocks.append(f'<section id="{section_id}">\nTitle: {title or "Unknown"}\n\n{text}\n</section>')
+    return "\n\n".join(blocks)
+
+def classify_sections_batch(sections: list[tuple[str, str, str]]) -> dict[str, SectionType]:
+    """
+    Classifies several small sections in a single LLM call.
+
+    Args:
+        sections (list[tuple[str, str, str]]): (section_id, title, text) for each section.
+
+    Returns:
+        dict[str, SectionType]: Section type per section id. Sections the model did not
+            answer for are missing, so the caller can fall back to `classify_section`.
+    """
+    prompt = f"""
+    Classify each of the following sections into one of exactly three categories:
+    - "terminology": Sections that provide clear and precise definitions of key terms, acronyms, and abbreviations used throughout the document.
+    - "normative_content": Sections or elements that establish standards, guidelines, rules, or requirements that need to be followed.
+    - "other": Any other type of section, including front matter (title page, authors, publisher, publication date, ISBN, copyright,
+      preface, foreword, table of contents) and back matter (bibliography, index, appendices, acknowledgements, annexes, non-normative notes).
+
+    Classification rules:
+    - If the section defines terms, words, or concepts, classify as terminology.
+    - If the section states rules, requirements, obligations, prohibitions, or recommendations, classify as normative_content.
+    - Everything else is other.
+
+    Classify every section independently and return one entry per section, using the id attribute of its <section> tag as "section_id".
+
+    Sections:
+    {_format_sections(sections)}
+    """
+    try:
+        parsed = cached_parse(
+            input=[
+                {
+                    "role": "system",
+                    "content": "You classify document sections into terminology, normative_content, or other."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            text_format=SectionTypesModel,
+            prompt_version=PROMPT_VERSION,
+            temperature=0,
+            top_p=1
+        )
+        requested = {section_id for section_id, _, _ in sections}
+        categories = {item.section_id: item.section_type for item in parsed.sections
+                      if item.section_id in requested}
+        # Sections left unanswered are counted by the single-section fallback
+        record_decision('llm', len(categories))
+        return categories
+
+    except Exception as e:
+        logger.warning(f"Batch classification failed, falling back to single sections: {e}")
+        return {}
+
+def extract_requirements_batch(sections: list[tuple[str, str, str]]) -> dict[str, list]:
+    """
+    Extracts requirement blocks from several small sections in a single LLM call.
+
+    Args:
+        sections (list[tuple[str, str, str]]): (section_id, title, text) for each section.
+
+    Returns:
+        dict[str, list[RequirementItem]]: Requirements per section id. Sections the model did
+            not answer for are missing, so the caller can fall back to `extract_requirements`.
+    """
+    prompt = f"""Extract all blocks of text from each of the following sections that express a rule.
+A "block" can be a sentence, a group of sentences, or a paragraph, as long as it expresses a complete rule.
+A block never spans two sections.
+
+Words that signify a rule include terms such as "MUST", "MUST NOT", "REQUIRED", "SHALL", "SHALL NOT",
+"SHOULD", "SHOULD NOT", "RECOMMENDED", "MAY", and "OPTIONAL".
+
+Do not translate, rewrite, or interpret the text — just extract it as-is.
+
+Then, for each extracted rule, classify it into exactly one of these categories:
+1. "requirement" – Mandatory rules or obligations (e.g., "MUST", "REQUIRED", "SHALL").
+2. "recommendation" – Advice, suggestions, or non-mandatory good practices (e.g., "SHOULD", "RECOMMENDED").
+3. "permission" – Things allowed but not required (e.g., "MAY", "OPTIONAL", "PERMITTED").
+4. "possibility" – Statements about what could happen, ability, or potential (e.g., "CAN", "MIGHT").
+
+Sections:
+{_format_sections(sections)}
+
+Return one entry per section, using the id attribute of its <section> tag as "section_id", with:
+- "text": the exact block of text as-is
+- "classification": one of ["requirement", "recommendation", "permission", "possibility"]
+
+If a section has no rules, return an empty "requirements" array for it.
+"""
+
+    try:
+        parsed = cached_parse(
+            input=[
+                {
+                    "role": "system",
+                    "content": "You are an assistant who extracts requirements from technical specifications."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            text_format=SectionRequirementsModel,
+            prompt_version=PROMPT_VERSION
+        )
+        return {item.section_id: item.requirements for item in parsed.sections}
+
+    except Exception as e:
+        logger.warning(f"Batch requirement extraction failed, falling back to single sections: {e}")
+        return {}
@@ -0,0 +1,200 @@
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from alignment import align_requirements
+from datamodels import ConceptsListModel
+from llm.requirement_extraction import extract_requirements
+from llm.terminology_extraction import extract_terms
+from llm.tokens import count_tokens
+
+"""
+Description:
+    Splits oversized section text into overlapping chunks on paragraph and sentence boundaries,
+    extracts each chunk in parallel and merges the results back into section coordinates.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Sections above this many tokens are split into chunks
+MAX_SECTION_TOKENS = int(os.environ.get('MAX_SECTION_TOKENS', '6000'))
+# Number of tokens repeated at the start of the next chunk, so rules on a boundary are seen whole
+CHUNK_OVERLAP_TOKENS = int(os.environ.get('CHUNK_OVERLAP_TOKENS', '200'))
+# Maximum number of chunks of one section extracted at the same time
+CHUNK_CONCURRENCY = int(os.environ.get('CHUNK_CONCURRENCY', '4'))
+
+# Paragraph breaks, then sentence ends followed by whitespace
+_PARAGRAPH_BREAK = re.compile(r'\s*\n\s*')
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?;:])\s+')
+
+def _split_spans(text, start, end, pattern):
+    """Splits text[start:end] at the matches of `pattern`, returning (start, end) spans."""
+    spans = []
+    position = start
+    for match in pattern.finditer(text, start, end):
+        if match.start() > position:
+            spans.append((position, match.start()))
+        position = match.end()
+    if position < end:
+        spans.append((position, end))
+    return spans
+
+def _segments(text, max_tokens):
+    """Returns (start, end) spans of paragraphs, sentences or, as a last resort, word runs, each below max_tokens."""
+    segments = []
+    for p_start, p_end in _split_spans(text, 0, len(text), _PARAGRAPH_BREAK):
+        if count_tokens(text[p_start:p_end]) <= max_tokens:
+            segments.append((p_start, p_end))
+            continue
+        for s_start, s_end in _split_spans(text, p_start, p_end, _SENTENCE_BREAK):
+            if count_tokens(text[s_start:s_end]) <= max_tokens:
+                segments.append((s_start, s_end))
+                continue
+            # A single "sentence" above the limit: cut at whitespace
+            words = [m.span() for m in re.finditer(r'\S+', text[s_start:s_end])]
+            run_start = None
+            for w_start, w_end in words:
+                w_start, w_end = w_start + s_start, w_end + s_start
+                if run_start is None:
+                    run_start = w_start
+                elif count_tokens(text[run_start:w_end]) > max_tokens:
+                    segments.append((run_start, previous_end))
+                    run_start = w_start
+                previous_end = w_end
+            if run_start is not None:
+                segments.append((run_start, previous_end))
+    return segments
+
+def split_text(text: str, max_tokens: int = None, overlap_tokens: int = None) -> list[tuple[int, str]]:
+    """
+    Splits text into chunks of at most `max_tokens`, breaking on paragraph and sentence
+    boundaries. Consecutive chunks share up to `overlap_tokens` of text.
+
+    Args:
+        text (str): The section text.
+        max_tokens (int, optional): Chunk size. Defaults to MAX_SECTION_TOKENS.
+        overlap_tokens (int, optional): Overlap between chunks. Defaults to CHUNK_OVERLAP_TOKENS.
+
+    Returns:
+        list[tuple[int, str]]: (offset in `text`, chunk text) for each chunk.
+    """
+    max_tokens = max_tokens or MAX_SECTION_TOKENS
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+
+    segments = _segments(text, max_tokens)
+    chunks = []
+    first = 0
+    while first < len(segments):
+        # Extend the chunk while it fits
+        last = first
+        while last + 1 < len(segments) and \
+                count_tokens(text[segments[first][0]:segments[last + 1][1]]) <= max_tokens:
+            last += 1
+        chunk_start, chunk_end = segments[first][0], segments[last][1]
+        chunks.append((chunk_start, text[chunk_start:chunk_end]))
+        if last + 1 >= len(segments):
+            break
+
+        # Start the next chunk with trailing segments of this one, within the overlap budget
+        next_first = last + 1
+        while next_first - 1 > first and \
+                count_tokens(text[segments[next_first - 1][0]:chunk_end]) <= overlap_tokens:
+            next_first -= 1
+        first = next_first
+    return chunks
+
+def is_oversized(text: str) -> bool:
+    """Returns True if a section is too large to be sent to the LLM in one request."""
+    return count_tokens(text) > MAX_SECTION_TOKENS
+
+def extract_requirements_chunked(text: str) -> list[tuple]:
+    """
+    Extracts requirements from an oversized section chunk by chunk, in parallel.
+
+    Each chunk is aligned with `alignment.align_requirements` (successive occurrences of
+    repeated requirements, fuzzy fallback). Requirements that appear in the overlap of two
+    neighbouring chunks are reported once, as are partial copies cut off at a chunk boundary
+    that are contained in a complete one; repetitions within a chunk are all kept.
+
+    Args:
+        text (str): The section text.
+
+    Returns:
+        list[tuple[RequirementItem, tuple[int, int] | None]]: Each requirement with its
+            (start, end) offsets in `text`, or None if it could not be found in its chunk.
+            Ordered by offset.
+    """
+    chunks = split_text(text)
+    logger.info(f"Section split into {len(chunks)} chunks")
+    with ThreadPoolExecutor(max_workers=CHUNK_CONCURRENCY) as executor:
+        chunk_requirements = list(executor.map(lambda chunk: extract_requirements(chunk[1]), chunks))
+
+    located = [[] for _ in chunks]   # (start, end, item) per chunk
+    unlocated = [[] for _ in chunks]
+    for chunk_number, ((chunk_start, chunk_text), requirements) in enumerate(zip(chunks, chunk_requirements)):
+        spans = align_requirements(chunk_text, [req.text for req in requirements])
+        for req, span in zip(requirements, spans):
+            if span is None:
+                unlocated[chunk_number].append(req)
+            else:
+                located[chunk_number].append((chunk_start + span[0], chunk_start + span[1], req))
+
+    # Only neighbouring chunks share text: [start of the next chunk, end of this one)
+    dropped = set()
+    for chunk_number in range(len(chunks) - 1):
+        overlap_start = chunks[chunk_number + 1][0]
+        overlap_end = chunks[chunk_number][0] + len(chunks[chunk_number][1])
+        earlier, later = located[chunk_number], located[chunk_number + 1]
+        for i, (start, end, _) in enumerate(later):
+            # Same requirement seen again, or its start cut off, at the beginning of the next chunk
+            if overlap_start <= start and end <= overlap_end and \
+                    any(kept_start <= start and end <= kept_end for kept_start, kept_end, _ in earlier):
+                dropped.add((chunk_number + 1, i))
+        for i, (start, end, _) in enumerate(earlier):
+            # Its end cut off at the end of this chunk, complete in the next one
+            if overlap_start <= start and end <= overlap_end and \
+                    any(kept_start <= start and end <= kept_end and (kept_start, kept_end) != (start, end)
+                        for kept_start, kept_end, _ in later):
+                dropped.add((chunk_number, i))
+
+    merged = [(start, end, req)
+              for chunk_number, entries in enumerate(located)
+              for i, (start, end, req) in enumerate(entries)
+              if (chunk_number, i) not in dropped]
+    merged.sort(key=lambda entry: (entry[0], -entry[1]))
+    results = [(req, (start, end)) for start, end, req in merged]
+
+    # Unlocated copies of a requirement in two chunks count once (the most any chunk returned)
+    copies = {}
+    for requirements in unlocated:
+        counts = {}
+        for req in requirements:
+            key = " ".join(req.text.split())
+            counts.setdefault(key, []).append(req)
+        for key, reqs in counts.items():
+            if len(reqs) > len(copies.get(key, [])):
+                copies[key] = reqs
+    results.extend((req, None) for reqs in copies.values() for req in reqs)
+    return results
+
+def extract_terms_chunked(text: str) -> ConceptsListModel:
+    """
+    Extracts term-definition pairs from an oversized section chunk by chunk, in parallel.
+
+    Args:
+        text (str): The section text.
+
+    Returns:
+        ConceptsListModel: The concepts of all chunks, without duplicates from the overlaps.
+    """
+    chunks = split_text(text)
+    with ThreadPoolExecutor(max_workers=CHUNK_CONCURRENCY) as executor:
+        chunk_terms = list(executor.map(lambda chunk: extract_terms(chunk[1]), chunks))
+
+    concepts = {}
+    for terms in chunk_terms:
+        for concept in (terms.concepts if terms else []):
+            concepts.setdefault((concept.term, concept.definition), concept)
+    return ConceptsListModel(concepts=list(concepts.values()))
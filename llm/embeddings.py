@@ -0,0 +1,114 @@
+import functools
+import hashlib
+import os
+import re
+
+import numpy as np
+
+import metrics
+from llm.rate_limiter import MemoryRateStore, RateLimiter, call_with_retries
+from llm.tokens import count_tokens
+
+"""
+Description:
+    Text embedders for the semantic search index (see `search_index`). An embedder turns texts
+    into L2-normalized float32 vectors, so that the dot product of two vectors is their cosine
+    similarity:
+
+        embedder.embed(["The supplier shall ...", ...]) -> np.ndarray of shape (n, dimensions)
+
+    - OpenAIEmbedder: the OpenAI embeddings API (production).
+    - HashEmbedder: deterministic offline stand-in (signed feature hashing of words and word
+      pairs). Texts sharing wording are similar, for tests, benchmarks and local runs.
+
+    The embedder is selected with the EMBEDDER environment variable: "openai" (default) or
+    "hash". Its `name` is stored with every index, and queries are only answered by an index
+    built with the same embedder.
+"""
+
+# Embedding model and vector size (text-embedding-3 models can be shortened to any size)
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'text-embedding-3-small')
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', '256'))
+# Texts per embeddings request
+EMBEDDING_BATCH_SIZE = 256
+# Quota of the embedding model, separate from the quota of the chat model
+EMBEDDING_RATE_LIMIT_RPM = int(os.environ.get('EMBEDDING_RATE_LIMIT_RPM', '3000'))
+EMBEDDING_RATE_LIMIT_TPM = int(os.environ.get('EMBEDDING_RATE_LIMIT_TPM', '1000000'))
+
+_WORD = re.compile(r'\w+')
+
+def normalize_rows(vectors):
+    """Scales the rows of a float32 matrix to unit length (zero rows stay zero)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32, copy=False)
+
+class OpenAIEmbedder:
+    """Embeds texts with the OpenAI embeddings API."""
+
+    def __init__(self, model=None, dimensions=None):
+        self.model = model or EMBEDDING_MODEL
+        self.dimensions = dimensions or EMBEDDING_DIMENSIONS
+        self.name = f"openai:{self.model}:{self.dimensions}"
+        self._limiter = RateLimiter(MemoryRateStore(), rpm=EMBEDDING_RATE_LIMIT_RPM, tpm=EMBEDDING_RATE_LIMIT_TPM)
+
+    def embed(self, texts):
+        from llm.llm_client import get_client
+        client = get_client()
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            batch = texts[start:start + EMBEDDING_BATCH_SIZE]
+
+            def call():
+                raw = client.embeddings.with_raw_response.create(model=self.model, input=batch,
+                                                                 dimensions=self.dimensions)
+                response = raw.parse()
+                usage = {'input_tokens': response.usage.prompt_tokens, 'output_tokens': 0}
+                return response, usage, raw.headers
+
+            response, _, _ = call_with_retries(call, sum(count_tokens(text) for text in batch), limiter=self._limiter)
+            for item in response.data:
+                vectors[start + item.index] = item.embedding
+        metrics.increment('TextsEmbedded', len(texts))
+        return normalize_rows(vectors)
+
+class HashEmbedder:
+    """Deterministic offline embedder: signed feature hashing of lowercased words and word pairs."""
+
+    def __init__(self, dimensions=None):
+        self.dimensions = dimensions or EMBEDDING_DIMENSIONS
+        self.name = f"hash:{self.dimensions}"
+
+    def _features(self, text):
+        words = _WORD.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                value = int.from_bytes(digest, 'little')
+                vectors[row, value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        return normalize_rows(vectors)
+
+def create_embedder(spec):
+    """
+    Creates an embedder from a specification string (see module docstring).
+
+    Args:
+        spec (str): "openai" or "hash".
+
+    Returns:
+        OpenAIEmbedder | HashEmbedder: The configured embedder.
+    """
+    if spec == 'openai':
+        return OpenAIEmbedder()
+    if spec == 'hash':
+        return HashEmbedder()
+    raise ValueError(f"Unknown EMBEDDER specification: '{spec}'")
+
+@functools.lru_cache(maxsize=None)
+def get_embedder():
+    """Returns the embedder selected by EMBEDDER, created on first use."""
+    return create_embedder(os.environ.get('EMBEDDER', 'openai'))
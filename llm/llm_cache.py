@@ -0,0 +1,262 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from aws_clients import get_client
+from llm.llm_client import get_backend, model
+
+"""
+Content-addressed cache for structured LLM responses.
+
+Responses are keyed on a hash of the model, the prompt template version, the full prompt
+(which contains the section text) and the JSON schema of the expected response. Identical
+requests therefore never reach the LLM twice.
+
+Two tiers are used:
+    - An in-process LRU tier, reused across warm Lambda invocations.
+    - An optional persistent tier: SQLite on local disk (tests, development) or DynamoDB (prod).
+
+The tiers are selected with the LLM_CACHE environment variable:
+    - "none": caching disabled.
+    - "memory": in-process LRU only (default).
+    - "sqlite:<path>": LRU + SQLite file.
+    - "dynamodb:<table>": LRU + DynamoDB table.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Size of the in-process tier (number of responses)
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', '2048'))
+# Time to live of cached responses in seconds (30 days)
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', str(30 * 24 * 3600)))
+
+def cache_key(model_name, prompt_version, input, text_format, **kwargs):
+    """
+    Builds a content-addressed cache key for a structured LLM request.
+
+    Args:
+        model_name (str): Model identifier.
+        prompt_version (str): Version of the prompt template. Bump it whenever a prompt changes.
+        input (list[dict]): The messages sent to the model.
+        text_format (type[BaseModel]): Pydantic model describing the expected response.
+        **kwargs: Additional request parameters (e.g. temperature).
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    payload = json.dumps({
+        'model': model_name,
+        'prompt_version': prompt_version,
+        'input': input,
+        'schema': text_format.model_json_schema(),
+        'params': kwargs
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with TTL and size-based eviction."""
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.time() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+class SQLiteCache:
+    """Persistent cache tier stored in a local SQLite file."""
+
+    def __init__(self, path, ttl=LLM_CACHE_TTL, max_entries=100_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now)
+            )
+            # Evict expired entries, then the least recently used ones above the size limit
+            self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+class DynamoDBCache:
+    """
+    Persistent cache tier stored in a DynamoDB table with partition key 'cacheKey'.
+    Expiry is handled by DynamoDB TTL on the 'expiresAt' attribute; expired items that
+    have not been removed yet are ignored on read.
+    """
+
+    def __init__(self, table_name, ttl=LLM_CACHE_TTL):
+        self.ttl = ttl
+        self.table_name = table_name
+
+    @property
+    def _client(self):
+        # Created on first use, so importing the pipeline does not set up boto3. Called from the
+        # section threads, so the thread-safe low-level client is used instead of a Table resource
+        return get_client('dynamodb')
+
+    def get(self, key):
+        item = self._client.get_item(TableName=self.table_name, Key={'cacheKey': {'S': key}}).get('Item')
+        if not item or int(item['expiresAt']['N']) < time.time():
+            return None
+        return item['value']['S']
+
+    def set(self, key, value):
+        self._client.put_item(TableName=self.table_name, Item={
+            'cacheKey': {'S': key},
+            'value': {'S': value},
+            'expiresAt': {'N': str(int(time.time() + self.ttl))}
+        })
+
+class LLMCache:
+    """Two-tier response cache with hit/miss counters."""
+
+    def __init__(self, memory=None, persistent=None):
+        self.memory = memory
+        self.persistent = persistent
+        self.stats = {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    def get(self, key):
+        if self.memory is not None:
+            value = self.memory.get(key)
+            if value is not None:
+                self._count('memory_hits')
+                return value
+        if self.persistent is not None:
+            try:
+                value = self.persistent.get(key)
+            except Exception as e:
+                logger.warning(f"Error reading persistent LLM cache: {e}")
+                value = None
+            if value is not None:
+                self._count('persistent_hits')
+                if self.memory is not None:
+                    self.memory.set(key, value)
+                return value
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        if self.memory is not None:
+            self.memory.set(key, value)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, value)
+            except Exception as e:
+                logger.warning(f"Error writing persistent LLM cache: {e}")
+
+def create_cache(spec):
+    """
+    Creates a cache from a specification string (see module docstring).
+
+    Args:
+        spec (str): "none", "memory", "sqlite:<path>" or "dynamodb:<table>".
+
+    Returns:
+        LLMCache | None: The configured cache, or None if caching is disabled.
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'none':
+        return None
+    if kind == 'memory':
+        return LLMCache(memory=LRUCache())
+    if kind == 'sqlite':
+        return LLMCache(memory=LRUCache(), persistent=SQLiteCache(target or 'llm_cache.db'))
+    if kind == 'dynamodb':
+        return LLMCache(memory=LRUCache(), persistent=DynamoDBCache(target))
+    raise ValueError(f"Unknown LLM_CACHE specification: '{spec}'")
+
+cache = create_cache(os.environ.get('LLM_CACHE', 'memory'))
+
+def cached_parse(text_format, input, prompt_version, **kwargs):
+    """
+    Sends a request to the LLM backend unless an identical request has been answered before.
+
+    Args:
+        text_format (type[BaseModel]): Pydantic model describing the expected response.
+        input (list[dict]): The messages sent to the model.
+        prompt_version (str): Version of the prompt template, part of the cache key.
+        **kwargs: Additional parameters passed to the backend (`client.responses.parse`).
+
+    Returns:
+        BaseModel: The parsed response, an instance of `text_format`.
+    """
+    key = None
+    if cache is not None:
+        key = cache_key(model, prompt_version, input, text_format, **kwargs)
+        value = cache.get(key)
+        if value is not None:
+            metrics.increment('LlmCacheHits')
+            return text_format.model_validate_json(value)
+
+    parsed = get_backend().parse(
+        model=model,
+        input=input,
+        text_format=text_format,
+        **kwargs
+    )
+
+    if cache is not None and parsed is not None:
+        cache.set(key, parsed.model_dump_json())
+    return parsed
@@ -1,6 +1,40 @@
+import functools
 import os
-from openai import OpenAI
 
 api_key = os.environ.get("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
-model = "gpt-4o-2024-08-06"
\ No newline at end of file
+model = "gpt-4o-2024-08-06"
+# LLM backend, see llm/backends.py: openai | fake | record:<path> | replay:<path>
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openai")
+# Batch API of batch jobs, see llm/batch_api.py: openai | local:<directory>
+LLM_BATCH_PROVIDER = os.environ.get("LLM_BATCH_PROVIDER", "openai")
+
+_backend = None
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """
+    Returns the OpenAI client. It is created (and the openai package imported) on first use and
+    reused across warm invocations, so importing the pipeline stays cheap.
+    """
+    from openai import OpenAI
+    # Retries are handled by llm/rate_limiter.py, which shares the quota across invocations
+    return OpenAI(api_key=api_key, max_retries=0)
+
+def get_backend():
+    """Returns the LLM backend selected by LLM_BACKEND, created on first use."""
+    global _backend
+    if _backend is None:
+        from llm.backends import create_backend
+        _backend = create_backend(LLM_BACKEND)
+    return _backend
+
+def set_backend(backend):
+    """Replaces the LLM backend, e.g. with a `FakeBackend` in benchmarks."""
+    global _backend
+    _backend = backend
+
+@functools.lru_cache(maxsize=None)
+def get_batch_provider():
+    """Returns the batch API selected by LLM_BATCH_PROVIDER, created on first use."""
+    from llm.batch_api import create_batch_provider
+    return create_batch_provider(LLM_BATCH_PROVIDER)
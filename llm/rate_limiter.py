@@ -0,0 +1,297 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+import metrics
+
+"""
+Description:
+    Rate limiting and retries of LLM requests, coordinated across concurrent Lambda invocations.
+
+    Every request first acquires one request and its estimated tokens from a limiter on requests
+    per minute (RPM) and tokens per minute (TPM). The budgets live in a shared store, so all
+    parseJob invocations draw from the same quota:
+        - MemoryRateStore: token buckets in process (tests, local runs, single process).
+        - DynamoDBRateStore: per-minute counters updated with conditional writes (prod).
+
+    The limiter adapts to the provider: the x-ratelimit-* response headers replace the
+    configured limits and pause requests when the remaining quota is exhausted, and a 429 with
+    retry-after pauses all requests of the process. Requests failing with 429, 5xx or a
+    connection error are retried with exponential backoff and full jitter; once the retries are
+    exhausted the error is raised, never turned into an empty result.
+
+    The store is selected with the LLM_RATE_LIMIT_STORE environment variable:
+        "none", "memory" (default) or "dynamodb:<table>".
+"""
+
+logger = logging.getLogger(__name__)
+
+# Quota of the OpenAI organization for the model (overridden by the x-ratelimit-limit-* headers)
+LLM_RATE_LIMIT_RPM = int(os.environ.get('LLM_RATE_LIMIT_RPM', '500'))
+LLM_RATE_LIMIT_TPM = int(os.environ.get('LLM_RATE_LIMIT_TPM', '30000'))
+# Fraction of the quota used, leaving room for other clients of the same organization
+LLM_RATE_LIMIT_HEADROOM = float(os.environ.get('LLM_RATE_LIMIT_HEADROOM', '0.9'))
+# Output tokens reserved per request until the actual usage is known
+LLM_OUTPUT_TOKENS_ESTIMATE = int(os.environ.get('LLM_OUTPUT_TOKENS_ESTIMATE', '1000'))
+# Retries of a request failing with 429, 5xx or a connection error
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '6'))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+# Lifetime of the DynamoDB counters in seconds
+RATE_COUNTER_TTL = 3600
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+class MemoryRateStore:
+    """In-process token buckets, refilled continuously at limit/60 per second."""
+
+    def __init__(self):
+        self._buckets = {}   # name -> [level, last refill]
+        self._lock = threading.Lock()
+
+    def _refill(self, name, limit, now):
+        level, updated = self._buckets.get(name, (limit, now))
+        level = min(limit, level + (now - updated) * limit / 60)
+        self._buckets[name] = [level, now]
+        return level
+
+    def try_acquire(self, requests, tokens, rpm, tpm):
+        """
+        Takes `requests` and `tokens` from the budgets if both are available.
+
+        Returns:
+            float: 0 if acquired, otherwise the number of seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            request_level = self._refill('requests', rpm, now)
+            token_level = self._refill('tokens', tpm, now)
+            if request_level >= requests and token_level >= tokens:
+                self._buckets['requests'][0] -= requests
+                self._buckets['tokens'][0] -= tokens
+                return 0.0
+            return max((requests - request_level) * 60 / rpm, (tokens - token_level) * 60 / tpm)
+
+    def adjust(self, tokens):
+        """Takes `tokens` more (or, if negative, gives back) once the actual usage is known."""
+        with self._lock:
+            if 'tokens' in self._buckets:
+                self._buckets['tokens'][0] -= tokens
+
+class DynamoDBRateStore:
+    """
+    Budgets shared by all invocations, as per-minute counters in a DynamoDB table with
+    partition key 'limiterKey'. A conditional ADD acquires a request and its tokens atomically;
+    counters expire through DynamoDB TTL on 'expiresAt'.
+    """
+
+    def __init__(self, table_name, name='openai'):
+        self.table_name = table_name
+        self.name = name
+
+    @property
+    def _client(self):
+        # Called from the section threads: the low-level client is thread-safe, Table resources are not
+        from aws_clients import get_client
+        return get_client('dynamodb')
+
+    def try_acquire(self, requests, tokens, rpm, tpm):
+        now = time.time()
+        window = int(now // 60)
+        try:
+            self._client.update_item(
+                TableName=self.table_name,
+                Key={'limiterKey': {'S': f"{self.name}#{window}"}},
+                UpdateExpression="ADD requests :requests, tokens :tokens SET expiresAt = :expiresAt",
+                ConditionExpression="attribute_not_exists(requests) OR (requests <= :maxRequests AND tokens <= :maxTokens)",
+                ExpressionAttributeValues={
+                    ':requests': {'N': str(requests)},
+                    ':tokens': {'N': str(tokens)},
+                    ':maxRequests': {'N': str(rpm - requests)},
+                    ':maxTokens': {'N': str(tpm - tokens)},
+                    ':expiresAt': {'N': str(int(now) + RATE_COUNTER_TTL)}
+                }
+            )
+        except self._client.exceptions.ConditionalCheckFailedException:
+            # Budget of this minute used up: wait for the next window
+            return (window + 1) * 60 - now
+        return 0.0
+
+    def adjust(self, tokens):
+        window = int(time.time() // 60)
+        self._client.update_item(
+            TableName=self.table_name,
+            Key={'limiterKey': {'S': f"{self.name}#{window}"}},
+            UpdateExpression="ADD tokens :tokens",
+            ExpressionAttributeValues={':tokens': {'N': str(tokens)}}
+        )
+
+def parse_reset(value):
+    """Parses a reset duration header such as "1s", "6m0s" or "120ms" into seconds."""
+    if not value:
+        return None
+    seconds = 0.0
+    for amount, unit in re.findall(r'([\d.]+)(ms|h|m|s)', value):
+        seconds += float(amount) * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[unit]
+    return seconds
+
+class RateLimiter:
+    """Adaptive RPM/TPM limiter on top of a rate store."""
+
+    def __init__(self, store, rpm=None, tpm=None, headroom=None):
+        self.store = store
+        self.rpm = rpm or LLM_RATE_LIMIT_RPM
+        self.tpm = tpm or LLM_RATE_LIMIT_TPM
+        self.headroom = LLM_RATE_LIMIT_HEADROOM if headroom is None else headroom
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """Blocks until one request with `tokens` tokens fits the limits."""
+        rpm = max(1, int(self.rpm * self.headroom))
+        tpm = max(1, int(self.tpm * self.headroom))
+        tokens = min(tokens, tpm)   # a request larger than the budget still has to go through
+        while True:
+            wait = self.blocked_until - time.time()
+            if wait <= 0:
+                wait = self.store.try_acquire(1, tokens, rpm, tpm)
+            if wait <= 0:
+                return
+            metrics.increment('RateLimitWaits')
+            time.sleep(wait + random.uniform(0, 0.1 * wait + 0.05))
+
+    def reconcile(self, estimated_tokens, actual_tokens):
+        """Corrects the token budget once the actual usage of a request is known."""
+        if actual_tokens is not None and actual_tokens != estimated_tokens:
+            try:
+                self.store.adjust(actual_tokens - estimated_tokens)
+            except Exception as e:
+                logger.warning(f"Error adjusting rate limit counters: {e}")
+
+    def pause(self, seconds):
+        """Stops all requests of this process for `seconds`."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
+    def update(self, headers):
+        """Adapts to the x-ratelimit-* headers of a provider response."""
+        if not headers:
+            return
+        limit_requests = headers.get('x-ratelimit-limit-requests')
+        limit_tokens = headers.get('x-ratelimit-limit-tokens')
+        if limit_requests:
+            self.rpm = int(limit_requests)
+        if limit_tokens:
+            self.tpm = int(limit_tokens)
+        for kind in ('requests', 'tokens'):
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            reset = parse_reset(headers.get(f'x-ratelimit-reset-{kind}'))
+            if remaining is not None and reset and int(remaining) <= 0:
+                self.pause(reset)
+
+def create_rate_limiter(spec):
+    """
+    Creates a rate limiter from a specification string (see module docstring).
+
+    Args:
+        spec (str): "none", "memory" or "dynamodb:<table>".
+
+    Returns:
+        RateLimiter | None: The configured limiter, or None if rate limiting is disabled.
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'none':
+        return None
+    if kind == 'memory':
+        return RateLimiter(MemoryRateStore())
+    if kind == 'dynamodb':
+        return RateLimiter(DynamoDBRateStore(target))
+    raise ValueError(f"Unknown LLM_RATE_LIMIT_STORE specification: '{spec}'")
+
+rate_limiter = create_rate_limiter(os.environ.get('LLM_RATE_LIMIT_STORE', 'memory'))
+
+def set_rate_limiter(limiter):
+    """Replaces the module-level rate limiter (None disables rate limiting)."""
+    global rate_limiter
+    rate_limiter = limiter
+
+def _status_code(error):
+    return getattr(error, 'status_code', None)
+
+def _headers(error):
+    response = getattr(error, 'response', None)
+    return getattr(error, 'headers', None) or getattr(response, 'headers', None)
+
+def is_retryable(error):
+    """True for rate limits, server errors, timeouts and connection errors."""
+    status_code = _status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # openai.APIConnectionError / APITimeoutError carry no status code
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError')
+
+def retry_after(error):
+    """Returns the retry-after delay (seconds) of an error response, if any."""
+    headers = _headers(error)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        return float(value) / 1000
+    value = headers.get('retry-after')
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+def call_with_retries(function, estimated_tokens, limiter=None, max_retries=None):
+    """
+    Calls `function` under the rate limiter, retrying retryable errors with jittered backoff.
+
+    Args:
+        function (Callable[[], tuple]): Sends the request; returns (parsed, usage, headers).
+        estimated_tokens (int): Tokens reserved for the request.
+        limiter (RateLimiter, optional): Defaults to the module-level `rate_limiter`, which is None
+            (no rate limiting, retries only) if LLM_RATE_LIMIT_STORE is "none".
+        max_retries (int, optional): Defaults to LLM_MAX_RETRIES.
+
+    Returns:
+        tuple: The result of `function`.
+
+    Raises:
+        Exception: The last error, once it is not retryable or the retries are exhausted.
+    """
+    limiter = limiter or rate_limiter
+    max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire(estimated_tokens)
+        try:
+            result = function()
+        except Exception as e:
+            if limiter is not None:
+                limiter.update(_headers(e))
+            if not is_retryable(e) or attempt == max_retries:
+                raise
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            server_delay = retry_after(e)
+            if server_delay is not None:
+                delay = max(delay, server_delay)
+            if limiter is not None and _status_code(e) == 429:
+                limiter.pause(delay)
+            metrics.increment('LlmRetries')
+            logger.warning(f"LLM request failed ({e}), retry {attempt + 1} of {max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if limiter is not None:
+            _, usage, headers = result
+            limiter.update(headers)
+            if usage:
+                limiter.reconcile(estimated_tokens, usage.get('input_tokens', 0) + usage.get('output_tokens', 0))
+        return result
@@ -1,7 +1,13 @@
-from llm.llm_client import client, model
+import logging
+from llm.llm_cache import cached_parse
 from typing import List
 from datamodels import RequirementsModel
 
+logger = logging.getLogger(__name__)
+
+# Bump whenever the prompt below changes, so cached responses are not reused
+PROMPT_VERSION = "1"
+
 def extract_requirements(text: str) -> List[str]:
     """
     Uses OpenAI's ChatGPT to extract blocks of text that represent requirements from the provided input text.
@@ -10,12 +16,14 @@ def extract_requirements(text: str) -> List[str]:
         text (str): The full input text from which to extract requirement blocks.
 
     Returns:
-        List[str]: A list of requirement blocks as strings. If the model cannot parse or no requirements are found,
-                   an empty list is returned.
+        List[str]: A list of requirement blocks as strings, empty if no requirements are found.
+
+    Raises:
+        Exception: If the LLM request fails after its retries (see `llm.rate_limiter`).
     
     Notes:
         - Requires a valid OpenAI API key set via the OPENAI_API_KEY environment variable.
-        - Includes a sleep delay to avoid hitting API rate limits during batch processing.
+        - Requests are rate limited and retried by the LLM backend (see `llm.rate_limiter`).
     """    
 #     prompt = f"""Extract all blocks of text from the following content that express a requirement. A "block" can be a sentence, a group of sentences, or a paragraph, as long as it expresses a complete requirement.
 # Words that signify a requirement include terms such as "MUST", "MUST NOT", "REQUIRED", "SHALL", "SHALL NOT", "SHOULD", "SHOULD NOT", "RECOMMENDED", "MAY", and "OPTIONAL".
@@ -51,28 +59,23 @@ Return the result as a valid JSON array of objects, where each object contains:
 
 If there are no rules, return an **empty JSON array** (`[]`).
 """
-    try:
-        response = client.responses.parse(
-            model=model,
-            input=[
-                {
-                    "role": "system",
-                    "content": "You are an assistant who extracts requirements from technical specifications."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            text_format=RequirementsModel
-        )
-
-        # Direct parsed output
-        requirements = response.output_parsed.requirements
-        print("Extracted requirements:", requirements)
-
-        return requirements
-
-    except Exception as e:
-        print("Error:", e)
-        return []
\ No newline at end of file
+    parsed = cached_parse(
+        input=[
+            {
+                "role": "system",
+                "content": "You are an assistant who extracts requirements from technical specifications."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        text_format=RequirementsModel,
+        prompt_version=PROMPT_VERSION
+    )
+
+    # Direct parsed output
+    requirements = parsed.requirements
+    logger.debug(f"Extracted requirements: {requirements}")
+
+    return requirements
\ No newline at end of file
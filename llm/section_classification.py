@@ -1,12 +1,127 @@
-from llm.llm_client import client, model
+import logging
+import os
+import re
+import threading
+import metrics
+from llm.llm_cache import cached_parse
 from datamodels import SectionModel, SectionType
 
+logger = logging.getLogger(__name__)
+
+# Bump whenever the prompt below changes, so cached responses are not reused
+PROMPT_VERSION = "1"
+
+# Rule-based decisions below this confidence are handed over to the LLM
+PRECLASSIFY_MIN_CONFIDENCE = float(os.environ.get('PRECLASSIFY_MIN_CONFIDENCE', '0.85'))
+
+# Optional clause number in front of a title, e.g. "3", "3.1" or "A.2"
+_CLAUSE_NUMBER = r'^\s*(?:(?:annex\s+)?(?:[A-Z]|\d+)(?:\.\d+)*\.?\s+)?'
+
+# One item of a terminology title, e.g. "definitions" or "abbreviated terms"
+_TERMINOLOGY_ITEM = r'(?:terms?|definitions?|glossary|terminology|abbreviat\w+(?:\s+terms)?|acronyms|symbols)'
+
+# The whole title must list terminology items only, e.g. "3 Terms, definitions and abbreviated terms";
+# titles such as "Definition of message format" are left to the keyword rules
+TERMINOLOGY_TITLE = re.compile(
+    _CLAUSE_NUMBER
+    + _TERMINOLOGY_ITEM
+    + r'(?:\s*(?:,\s*(?:and\s+)?|&\s*|\s+and\s+)' + _TERMINOLOGY_ITEM + r')*'
+    + r'\s*[.:]?\s*$',
+    re.IGNORECASE
+)
+
+OTHER_TITLE = re.compile(
+    _CLAUSE_NUMBER
+    + r'(?:foreword|preface|bibliography|(?:normative\s+|informative\s+)?references'
+    r'|acknowledge?ments|index|(?:table\s+of\s+)?contents|copyright|revision\s+history|document\s+history)\b',
+    re.IGNORECASE
+)
+
+# Keywords from BCP 14 (RFC 2119 / RFC 8174) and the ISO/IEC Directives verbal forms
+NORMATIVE_KEYWORDS = re.compile(
+    r'\b(?:shall|must|should|may|required|recommended|optional|can\s*not|cannot)\b',
+    re.IGNORECASE
+)
+
+# Structures typical of terminology entries, e.g. "3.1.2" entry numbers or "Note 1 to entry"
+TERMINOLOGY_MARKERS = re.compile(r'(?:^|\s)\d+\.\d+(?:\.\d+)*\s|note\s+\d+\s+to\s+entry', re.IGNORECASE)
+
+# Number of sections decided by the rules vs. by the LLM
+classification_stats = {'rules': 0, 'llm': 0}
+_stats_lock = threading.Lock()
+
+def record_decision(counter: str, n: int = 1):
+    """Adds `n` sections to the 'rules' or 'llm' classification counter."""
+    with _stats_lock:
+        classification_stats[counter] += n
+    metrics.increment('SectionsClassifiedByRules' if counter == 'rules' else 'SectionsClassifiedByLlm', n)
+
+def local_decision_rate() -> float:
+    """Returns the fraction of classified sections that were decided without an LLM call."""
+    total = classification_stats['rules'] + classification_stats['llm']
+    return classification_stats['rules'] / total if total else 0.0
+
+def preclassify_section(text: str, title: str | None = None) -> tuple[SectionType | None, float]:
+    """
+    Deterministic pre-classifier based on title patterns and normative keyword density.
+
+    Args:
+        text (str): Section content.
+        title (str, optional): Section title.
+
+    Returns:
+        tuple[SectionType | None, float]: The proposed category and a confidence in [0, 1].
+            The category is None when the rules have no opinion.
+    """
+    title = title or ''
+    keyword_count = len(NORMATIVE_KEYWORDS.findall(text))
+    word_count = max(len(text.split()), 1)
+    density = keyword_count / word_count
+
+    if TERMINOLOGY_TITLE.match(title):
+        return SectionType.terminology, 0.95
+
+    if OTHER_TITLE.match(title):
+        # Front and back matter rarely contains rules; a few may still slip into e.g. a foreword
+        return SectionType.other, 0.95 if keyword_count == 0 else 0.6
+
+    if keyword_count == 0:
+        # No verbal forms at all: cannot be normative. Could still be an untitled glossary.
+        if TERMINOLOGY_MARKERS.search(text):
+            return None, 0.0
+        return SectionType.other, 0.9
+
+    if density >= 0.02:
+        return SectionType.normative, min(0.7 + density * 5, 0.95)
+
+    return SectionType.normative, 0.5
+
+def classify_locally(text: str, title: str | None = None) -> SectionType | None:
+    """
+    Returns the rule-based category if it is confident enough, otherwise None.
+
+    Args:
+        text (str): Section content.
+        title (str, optional): Section title.
+
+    Returns:
+        SectionType | None: The category, or None if the LLM has to decide.
+    """
+    category, confidence = preclassify_section(text, title=title)
+    if category is not None and confidence >= PRECLASSIFY_MIN_CONFIDENCE:
+        record_decision('rules')
+        return category
+    return None
+
 def classify_section(text: str, title: str | None = None) -> SectionType:
     """
     Classifies a document section into exactly one of three categories:
     - terminology: Sections that define terms, acronyms, and abbreviations.
     - normative_content: Sections that set rules, requirements, or recommendations.
     - other: Everything else (e.g., front matter, back matter, references).
+
+    Obvious cases are decided locally by `preclassify_section`; the LLM is only
+    consulted when the rules are not confident enough.
     
     Args:
         text (str): Section content.
@@ -14,7 +129,15 @@ def classify_section(text: str, title: str | None = None) -> SectionType:
     
     Returns:
         SectionType: Enum value representing the classification.
+
+    Raises:
+        Exception: If the LLM request fails after its retries (see `llm.rate_limiter`).
     """
+    category = classify_locally(text, title=title)
+    if category is not None:
+        return category
+    record_decision('llm')
+
     combined_text = f"Title: {title or 'Unknown'}\n\n{text}"
 
     prompt = f"""
@@ -34,32 +157,25 @@ def classify_section(text: str, title: str | None = None) -> SectionType:
     \"\"\"{combined_text}\"\"\"
     """
 
-    try:
-        response = client.responses.parse(
-            model= model,
-            input=[
-                {
-                    "role": "system",
-                    "content": "You classify document sections into terminology, normative_content, or other."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            text_format=SectionModel,
-            temperature=0,   # Fully deterministic
-            top_p=1,         # (Optional) makes selection fully greedy
-            #seed=42          # (Optional) locks in randomness if model supports it            
-        )
-        # Drill down to the parsed Pydantic model
-        category_model = response.output[0].content[0].parsed
-        print(category_model)
-        # Access the enum value
-        category = category_model.section_type
-
-    except Exception as e:
-        print(f"Error during classification: {e}")
-        category = SectionType.other  # default fallback
+    category_model = cached_parse(
+        input=[
+            {
+                "role": "system",
+                "content": "You classify document sections into terminology, normative_content, or other."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        text_format=SectionModel,
+        prompt_version=PROMPT_VERSION,
+        temperature=0,   # Fully deterministic
+        top_p=1,         # (Optional) makes selection fully greedy
+        #seed=42          # (Optional) locks in randomness if model supports it            
+    )
+    logger.debug(f"Classification response: {category_model}")
+    # Access the enum value
+    category = category_model.section_type
 
     return category
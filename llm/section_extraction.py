@@ -0,0 +1,69 @@
+import logging
+from llm.llm_cache import cached_parse
+from datamodels import SectionExtractionModel
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the prompt below changes, so cached responses are not reused
+PROMPT_VERSION = "1"
+
+def classify_and_extract(text: str, title: str | None = None) -> SectionExtractionModel:
+    """
+    Classifies a document section and extracts its rules or concepts in a single LLM call.
+
+    Args:
+        text (str): Section content.
+        title (str, optional): Section title.
+
+    Returns:
+        SectionExtractionModel: The section type, plus the requirements (normative_content)
+            or concepts (terminology) found in the section.
+
+    Raises:
+        Exception: If the LLM request fails after its retries (see `llm.rate_limiter`).
+    """
+    combined_text = f"Title: {title or 'Unknown'}\n\n{text}"
+
+    prompt = f"""First classify the following section into one of exactly three categories:
+- "terminology": Sections that provide clear and precise definitions of key terms, acronyms, and abbreviations used throughout the document.
+- "normative_content": Sections or elements that establish standards, guidelines, rules, or requirements that need to be followed.
+- "other": Any other type of section, including front matter (title page, authors, publisher, publication date, ISBN, copyright,
+  preface, foreword, table of contents) and back matter (bibliography, index, appendices, acknowledgements, annexes, non-normative notes).
+
+Then, depending on the category:
+- "normative_content": extract all blocks of text that express a rule. A "block" can be a sentence, a group of sentences,
+  or a paragraph, as long as it expresses a complete rule. Words that signify a rule include terms such as "MUST", "MUST NOT",
+  "REQUIRED", "SHALL", "SHALL NOT", "SHOULD", "SHOULD NOT", "RECOMMENDED", "MAY", and "OPTIONAL".
+  Classify each rule as "requirement" (MUST, REQUIRED, SHALL), "recommendation" (SHOULD, RECOMMENDED),
+  "permission" (MAY, OPTIONAL, PERMITTED) or "possibility" (CAN, MIGHT).
+- "terminology": extract all term-definition pairs with "term", "definition" and any "abbreviations",
+  acronyms or variant names of the concept.
+- "other": extract nothing.
+
+Do not translate, rewrite, or interpret the text — extract it as-is.
+Leave "requirements" empty unless the section is normative_content, and "concepts" empty unless it is terminology.
+
+Section:
+\"\"\"
+{combined_text}
+\"\"\"
+"""
+
+    extraction = cached_parse(
+        input=[
+            {
+                "role": "system",
+                "content": "You classify technical specification sections and extract their requirements or terminology."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        text_format=SectionExtractionModel,
+        prompt_version=PROMPT_VERSION,
+        temperature=0
+    )
+    logger.debug(f"Section classified as: {extraction.section_type}, "
+                 f"{len(extraction.requirements)} requirements, {len(extraction.concepts)} concepts")
+    return extraction
\ No newline at end of file
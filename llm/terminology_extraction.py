@@ -1,7 +1,13 @@
 import json
-from llm.llm_client import client, model
+import logging
+from llm.llm_cache import cached_parse
 from datamodels import ConceptsListModel
 
+logger = logging.getLogger(__name__)
+
+# Bump whenever the prompt below changes, so cached responses are not reused
+PROMPT_VERSION = "1"
+
 def extract_terms(section_text: str) -> list[ConceptsListModel]:
     #section_text = ''.join(section_node.itertext()).strip()
 
@@ -19,24 +25,18 @@ Text:
 {section_text}
 \"\"\"
 """
-    print(prompt)
-
-    try:
-        response = client.responses.parse(
-            model=model,
-            input=[
-                {"role": "system", "content": "You are a terminology extraction assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            text_format=ConceptsListModel,
-            #max_output_tokens=1500,
-            temperature=0
-        )
-        
-        terms = response.output_parsed  # Already a list[ConceptsModel]
-        print(terms)
-        return terms
-
-    except Exception as e:
-        print(f"Error during terminology extraction: {e}")
-        return []
\ No newline at end of file
+    logger.debug(f"Terminology prompt:\n{prompt}")
+
+    terms = cached_parse(
+        input=[
+            {"role": "system", "content": "You are a terminology extraction assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        text_format=ConceptsListModel,
+        prompt_version=PROMPT_VERSION,
+        #max_output_tokens=1500,
+        temperature=0
+    )
+
+    logger.debug(f"Extracted terms: {terms}")
+    return terms
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""
+Token counting for request sizing.
+
+Uses tiktoken when it is installed; otherwise falls back to the common approximation of
+about four characters per token, which is close enough for packing and chunking decisions.
+"""
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken missing or encoding unavailable offline
+    _encoding = None
+
+def count_tokens(text: str) -> int:
+    """
+    Counts (or estimates) the number of tokens in a text.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: Number of tokens.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
@@ -0,0 +1,258 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+"""
+Description:
+    Per-job instrumentation: stage timings, LLM token usage and cost.
+
+    Code is instrumented with spans:
+        with span('classify'):
+            ...
+        @timed('align')
+        def locate_requirements(...): ...
+
+    LLM backends report every call with `record_llm_call`. All measurements go to the current
+    `JobMetrics` (one per Lambda invocation, see `start_job`). At the end of a job the aggregate
+    is stored on the job record (`to_item`) and emitted as a CloudWatch Embedded Metric Format
+    log line (`emit`), from which CloudWatch extracts metrics without API calls.
+
+    Stage times are summed over threads: with SECTION_CONCURRENCY workers, 'classify' can exceed
+    the wall-clock time of the job. Wall-clock time is reported separately.
+"""
+
+# Logging level of the pipeline modules (DEBUG also logs prompts)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+# CloudWatch namespace of the EMF metrics
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'RequirementsApi')
+# USD per million input / cached input / output tokens, per model
+LLM_PRICES = {
+    'gpt-4o-2024-08-06': (2.50, 1.25, 10.00),
+}
+# Used for models missing from LLM_PRICES; override with LLM_PRICE_INPUT/LLM_PRICE_CACHED/LLM_PRICE_OUTPUT
+DEFAULT_LLM_PRICE = (
+    float(os.environ.get('LLM_PRICE_INPUT', '2.50')),
+    float(os.environ.get('LLM_PRICE_CACHED', '1.25')),
+    float(os.environ.get('LLM_PRICE_OUTPUT', '10.00'))
+)
+# Price of batch API requests relative to interactive ones
+LLM_BATCH_PRICE_FACTOR = float(os.environ.get('LLM_BATCH_PRICE_FACTOR', '0.5'))
+
+def configure_logging(level=None):
+    """Sets the level of the root logger (the Lambda runtime installs its handler)."""
+    logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+    logging.getLogger().setLevel(level or LOG_LEVEL)
+
+def llm_cost(model, input_tokens, output_tokens, cached_tokens=0, batch=False):
+    """Returns the cost of an LLM call in USD."""
+    input_price, cached_price, output_price = LLM_PRICES.get(model, DEFAULT_LLM_PRICE)
+    cost = ((input_tokens - cached_tokens) * input_price
+            + cached_tokens * cached_price
+            + output_tokens * output_price) / 1_000_000
+    return cost * LLM_BATCH_PRICE_FACTOR if batch else cost
+
+class JobMetrics:
+    """Thread-safe aggregate of the stage timings and LLM calls of one job."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}   # name -> [count, seconds]
+        self.counters = {}
+        self.llm = {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0,
+                    'seconds': 0.0, 'cost_usd': 0.0}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            stage = self.stages.setdefault(name, [0, 0.0])
+            stage[0] += 1
+            stage[1] += seconds
+
+    def increment(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_llm_call(self, model, seconds, input_tokens=0, output_tokens=0, cached_tokens=0, batch=False):
+        with self._lock:
+            self.llm['calls'] += 1
+            self.llm['seconds'] += seconds
+            self.llm['input_tokens'] += input_tokens
+            self.llm['output_tokens'] += output_tokens
+            self.llm['cached_tokens'] += cached_tokens
+            self.llm['cost_usd'] += llm_cost(model, input_tokens, output_tokens, cached_tokens, batch)
+
+    @property
+    def wall_seconds(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        """Returns the aggregate as plain JSON-serializable values."""
+        with self._lock:
+            return {
+                'wallMs': round(self.wall_seconds * 1000),
+                'stages': {name: {'count': count, 'ms': round(seconds * 1000)}
+                           for name, (count, seconds) in self.stages.items()},
+                'counters': dict(self.counters),
+                'llm': {
+                    'calls': self.llm['calls'],
+                    'ms': round(self.llm['seconds'] * 1000),
+                    'inputTokens': self.llm['input_tokens'],
+                    'outputTokens': self.llm['output_tokens'],
+                    'cachedTokens': self.llm['cached_tokens'],
+                    'costUsd': round(self.llm['cost_usd'], 6)
+                }
+            }
+
+    def to_item(self, previous=None):
+        """
+        Returns the summary as a DynamoDB attribute value (floats as Decimal).
+
+        Args:
+            previous (dict, optional): Summary of the earlier parts of the job (e.g. the tasks or
+                batch passes processed by other invocations) to add, see `merge_summaries`.
+        """
+        summary = self.summary()
+        if previous:
+            summary = merge_summaries(previous, summary)
+        return json.loads(json.dumps(summary), parse_float=Decimal)
+
+    def emf_record(self, dimensions=None):
+        """
+        Builds a CloudWatch Embedded Metric Format record of the summary.
+
+        Args:
+            dimensions (dict[str, str], optional): Dimension values, e.g. {'Function': 'parseJob'}.
+        """
+        summary = self.summary()
+        values = {
+            'JobWallTime': (summary['wallMs'], 'Milliseconds'),
+            'LlmCalls': (summary['llm']['calls'], 'Count'),
+            'LlmTime': (summary['llm']['ms'], 'Milliseconds'),
+            'LlmInputTokens': (summary['llm']['inputTokens'], 'Count'),
+            'LlmOutputTokens': (summary['llm']['outputTokens'], 'Count'),
+            'LlmCachedTokens': (summary['llm']['cachedTokens'], 'Count'),
+            'LlmCostUsd': (summary['llm']['costUsd'], 'None'),
+        }
+        for name, stage in summary['stages'].items():
+            values[f"StageTime_{name}"] = (stage['ms'], 'Milliseconds')
+        for name, count in summary['counters'].items():
+            values[name] = (count, 'Count')
+
+        dimensions = dimensions or {}
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [list(dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in values.items()]
+                }]
+            }
+        }
+        record.update(dimensions)
+        record.update({name: value for name, (value, _) in values.items()})
+        return record
+
+    def emit(self, dimensions=None, **properties):
+        """
+        Writes the EMF record to stdout, where CloudWatch Logs picks it up.
+
+        Args:
+            dimensions (dict[str, str], optional): Dimension values.
+            **properties: Additional searchable properties, e.g. jobId.
+        """
+        record = self.emf_record(dimensions)
+        record.update(properties)
+        print(json.dumps(record))
+
+def merge_summaries(*summaries):
+    """
+    Adds up summaries (see `JobMetrics.summary`) of the parts of one job processed by separate
+    invocations; their wall times add up to the processing time of all parts. None values and
+    DynamoDB Decimals (of summaries read back from a job record) are accepted.
+    """
+    merged = {}
+    for summary in summaries:
+        for key, value in (summary or {}).items():
+            if isinstance(value, dict):
+                merged[key] = merge_summaries(merged.get(key), value)
+                continue
+            if isinstance(value, Decimal):
+                value = int(value) if value == value.to_integral_value() else float(value)
+            merged[key] = merged.get(key, 0) + value
+    if 'llm' in merged and 'costUsd' in merged['llm']:
+        merged['llm']['costUsd'] = round(merged['llm']['costUsd'], 6)
+    return merged
+
+_current = JobMetrics()
+
+def start_job():
+    """Starts collecting the metrics of a new job and returns its JobMetrics."""
+    global _current
+    _current = JobMetrics()
+    return _current
+
+def current():
+    """Returns the JobMetrics of the current job."""
+    return _current
+
+@contextmanager
+def span(name):
+    """Times the enclosed block as stage `name` of the current job."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current.add_stage(name, time.perf_counter() - start)
+
+def timed(name):
+    """Decorator timing every call of a function as stage `name`."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timed_iter(name, iterable):
+    """Passes the items of `iterable` through, timing the time spent producing them as stage `name`."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            _current.add_stage(name, time.perf_counter() - start)
+            return
+        _current.add_stage(name, time.perf_counter() - start)
+        yield item
+
+def increment(name, n=1):
+    """Adds `n` to counter `name` of the current job."""
+    _current.increment(name, n)
+
+def record_llm_call(model, seconds, usage=None, batch=False):
+    """
+    Records one LLM call of the current job.
+
+    Args:
+        model (str): Model identifier, used to price the tokens.
+        seconds (float): Latency of the call.
+        usage (dict, optional): 'input_tokens', 'output_tokens' and 'cached_tokens'.
+        batch (bool): The call went through a batch API (priced with LLM_BATCH_PRICE_FACTOR).
+    """
+    usage = usage or {}
+    _current.add_llm_call(
+        model,
+        seconds,
+        input_tokens=usage.get('input_tokens', 0),
+        output_tokens=usage.get('output_tokens', 0),
+        cached_tokens=usage.get('cached_tokens', 0),
+        batch=batch
+    )
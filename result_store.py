@@ -0,0 +1,326 @@
+import base64
+import bisect
+import gzip
+import json
+import os
+
+from result_records import RecordEncoder
+
+"""
+Description:
+    Job results stored in S3 as compressed JSON Lines shards.
+
+    Each shard object (`results/<jobId>/part-00000.jsonl.gz`, ...) holds up to RESULTS_SHARD_SIZE
+    results and is written as a series of independent gzip members ("blocks") of
+    RESULTS_BLOCK_SIZE results each. A concatenation of gzip members is itself a valid gzip file,
+    so shards can be downloaded and read with standard tools, while the API reads only the blocks
+    of a page with ranged GET requests.
+
+    The jobs table only keeps a small manifest:
+        {
+            "total": 2500,
+            "blockSize": 100,
+            "shards": [
+                {"key": "results/<jobId>/part-00000.jsonl.gz", "count": 1000, "blocks": [0, 5120, ...]},
+                ...
+            ]
+        }
+    where "blocks" lists the byte offset at which each block starts, followed by the shard size.
+
+    When the job completes, a per-job index (`results/<jobId>/index.json.gz`, see `ResultIndex`)
+    is written next to the shards and referenced from the manifest as "index". It lets the
+    results endpoint filter by classification and XPath prefix without reading every result.
+"""
+
+# Results per shard object and per independently compressed block
+RESULTS_SHARD_SIZE = int(os.environ.get('RESULTS_SHARD_SIZE', '1000'))
+RESULTS_BLOCK_SIZE = int(os.environ.get('RESULTS_BLOCK_SIZE', '100'))
+# Page size limits of GET /jobs/{jobId}/results
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def results_prefix(job_id):
+    """S3 key prefix under which the results of a job are stored."""
+    return f"results/{job_id}/"
+
+def encode_cursor(offset):
+    """Encodes a result offset as an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps({'o': offset}).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Decodes a pagination cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))['o']
+    except Exception:
+        raise ValueError(f"Invalid cursor: '{cursor}'")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError(f"Invalid cursor: '{cursor}'")
+    return offset
+
+class ResultIndex:
+    """
+    Index of a job's results, built once when the job completes:
+    - positions of the results per classification;
+    - the sorted list of section XPaths with the positions of their results, so an XPath
+      prefix is a range scan (bisect) instead of a full scan.
+    """
+
+    def __init__(self, by_classification=None, xpaths=None):
+        self.by_classification = by_classification or {}
+        # Sorted list of [xpath, [positions]]
+        self.xpaths = xpaths or []
+        self._xpath_keys = [entry[0] for entry in self.xpaths]
+        self._building = {}
+
+    def add(self, position, result):
+        """Adds a result while it is written (positions must be ascending)."""
+        classification = result.get('classification')
+        if classification is not None:
+            self.by_classification.setdefault(classification, []).append(position)
+        xpath = result.get('section_xpath')
+        if xpath is not None:
+            self._building.setdefault(xpath, []).append(position)
+
+    def finish(self):
+        """Sorts the XPath table once all results have been added."""
+        merged = dict(self.xpaths)
+        for xpath, positions in self._building.items():
+            merged.setdefault(xpath, []).extend(positions)
+        self.xpaths = [[xpath, merged[xpath]] for xpath in sorted(merged)]
+        self._xpath_keys = [entry[0] for entry in self.xpaths]
+        self._building = {}
+
+    def to_bytes(self):
+        return gzip.compress(json.dumps({
+            'by_classification': self.by_classification,
+            'xpaths': self.xpaths
+        }, ensure_ascii=False).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, data):
+        index = json.loads(gzip.decompress(data))
+        return cls(index['by_classification'], index['xpaths'])
+
+    def positions(self, classifications=None, xpath_prefix=None):
+        """
+        Returns the positions of the results matching all given filters.
+
+        Args:
+            classifications (list[str], optional): Accepted classifications.
+            xpath_prefix (str, optional): Section XPath, e.g. "/doc/section[3]"; matches the section
+                itself and every section nested in it.
+
+        Returns:
+            list[int] | None: Ascending positions, or None if no filter was given.
+        """
+        selected = None
+        if classifications:
+            selected = set()
+            for classification in classifications:
+                selected.update(self.by_classification.get(classification, []))
+        if xpath_prefix:
+            prefix = xpath_prefix.rstrip('/')
+            in_prefix = set()
+            i = bisect.bisect_left(self._xpath_keys, prefix)
+            while i < len(self._xpath_keys) and self._xpath_keys[i].startswith(prefix):
+                xpath = self._xpath_keys[i]
+                if xpath == prefix or xpath[len(prefix)] == '/':
+                    in_prefix.update(self.xpaths[i][1])
+                i += 1
+            selected = in_prefix if selected is None else selected & in_prefix
+        return None if selected is None else sorted(selected)
+
+def project(results, fields):
+    """Keeps only the given fields of each result (all fields if `fields` is empty)."""
+    if not fields:
+        return results
+    return [{field: result[field] for field in fields if field in result} for result in results]
+
+class ShardWriter:
+    """
+    Writes results to S3 as gzip JSON Lines shards and builds the manifest.
+
+    Usage:
+        writer = ShardWriter(s3_client, bucket, job_id)
+        for result in results:
+            writer.add(result)
+        manifest = writer.close()
+    """
+
+    def __init__(self, s3_client, bucket, job_id, shard_size=None, block_size=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.job_id = job_id
+        self.shard_size = shard_size or RESULTS_SHARD_SIZE
+        self.block_size = block_size or RESULTS_BLOCK_SIZE
+        self.manifest = {'total': 0, 'blockSize': self.block_size, 'shards': []}
+        self.index = ResultIndex()
+        self._encoder = RecordEncoder()
+        self._pending = []
+
+    @property
+    def count(self):
+        """Number of results added so far (the position of the next result)."""
+        return self.manifest['total'] + len(self._pending)
+
+    def add(self, result):
+        """Adds one result; a shard is uploaded whenever it is full."""
+        self.index.add(self.count, result)
+        self._pending.append(result)
+        if len(self._pending) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Uploads the pending results as a new shard.
+
+        Returns:
+            list[dict]: The manifest entries of the shards written by this call.
+        """
+        if not self._pending:
+            return []
+
+        body = bytearray()
+        blocks = []
+        for start in range(0, len(self._pending), self.block_size):
+            lines = self._encoder.encode_lines(self._pending[start:start + self.block_size])
+            blocks.append(len(body))
+            body += gzip.compress(lines.encode('utf-8'))
+        blocks.append(len(body))
+
+        key = f"{results_prefix(self.job_id)}part-{len(self.manifest['shards']):05d}.jsonl.gz"
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=bytes(body),
+            ContentType='application/gzip'
+        )
+
+        shard = {'key': key, 'count': len(self._pending), 'blocks': blocks}
+        self.manifest['shards'].append(shard)
+        self.manifest['total'] += len(self._pending)
+        self._pending = []
+        return [shard]
+
+    def close(self):
+        """Uploads the last partial shard and the index, and returns the manifest."""
+        self.flush()
+        self.index.finish()
+        key = f"{results_prefix(self.job_id)}index.json.gz"
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=self.index.to_bytes(),
+            ContentType='application/gzip'
+        )
+        self.manifest['index'] = key
+        return self.manifest
+
+def load_index(s3_client, bucket, manifest):
+    """Downloads the result index referenced by a manifest, or returns None if it has none."""
+    if not manifest.get('index'):
+        return None
+    response = s3_client.get_object(Bucket=bucket, Key=manifest['index'])
+    return ResultIndex.from_bytes(response['Body'].read())
+
+def _read_blocks(s3_client, bucket, shard, first_block, last_block):
+    """Downloads and decompresses blocks first_block..last_block (inclusive) of a shard."""
+    blocks = [int(offset) for offset in shard['blocks']]
+    byte_range = f"bytes={blocks[first_block]}-{blocks[last_block + 1] - 1}"
+    response = s3_client.get_object(Bucket=bucket, Key=shard['key'], Range=byte_range)
+    data = gzip.decompress(response['Body'].read())
+    return [json.loads(line) for line in data.decode('utf-8').splitlines() if line]
+
+def read_results(s3_client, bucket, manifest, positions, block_size=None):
+    """
+    Reads the results at the given positions, fetching only the blocks that contain them.
+
+    Args:
+        s3_client: boto3 S3 client.
+        bucket (str): Bucket holding the shards.
+        manifest (dict): The job's results manifest.
+        positions (list[int]): Result positions (0-based, ascending).
+        block_size (int, optional): Results per block the shards were written with.
+
+    Returns:
+        list[dict]: The results, in the order of `positions`.
+    """
+    block_size = block_size or int(manifest.get('blockSize', RESULTS_BLOCK_SIZE))
+    results = []
+    shard_start = 0
+    shards = iter(manifest.get('shards', []))
+    shard = next(shards, None)
+    i = 0
+    while i < len(positions) and shard is not None:
+        shard_count = int(shard['count'])
+        if positions[i] >= shard_start + shard_count:
+            shard_start += shard_count
+            shard = next(shards, None)
+            continue
+
+        # Positions of this shard, read with one ranged request per run of adjacent blocks
+        shard_positions = []
+        while i < len(positions) and positions[i] < shard_start + shard_count:
+            shard_positions.append(positions[i] - shard_start)
+            i += 1
+        runs = []
+        for position in shard_positions:
+            block = position // block_size
+            if runs and block <= runs[-1][1] + 1:
+                runs[-1][1] = block
+                runs[-1][2].append(position)
+            else:
+                runs.append([block, block, [position]])
+        for first_block, last_block, run_positions in runs:
+            records = _read_blocks(s3_client, bucket, shard, first_block, last_block)
+            base = first_block * block_size
+            results.extend(records[position - base] for position in run_positions)
+    return results
+
+def iter_results(s3_client, bucket, manifest):
+    """
+    Streams all results of a job in order, one shard download at a time and decompressing
+    while reading, so memory does not grow with the number of results (see `export`).
+
+    Args:
+        s3_client: boto3 S3 client.
+        bucket (str): Bucket holding the shards.
+        manifest (dict): The job's results manifest.
+
+    Yields:
+        dict: Each result.
+    """
+    for shard in manifest.get('shards', []):
+        response = s3_client.get_object(Bucket=bucket, Key=shard['key'])
+        with gzip.GzipFile(fileobj=response['Body'], mode='rb') as lines:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+
+def read_page(s3_client, bucket, manifest, offset, limit, positions=None):
+    """
+    Reads one page of results.
+
+    Args:
+        s3_client: boto3 S3 client.
+        bucket (str): Bucket holding the shards.
+        manifest (dict): The job's results manifest.
+        offset (int): Offset of the first result of the page (in `positions`, if given).
+        limit (int): Maximum number of results.
+        positions (list[int], optional): Positions of the matching results when filtering,
+            see `ResultIndex.positions`. All results if omitted.
+
+    Returns:
+        tuple[list[dict], int | None, int]: The results, the offset of the next page (None on
+            the last page) and the total number of matching results.
+    """
+    total = int(manifest.get('total', 0)) if positions is None else len(positions)
+    end = min(offset + limit, total)
+    page_positions = list(range(offset, end)) if positions is None else positions[offset:end]
+    results = read_results(s3_client, bucket, manifest, page_positions)
+    return results, (end if end < total else None), total
@@ -0,0 +1,3 @@
+#!/bin/sh
+# Entry point of parseSyncStream: the Lambda Web Adapter forwards requests to this server
+exec python3 stream_server.py
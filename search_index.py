@@ -0,0 +1,438 @@
+import gzip
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from datamodels import RequirementType
+from llm.embeddings import normalize_rows
+
+"""
+Description:
+    Semantic search index over extracted requirements.
+
+    An index is a directory of flat files that are memory-mapped for search, so only the
+    pages a query touches are read:
+        meta.json         count, dimensions, embedder, number of IVF lists, merged segments
+        vectors.f32       float32 matrix (count x dimensions), rows L2-normalized
+        labels.u1         classification code per row (position in CLASSIFICATIONS)
+        records.jsonl     one JSON record per row: jobId, position, requirement_text,
+                          classification, section_xpath
+        offsets.i8        int64 byte offset of each record in records.jsonl, plus the file size
+        centroids.f32     IVF only: unit centroid per list (lists x dimensions)
+        list_offsets.i8   IVF only: first row of each list, plus count (rows are stored list by list)
+
+    A query is scored against all rows with one matrix-vector product (cosine similarity, as
+    the vectors are normalized) and the top k are selected with argpartition. Indexes with at
+    least SEARCH_IVF_MIN_ROWS rows are partitioned with spherical k-means into about
+    sqrt(count) lists; a query then only scans the SEARCH_NPROBE lists with the closest centroids.
+
+    In S3 (uploads bucket), the index consists of:
+        search/segments/<jobId>/   one small index per completed job (`build_segment`)
+        search/base/<generation>/  the merged index of all segments compacted so far
+    Searches combine the latest base with the segments it does not cover yet; compaction
+    (`compact_search_index`) merges them into a new base and deletes what it merged.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Classification codes stored per row
+CLASSIFICATIONS = [requirement_type.value for requirement_type in RequirementType]
+# Indexes with at least this many rows are partitioned into IVF lists when merged
+SEARCH_IVF_MIN_ROWS = int(os.environ.get('SEARCH_IVF_MIN_ROWS', '50000'))
+# IVF lists scanned per query (more lists: better recall, slower queries)
+SEARCH_NPROBE = int(os.environ.get('SEARCH_NPROBE', '16'))
+# Rows processed per step when embedding, assigning and copying
+CHUNK_ROWS = 65536
+EMBED_CHUNK_ROWS = 1024
+# S3 key prefixes of the index
+SEARCH_PREFIX = 'search/'
+SEGMENTS_PREFIX = f'{SEARCH_PREFIX}segments/'
+BASE_PREFIX = f'{SEARCH_PREFIX}base/'
+# meta.json is written last: an index directory or prefix without it is incomplete
+INDEX_FILES = ['vectors.f32', 'labels.u1', 'records.jsonl', 'offsets.i8', 'centroids.f32', 'list_offsets.i8']
+
+def encode_labels(records):
+    """Returns the classification codes of records (255 for unknown classifications)."""
+    codes = {classification: code for code, classification in enumerate(CLASSIFICATIONS)}
+    return np.array([codes.get(record.get('classification'), 255) for record in records], dtype=np.uint8)
+
+class IndexWriter:
+    """
+    Writes an index directory row by row.
+
+    Usage:
+        writer = IndexWriter(directory, embedder.dimensions, embedder.name)
+        writer.add(vectors, records)
+        writer.close()
+    """
+
+    def __init__(self, directory, dimensions, embedder):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dimensions = dimensions
+        self.embedder = embedder
+        self.count = 0
+        self._vectors = open(os.path.join(directory, 'vectors.f32'), 'wb')
+        self._labels = open(os.path.join(directory, 'labels.u1'), 'wb')
+        self._records = open(os.path.join(directory, 'records.jsonl'), 'wb')
+        self._offsets = [0]
+
+    def add(self, vectors, records):
+        """Appends rows: normalized vectors and their records (dicts)."""
+        lines = [(json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8') for record in records]
+        self._add(vectors, encode_labels(records), lines)
+
+    def _add(self, vectors, labels, lines):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(lines), self.dimensions):
+            raise ValueError(f"Expected {len(lines)} vectors of {self.dimensions} dimensions, got {vectors.shape}")
+        self._vectors.write(vectors.tobytes())
+        self._labels.write(np.asarray(labels, dtype=np.uint8).tobytes())
+        for line in lines:
+            self._records.write(line)
+            self._offsets.append(self._offsets[-1] + len(line))
+        self.count += len(lines)
+
+    def copy_rows(self, index, rows):
+        """Appends rows of another index (without decoding their records)."""
+        self._add(index.vectors[rows], index.labels[rows], [index.record_bytes(row) for row in rows])
+
+    def close(self, centroids=None, list_offsets=None, segments=None):
+        """
+        Finishes the index.
+
+        Args:
+            centroids (np.ndarray, optional): IVF centroids; the rows must have been added list by list.
+            list_offsets (np.ndarray, optional): First row of each IVF list, plus the row count.
+            segments (list[str], optional): Job ids of the segments the index covers.
+        """
+        for f in (self._vectors, self._labels, self._records):
+            f.close()
+        np.array(self._offsets, dtype=np.int64).tofile(os.path.join(self.directory, 'offsets.i8'))
+        if centroids is not None:
+            np.asarray(centroids, dtype=np.float32).tofile(os.path.join(self.directory, 'centroids.f32'))
+            np.asarray(list_offsets, dtype=np.int64).tofile(os.path.join(self.directory, 'list_offsets.i8'))
+        meta = {
+            'count': self.count,
+            'dimensions': self.dimensions,
+            'embedder': self.embedder,
+            'classifications': CLASSIFICATIONS,
+            'lists': 0 if centroids is None else len(centroids),
+            'segments': segments or []
+        }
+        with open(os.path.join(self.directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+def _memmap(path, dtype, shape):
+    if not shape[0]:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+class VectorIndex:
+    """A read-only, memory-mapped index directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.prefix = None   # S3 prefix, if downloaded (see `download_index`)
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.count = meta['count']
+        self.dimensions = meta['dimensions']
+        self.embedder = meta['embedder']
+        self.segments = meta.get('segments', [])
+        self.vectors = _memmap(os.path.join(directory, 'vectors.f32'), np.float32, (self.count, self.dimensions))
+        self.labels = _memmap(os.path.join(directory, 'labels.u1'), np.uint8, (self.count,))
+        self.offsets = np.fromfile(os.path.join(directory, 'offsets.i8'), dtype=np.int64)
+        self._records = _memmap(os.path.join(directory, 'records.jsonl'), np.uint8, (int(self.offsets[-1]),))
+        self.centroids = None
+        self.list_offsets = None
+        if meta.get('lists'):
+            self.centroids = np.fromfile(os.path.join(directory, 'centroids.f32'),
+                                         dtype=np.float32).reshape(meta['lists'], self.dimensions)
+            self.list_offsets = np.fromfile(os.path.join(directory, 'list_offsets.i8'), dtype=np.int64)
+
+    def record_bytes(self, row):
+        return bytes(self._records[self.offsets[row]:self.offsets[row + 1]])
+
+    def record(self, row):
+        return json.loads(self.record_bytes(row))
+
+    def _ranges(self, query, nprobe):
+        """Row ranges to scan: all rows, or the lists with the closest centroids."""
+        if self.centroids is None:
+            return [(0, self.count)]
+        nprobe = min(nprobe, len(self.centroids))
+        closest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return [(int(self.list_offsets[i]), int(self.list_offsets[i + 1])) for i in np.sort(closest)]
+
+    def search(self, query, k=10, classifications=None, nprobe=None):
+        """
+        Finds the rows most similar to a query vector.
+
+        Args:
+            query (np.ndarray): Normalized query vector.
+            k (int): Number of rows to return.
+            classifications (list[str], optional): Only rows with one of these classifications.
+            nprobe (int, optional): IVF lists to scan. Defaults to SEARCH_NPROBE.
+
+        Returns:
+            list[tuple[float, int]]: (cosine similarity, row), best first.
+        """
+        codes = None
+        if classifications:
+            codes = np.array([CLASSIFICATIONS.index(c) for c in classifications], dtype=np.uint8)
+        query = np.asarray(query, dtype=np.float32)
+
+        scores = []
+        rows = []
+        for start, end in self._ranges(query, nprobe or SEARCH_NPROBE):
+            if end <= start:
+                continue
+            range_scores = self.vectors[start:end] @ query
+            if codes is not None:
+                range_scores = np.where(np.isin(self.labels[start:end], codes), range_scores, -np.inf)
+            if len(range_scores) > k:
+                top = np.argpartition(-range_scores, k - 1)[:k]
+            else:
+                top = np.arange(len(range_scores))
+            scores.append(range_scores[top])
+            rows.append(top + start)
+        if not scores:
+            return []
+
+        scores = np.concatenate(scores)
+        rows = np.concatenate(rows)
+        best = np.argsort(-scores, kind='stable')[:k]
+        return [(float(scores[i]), int(rows[i])) for i in best if np.isfinite(scores[i])]
+
+def search_indexes(indexes, query, k=10, classifications=None, nprobe=None):
+    """
+    Searches several indexes (e.g. a base and the segments it does not cover yet).
+
+    Returns:
+        list[dict]: The records of the k best rows with their 'score', best first.
+    """
+    hits = []
+    for index in indexes:
+        hits.extend((score, index, row) for score, row in index.search(query, k, classifications, nprobe))
+    hits.sort(key=lambda hit: -hit[0])
+    return [{**index.record(row), 'score': round(score, 6)} for score, index, row in hits[:k]]
+
+### BUILDING
+
+def assign(vectors, centroids):
+    """Returns the index of the most similar centroid for every row, in chunks."""
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), CHUNK_ROWS):
+        chunk = np.asarray(vectors[start:start + CHUNK_ROWS], dtype=np.float32)
+        assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignment
+
+def kmeans(vectors, lists, iterations=10, sample_per_list=64, seed=0):
+    """
+    Spherical k-means (cosine similarity) on a sample of the rows.
+
+    Returns:
+        np.ndarray: Unit centroids (lists x dimensions).
+    """
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(rng.choice(len(vectors), size=min(len(vectors), lists * sample_per_list), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = np.bincount(assignment, minlength=lists) == 0
+        # Restart empty lists from random rows
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+def merge_indexes(indexes, directory, lists=None, segments=None):
+    """
+    Writes the rows of several indexes into one index directory.
+
+    Args:
+        indexes (list[VectorIndex]): Indexes built with the same embedder.
+        directory (str): Output directory.
+        lists (int, optional): Number of IVF lists; by default about sqrt(rows) when there are
+            at least SEARCH_IVF_MIN_ROWS rows, otherwise none.
+        segments (list[str], optional): Job ids the merged index covers.
+
+    Returns:
+        VectorIndex: The merged index.
+    """
+    embedders = {index.embedder for index in indexes}
+    if len(embedders) > 1:
+        raise ValueError(f"Cannot merge indexes of different embedders: {sorted(embedders)}")
+    count = sum(index.count for index in indexes)
+    dimensions = indexes[0].dimensions
+    embedder = indexes[0].embedder
+    if lists is None:
+        lists = int(math.sqrt(count)) if count >= SEARCH_IVF_MIN_ROWS else 0
+
+    if not lists:
+        writer = IndexWriter(directory, dimensions, embedder)
+        for index in indexes:
+            for start in range(0, index.count, CHUNK_ROWS):
+                writer.copy_rows(index, np.arange(start, min(start + CHUNK_ROWS, index.count)))
+        writer.close(segments=segments)
+        return VectorIndex(directory)
+
+    # Concatenate, then write the rows list by list
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(directory))) as concatenated_dir:
+        concatenated = merge_indexes(indexes, concatenated_dir, lists=0)
+        centroids = kmeans(concatenated.vectors, lists)
+        assignment = assign(concatenated.vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))])
+
+        writer = IndexWriter(directory, dimensions, embedder)
+        for start in range(0, count, CHUNK_ROWS):
+            writer.copy_rows(concatenated, order[start:start + CHUNK_ROWS])
+        writer.close(centroids, list_offsets, segments=segments)
+    return VectorIndex(directory)
+
+def build_segment(embedder, job_id, results, directory):
+    """
+    Embeds the requirements of a completed job into an index directory.
+
+    Args:
+        embedder (OpenAIEmbedder | HashEmbedder): See `llm.embeddings`.
+        job_id (str): The job.
+        results (list[dict]): The job's results, in result order (see `result_store`).
+        directory (str): Output directory.
+
+    Returns:
+        VectorIndex: The segment.
+    """
+    writer = IndexWriter(directory, embedder.dimensions, embedder.name)
+    for start in range(0, len(results), EMBED_CHUNK_ROWS):
+        chunk = results[start:start + EMBED_CHUNK_ROWS]
+        records = [{
+            'jobId': job_id,
+            'position': start + i,
+            'requirement_text': result['requirement_text'],
+            'classification': result.get('classification'),
+            'section_xpath': result.get('section_xpath')
+        } for i, result in enumerate(chunk)]
+        writer.add(embedder.embed([record['requirement_text'] for record in records]), records)
+    writer.close(segments=[job_id])
+    return VectorIndex(directory)
+
+### S3
+
+def read_job_results(s3_client, bucket, job_id):
+    """Reads all results of a completed job from its shards."""
+    from result_store import results_prefix
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{results_prefix(job_id)}part-"):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []))
+    results = []
+    for key in sorted(keys):
+        data = gzip.decompress(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read())
+        results.extend(json.loads(line) for line in data.decode('utf-8').splitlines() if line)
+    return results
+
+def upload_index(s3_client, bucket, directory, prefix):
+    """Uploads an index directory; meta.json goes last, which marks the index as complete."""
+    for name in INDEX_FILES + ['meta.json']:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            s3_client.upload_file(path, bucket, f"{prefix}{name}")
+
+def download_index(s3_client, bucket, prefix, directory):
+    """Downloads an index (immutable once complete) unless it is already in `directory`."""
+    if not os.path.exists(os.path.join(directory, 'meta.json')):
+        partial = f"{directory}.partial"
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        for name in INDEX_FILES + ['meta.json']:
+            try:
+                s3_client.download_file(bucket, f"{prefix}{name}", os.path.join(partial, name))
+            except Exception:
+                if name not in ('centroids.f32', 'list_offsets.i8'):
+                    raise
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(partial, directory)
+    index = VectorIndex(directory)
+    index.prefix = prefix
+    return index
+
+def list_indexes(s3_client, bucket):
+    """
+    Returns:
+        tuple[str | None, list[str]]: The prefix of the latest complete base and the prefixes
+            of all complete segments.
+    """
+    bases = []
+    segments = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=SEARCH_PREFIX):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith('/meta.json'):
+                prefix = obj['Key'][:-len('meta.json')]
+                (bases if prefix.startswith(BASE_PREFIX) else segments).append(prefix)
+    return (max(bases) if bases else None), sorted(segments)
+
+def load_search_indexes(s3_client, bucket, cache_dir):
+    """
+    Downloads (or reuses from `cache_dir`) the latest base and the segments it does not cover.
+
+    Returns:
+        list[VectorIndex]: The indexes to search.
+    """
+    base, segments = list_indexes(s3_client, bucket)
+    indexes = []
+    covered = set()
+    if base:
+        index = download_index(s3_client, bucket, base, os.path.join(cache_dir, base.strip('/').replace('/', '_')))
+        indexes.append(index)
+        covered = set(index.segments)
+    for prefix in segments:
+        if prefix[len(SEGMENTS_PREFIX):].strip('/') in covered:
+            continue
+        indexes.append(download_index(s3_client, bucket, prefix,
+                                      os.path.join(cache_dir, prefix.strip('/').replace('/', '_'))))
+
+    # Drop local copies of indexes that have been compacted away
+    used = {os.path.basename(index.directory) for index in indexes}
+    for name in os.listdir(cache_dir):
+        if name not in used and not name.endswith('.partial'):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    return indexes
+
+def compact_search_index(s3_client, bucket, work_dir):
+    """
+    Merges the latest base and all segments it does not cover into a new base, then deletes
+    the merged segments and the previous bases.
+
+    Returns:
+        str | None: The prefix of the new base, or None if there was nothing to merge.
+    """
+    from work_distribution import delete_prefix
+
+    os.makedirs(work_dir, exist_ok=True)
+    indexes = load_search_indexes(s3_client, bucket, work_dir)
+    if len(indexes) < 2:
+        return None
+    segments = sorted({job_id for index in indexes for job_id in index.segments})
+    generation = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    prefix = f"{BASE_PREFIX}{generation}/"
+    merged_dir = os.path.join(work_dir, f"merged-{generation}")
+    merged = merge_indexes(indexes, merged_dir, segments=segments)
+    upload_index(s3_client, bucket, merged_dir, prefix)
+    logger.info(f"Compacted {len(indexes)} indexes ({merged.count} requirements) into {prefix}")
+
+    for index in indexes:
+        delete_prefix(s3_client, bucket, index.prefix)
+    shutil.rmtree(merged_dir, ignore_errors=True)
+    return prefix
@@ -0,0 +1,165 @@
+import bisect
+import hashlib
+import json
+import threading
+import time
+
+from alignment import normalize_with_map
+from aws_clients import get_table
+from datamodels import ConceptsModel
+from metrics import span
+from result_records import RequirementRecord
+
+"""
+Description:
+    Per-section result store for incremental re-processing of revised documents.
+
+    Results are keyed by the document lineage (all versions of one document share a documentId)
+    and a hash of the normalized section content plus the pipeline version. When a new version of
+    a document is processed, sections whose content did not change are copied from the store
+    (with their new XPath) instead of being sent to the LLM again.
+
+    Stored requirements do not contain the section XPath; it is stamped on when a result is reused,
+    because unchanged sections often move when clauses are inserted or removed. Their offsets are
+    stored in the normalized section text (see `alignment.normalize_with_map`) and mapped back to
+    the raw text of the reusing section, which may differ in whitespace.
+"""
+
+# Lifetime of stored section results in seconds (180 days)
+SECTION_STORE_TTL = 180 * 24 * 3600
+
+# Bump whenever the stored format changes, so entries of the old format are not reused
+SECTION_STORE_FORMAT = "2"
+
+def section_hash(section, pipeline_version):
+    """
+    Content hash of a section, insensitive to whitespace changes. The title is the one the
+    section is classified with, so with INCLUDE_PARENT_CONTEXT renaming an enclosing section
+    changes the hash.
+
+    Args:
+        section (XmlSection): The section.
+        pipeline_version (str): Identifies everything that influences the results (prompts,
+            pipeline mode, traversal, settings). Results of other versions are never reused.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    from app_main import classification_title
+    title = normalize_with_map(classification_title(section) or '')[0]
+    text = normalize_with_map(section.text)[0]
+    payload = f"{SECTION_STORE_FORMAT}\n{pipeline_version}\n{title}\x00{text}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def to_normalized_offsets(requirements, section_text):
+    """Returns copies of requirement dicts with offsets into the normalized section text."""
+    offsets = normalize_with_map(section_text)[1]
+    normalized = []
+    for req in requirements:
+        req = dict(req)
+        start, end = req.get('section_relative_start'), req.get('section_relative_end')
+        if start is not None and end is not None:
+            req['section_relative_start'] = bisect.bisect_left(offsets, start)
+            req['section_relative_end'] = bisect.bisect_left(offsets, end)
+        normalized.append(req)
+    return normalized
+
+def from_normalized_offsets(requirements, section_text):
+    """Maps offsets into the normalized section text back to `section_text` (in place)."""
+    offsets = normalize_with_map(section_text)[1]
+    for req in requirements:
+        start, end = req.get('section_relative_start'), req.get('section_relative_end')
+        if start is None or end is None:
+            continue
+        if 0 <= start < end <= len(offsets):
+            req['section_relative_start'] = offsets[start]
+            req['section_relative_end'] = offsets[end - 1] + 1
+        else:
+            req['section_relative_start'] = req['section_relative_end'] = None
+    return requirements
+
+def encode_section_result(requirements, definitions):
+    """Serializes a section result without its XPath."""
+    return json.dumps({
+        'requirements': [
+            {key: value for key, value in req.items() if key != 'section_xpath'}
+            for req in requirements
+        ],
+        'definitions': [concept.model_dump() for concept in definitions]
+    }, ensure_ascii=False)
+
+def decode_section_result(value, section_xpath):
+    """Restores a section result and stamps the (new) section XPath on its requirements."""
+    data = json.loads(value)
+    requirements = [RequirementRecord.from_dict(req, section_xpath=section_xpath) for req in data['requirements']]
+    definitions = [ConceptsModel(**concept) for concept in data['definitions']]
+    return requirements, definitions
+
+class SectionStore:
+    """
+    Base class of the section result stores. Subclasses implement `_get` and `_put` on
+    serialized results; this class keeps reuse statistics.
+    """
+
+    def __init__(self, document_id, pipeline_version):
+        self.document_id = document_id
+        self.pipeline_version = pipeline_version
+        self.stats = {'reused': 0, 'processed': 0}
+        self._stats_lock = threading.Lock()
+
+    def get(self, section):
+        """
+        Returns the stored (requirements, definitions) of a section, or None if its content is new.
+        """
+        with span('section_store'):
+            value = self._get(section_hash(section, self.pipeline_version))
+        with self._stats_lock:
+            self.stats['reused' if value is not None else 'processed'] += 1
+        if value is None:
+            return None
+        requirements, definitions = decode_section_result(value, section.xpath)
+        return from_normalized_offsets(requirements, section.text), definitions
+
+    def put(self, section, requirements, definitions):
+        """Stores the result of a processed section."""
+        with span('section_store'):
+            self._put(
+                section_hash(section, self.pipeline_version),
+                encode_section_result(to_normalized_offsets(requirements, section.text), definitions)
+            )
+
+class MemorySectionStore(SectionStore):
+    """In-process store for tests and local runs. Shared across instances by document id."""
+
+    _documents = {}
+    _lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            return self._documents.get(self.document_id, {}).get(key)
+
+    def _put(self, key, value):
+        with self._lock:
+            self._documents.setdefault(self.document_id, {})[key] = value
+
+class DynamoDBSectionStore(SectionStore):
+    """
+    Store backed by a DynamoDB table with partition key 'documentId' and sort key 'sectionHash'.
+    Items expire through DynamoDB TTL on the 'expiresAt' attribute.
+    """
+
+    def __init__(self, table_name, document_id, pipeline_version):
+        super().__init__(document_id, pipeline_version)
+        self._table = get_table(table_name)
+
+    def _get(self, key):
+        item = self._table.get_item(Key={'documentId': self.document_id, 'sectionHash': key}).get('Item')
+        return item['result'] if item else None
+
+    def _put(self, key, value):
+        self._table.put_item(Item={
+            'documentId': self.document_id,
+            'sectionHash': key,
+            'result': value,
+            'expiresAt': int(time.time() + SECTION_STORE_TTL)
+        })
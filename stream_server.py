@@ -0,0 +1,72 @@
+import json
+import os
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from handler_parse_sync import NDJSON_CONTENT_TYPE, iter_ndjson
+from metrics import start_job
+
+"""
+Description:
+    HTTP server streaming the results of POST /parse/sync as NDJSON with chunked transfer
+    encoding: each section record is sent as soon as it is ready, so the first bytes arrive
+    after roughly one section's latency instead of after the whole document.
+
+    The Python Lambda runtime cannot stream responses itself. In AWS the server runs behind the
+    Lambda Web Adapter (function parseSyncStream, a function URL in RESPONSE_STREAM mode, which
+    is not bound to the 30 s API Gateway timeout). Requests are served one at a time, as in a
+    Lambda execution environment (the job metrics are per process).
+
+Usage:
+    python stream_server.py
+    curl -N --data-binary @document.xml http://localhost:8080/parse/sync
+"""
+
+# Port the server listens on (the Lambda Web Adapter forwards requests to it)
+PORT = int(os.environ.get('PORT', '8080'))
+
+class ParseSyncStreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # Readiness check of the Lambda Web Adapter
+        self._send_text(200, "OK")
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/parse/sync':
+            self._send_text(404, "Not found")
+            return
+        xml_content = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not xml_content:
+            self._send_text(400, "Missing XML content in request body")
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', NDJSON_CONTENT_TYPE)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        job_metrics = start_job()
+        try:
+            for line in iter_ndjson(xml_content, job_metrics):
+                self._send_chunk(line)
+        except Exception as e:
+            # Headers are already sent: report the error as the last record
+            print(f"Error parsing XML synchronously: {e}")
+            self._send_chunk(json.dumps({'type': 'error', 'error': str(e)}) + "\n")
+        self.wfile.write(b"0\r\n\r\n")
+        job_metrics.emit({'Function': 'parseSyncStream'})
+
+    def _send_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_text(self, status, text):
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+if __name__ == "__main__":
+    HTTPServer(('0.0.0.0', PORT), ParseSyncStreamHandler).serve_forever()
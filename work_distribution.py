@@ -0,0 +1,424 @@
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import dedup
+import metrics
+from app_main import SECTION_CONCURRENCY, SECTION_TRAVERSAL, SectionResult, pack_sections, process_unit
+from glossary import Glossary, job_glossary, save_glossary
+from result_store import ShardWriter
+from section_store import decode_section_result, encode_section_result
+from xml_ingest import XmlSection, iter_sections
+
+"""
+Description:
+    Distributes the sections of one document across workers.
+
+    The coordinator (`parse_job`) streams the document and packs its sections into tasks (the work
+    units of `app_main.pack_sections`), which are dispatched through a work queue: SQS in AWS, a
+    thread or process pool locally (`LocalWorkQueue`). Each worker processes one task and stores its
+    section results; the job record counts the finished tasks. Whoever finishes the last task (a
+    worker, or the coordinator if all tasks are done before it has dispatched the last one) claims the
+    aggregation, which merges the task results in document order into the results shards of the job.
+
+    Task and task result objects live under `work/<jobId>/` in the uploads bucket and are deleted
+    once the job has been aggregated. Tasks too large for an SQS message are stored there as well
+    and the message only references them.
+
+    Job attributes used:
+        status       'processing' until the aggregation is claimed ('aggregating'), then 'complete',
+                     or 'failed' if the aggregation raised
+        tasksTotal   number of dispatched tasks, set once the whole document has been read
+        doneTasks    number set of the ids of the finished tasks (idempotent under redelivery)
+        sectionsDone number of sections processed so far
+        aggregationClaimedAt  epoch seconds of the latest aggregation claim (its lease)
+        aggregationFailedAt   epoch seconds of the latest failed aggregation
+
+    An aggregation that timed out (its lease of AGGREGATION_LEASE_SECONDS expired) or failed can be
+    claimed again; the task message of the aggregating worker is redelivered by SQS and retries it.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Tasks above this size (bytes) are stored in S3; SQS messages are limited to 256 KB
+MAX_MESSAGE_BYTES = 200 * 1024
+# Maximum number of failed sections listed on the job record
+MAX_FAILED_SECTIONS = 100
+# Seconds after which an unfinished aggregation may be claimed again (at least the Lambda timeout)
+AGGREGATION_LEASE_SECONDS = int(os.environ.get('AGGREGATION_LEASE_SECONDS', '900'))
+
+def work_prefix(job_id):
+    """S3 key prefix under which the tasks and task results of a job are stored."""
+    return f"work/{job_id}/"
+
+def delete_prefix(s3_client, bucket, prefix):
+    """Deletes all objects under an S3 key prefix."""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+        if keys:
+            s3_client.delete_objects(Bucket=bucket, Delete={'Objects': keys})
+
+def task_result_key(job_id, task_id):
+    return f"{work_prefix(job_id)}results/{task_id:06d}.json.gz"
+
+def encode_task(job_id, task_id, unit, mode=None):
+    """Serializes a work unit (list of XmlSection) as a task."""
+    return {
+        'jobId': job_id,
+        'taskId': task_id,
+        'mode': mode,
+        'sections': [
+            {'index': s.index, 'xpath': s.xpath, 'title': s.title, 'text': s.text, 'context': list(s.context)}
+            for s in unit
+        ]
+    }
+
+def decode_task_sections(task):
+    return [XmlSection(s['index'], s['xpath'], s['title'], s['text'], tuple(s['context']))
+            for s in task['sections']]
+
+def iter_tasks(source, job_id, mode=None, traversal=None):
+    """
+    Streams a document into tasks.
+
+    Args:
+        source (str | bytes | file-like): See `xml_ingest.open_source`.
+        job_id (str): The job the tasks belong to.
+        mode (str, optional): Pipeline mode, see `app_main.process_section`.
+        traversal (str, optional): Handling of nested sections, see `xml_ingest`.
+
+    Yields:
+        dict: Tasks with consecutive task ids, starting at 0.
+    """
+    sections = iter_sections(source, traversal=traversal or SECTION_TRAVERSAL)
+    for task_id, unit in enumerate(pack_sections(sections, mode=mode)):
+        yield encode_task(job_id, task_id, unit, mode)
+
+def run_task(task, section_store=None):
+    """
+    Processes one task.
+
+    Args:
+        task (dict): A task from `iter_tasks`.
+        section_store (SectionStore, optional): Unchanged sections are taken from the store;
+            processed sections are added to it.
+
+    Returns:
+        list[SectionResult]: Results per section of the task.
+    """
+    section_results = []
+    unit = []
+    for section in decode_task_sections(task):
+        stored = None
+        if section_store is not None:
+            try:
+                stored = section_store.get(section)
+            except Exception as e:
+                logger.warning(f"Error reading section store: {e}")
+        if stored is None:
+            unit.append(section)
+        else:
+            section_results.append(SectionResult(section, *stored))
+
+    if unit:
+        for section_result in process_unit(unit, task.get('mode')):
+            section_results.append(section_result)
+            if section_store is not None and section_result.error is None:
+                try:
+                    section_store.put(section_result.section, section_result.requirements,
+                                      section_result.definitions)
+                except Exception as e:
+                    logger.warning(f"Error writing section store: {e}")
+    return section_results
+
+def encode_task_result(section_results, task_metrics=None):
+    """
+    Serializes the results of a task (without section text) as gzip JSON.
+
+    Args:
+        section_results (list[SectionResult]): The section results of the task.
+        task_metrics (dict, optional): Metrics summary of the task (see `metrics.JobMetrics.summary`),
+            added to the job metrics by the aggregation.
+    """
+    return gzip.compress(json.dumps({
+        'sections': [
+            {
+                'index': r.section.index,
+                'xpath': r.section.xpath,
+                'title': r.section.title,
+                'result': encode_section_result(r.requirements, r.definitions),
+                'error': r.error
+            }
+            for r in section_results
+        ],
+        'metrics': task_metrics
+    }, ensure_ascii=False).encode('utf-8'))
+
+def decode_task_result(data):
+    """
+    Returns:
+        tuple[list[SectionResult], dict | None]: The section results and metrics summary of a task.
+    """
+    task_result = json.loads(gzip.decompress(data))
+    section_results = []
+    for entry in task_result['sections']:
+        section = XmlSection(entry['index'], entry['xpath'], entry['title'], "")
+        requirements, definitions = decode_section_result(entry['result'], entry['xpath'])
+        section_results.append(SectionResult(section, requirements, definitions, entry['error']))
+    return section_results, task_result.get('metrics')
+
+def merge_task_results(task_results):
+    """
+    Merges the results of all tasks of a document.
+
+    Args:
+        task_results (Iterable[list[SectionResult]]): Results of each task, in any order.
+
+    Returns:
+        list[SectionResult]: All section results in document order.
+    """
+    merged = [section_result for results in task_results for section_result in results]
+    merged.sort(key=lambda section_result: section_result.section.index)
+    return merged
+
+class LocalWorkQueue:
+    """
+    In-process stand-in for the SQS work queue. Tasks are processed as soon as they are sent,
+    by a thread pool or, with `processes=True`, by a pool of worker processes.
+
+    Usage:
+        with LocalWorkQueue() as queue:
+            for task in iter_tasks(source, job_id):
+                queue.send(task)
+            section_results = merge_task_results(queue.results())
+    """
+
+    def __init__(self, max_workers=None, processes=False):
+        max_workers = max_workers or SECTION_CONCURRENCY
+        self._executor = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=max_workers)
+        self._futures = []
+
+    def send(self, task):
+        self._futures.append(self._executor.submit(run_task, task))
+
+    def results(self):
+        """Waits for all tasks and returns their results, in task order."""
+        return [future.result() for future in self._futures]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._executor.shutdown()
+
+class SQSWorkQueue:
+    """
+    Work queue backed by SQS. Tasks above MAX_MESSAGE_BYTES are stored in S3 and the message
+    only carries a reference to them.
+    """
+
+    def __init__(self, sqs_client, queue_url, s3_client, bucket):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self._pending = []
+
+    def send(self, task):
+        body = json.dumps(task, ensure_ascii=False)
+        if len(body.encode('utf-8')) > MAX_MESSAGE_BYTES:
+            key = f"{work_prefix(task['jobId'])}tasks/{task['taskId']:06d}.json"
+            self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=body.encode('utf-8'))
+            body = json.dumps({'jobId': task['jobId'], 'taskId': task['taskId'], 'taskKey': key})
+        self._pending.append({'Id': str(task['taskId']), 'MessageBody': body})
+        if len(self._pending) == 10:
+            self.flush()
+
+    def flush(self):
+        """Sends the buffered messages (SQS batches hold at most 10)."""
+        if not self._pending:
+            return
+        response = self.sqs_client.send_message_batch(QueueUrl=self.queue_url, Entries=self._pending)
+        if response.get('Failed'):
+            raise RuntimeError(f"Could not enqueue tasks: {response['Failed']}")
+        self._pending = []
+
+    def load(self, body):
+        """Restores a task from a message body."""
+        task = json.loads(body)
+        if 'taskKey' in task:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=task['taskKey'])
+            task = json.loads(response['Body'].read())
+        return task
+
+def record_task_done(jobs_table, job_id, task_id, sections_done):
+    """
+    Marks a task as finished on the job record.
+
+    Returns:
+        bool: False if the task had already been recorded (redelivered message).
+    """
+    try:
+        jobs_table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression="ADD doneTasks :task, sectionsDone :sections",
+            ConditionExpression="attribute_not_exists(doneTasks) OR NOT contains(doneTasks, :taskId)",
+            ExpressionAttributeValues={
+                ':task': {task_id},
+                ':taskId': task_id,
+                ':sections': sections_done
+            }
+        )
+    except jobs_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+def claim_aggregation(jobs_table, job_id, now=None):
+    """
+    Moves a job from 'processing' to 'aggregating' once all its tasks are done. The claim is a
+    lease: an aggregation still 'aggregating' after AGGREGATION_LEASE_SECONDS (its Lambda timed
+    out), or one that failed, can be claimed again.
+
+    Args:
+        now (int, optional): Current epoch seconds.
+
+    Returns:
+        bool: True for the single caller that should aggregate the job.
+    """
+    now = int(time.time()) if now is None else now
+    try:
+        jobs_table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression="SET #s = :aggregating, aggregationClaimedAt = :now REMOVE aggregationFailedAt, #e",
+            ConditionExpression=("(#s = :processing AND size(doneTasks) = tasksTotal)"
+                                 " OR (#s = :aggregating AND aggregationClaimedAt < :expired)"
+                                 " OR (#s = :failed AND attribute_exists(aggregationFailedAt))"),
+            ExpressionAttributeNames={"#s": "status", "#e": "error"},
+            ExpressionAttributeValues={
+                ':aggregating': 'aggregating',
+                ':processing': 'processing',
+                ':failed': 'failed',
+                ':now': now,
+                ':expired': now - AGGREGATION_LEASE_SECONDS
+            }
+        )
+    except jobs_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+def run_aggregation(s3_client, bucket, jobs_table, job_id, tasks_total):
+    """
+    Aggregates a claimed job, see `aggregate_job`. If the aggregation raises, the job is marked
+    'failed' (and can be claimed again) and the error is re-raised, so the caller is retried.
+
+    Returns:
+        dict: The results manifest.
+    """
+    try:
+        return aggregate_job(s3_client, bucket, jobs_table, job_id, tasks_total)
+    except Exception as e:
+        logger.error(f"Aggregation of job {job_id} failed: {e}")
+        jobs_table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression="SET #s = :status, #e = :error, aggregationFailedAt = :now",
+            ExpressionAttributeNames={"#s": "status", "#e": "error"},
+            ExpressionAttributeValues={
+                ':status': 'failed',
+                ':error': f"Aggregation failed: {e}",
+                ':now': int(time.time())
+            }
+        )
+        raise
+
+def aggregate_job(s3_client, bucket, jobs_table, job_id, tasks_total):
+    """
+    Merges the task results of a job in document order into its results shards, completes the
+    job record (with the metrics of all tasks and of the aggregation) and deletes the work objects.
+
+    Returns:
+        dict: The results manifest.
+    """
+    task_results = []
+    task_metrics = []
+    for task_id in range(tasks_total):
+        response = s3_client.get_object(Bucket=bucket, Key=task_result_key(job_id, task_id))
+        section_results, summary = decode_task_result(response['Body'].read())
+        task_results.append(section_results)
+        task_metrics.append(summary)
+    job = jobs_table.get_item(Key={'jobId': job_id}).get('Item') or {}
+    manifest = complete_job(s3_client, bucket, jobs_table, job_id, merge_task_results(task_results),
+                            glossary=job_glossary(s3_client, bucket, job),
+                            job_metrics=metrics.current().to_item(previous=metrics.merge_summaries(*task_metrics)))
+
+    # Work objects are only needed until the job has been aggregated
+    delete_prefix(s3_client, bucket, work_prefix(job_id))
+    return manifest
+
+def complete_job(s3_client, bucket, jobs_table, job_id, section_results, glossary=None, job_metrics=None):
+    """
+    Writes the results shards of a job from all its section results and completes the job record.
+    Requirements are linked to the defined terms (see `glossary`) and, with a dedup store
+    configured, annotated with their near-duplicate clusters (see `dedup`).
+
+    Args:
+        section_results (list[SectionResult]): All section results, in document order.
+        glossary (Glossary, optional): Seed glossary, see `glossary.job_glossary`.
+        job_metrics (dict, optional): Job metrics stored on the record as 'metrics', see
+            `metrics.JobMetrics.to_item`.
+
+    Returns:
+        dict: The results manifest.
+    """
+    writer = ShardWriter(s3_client, bucket, job_id)
+    glossary = glossary if glossary is not None else Glossary()
+    deduplicator = dedup.Deduplicator(dedup.dedup_store, job_id) if dedup.dedup_store else None
+    failed_sections = []
+    for section_result in section_results:
+        glossary.link(section_result)
+        if deduplicator:
+            deduplicator.annotate(section_result.requirements, writer.count)
+        for requirement in section_result.requirements:
+            writer.add(requirement)
+        if section_result.error is not None:
+            failed_sections.append({'section_xpath': section_result.section.xpath, 'error': section_result.error})
+    manifest = writer.close()
+    manifest['glossary'] = save_glossary(s3_client, bucket, job_id, glossary)
+
+    update_expression = ("SET #s = :status, resultsManifest = :manifest, resultsCount = :count, "
+                         "sectionsTotal = :sections, sectionsDone = :sections, failedSections = :failed, "
+                         "failedSectionsCount = :failedCount")
+    values = {
+        ':status': 'complete',
+        ':manifest': manifest,
+        ':count': manifest['total'],
+        ':sections': len(section_results),
+        ':failed': failed_sections[:MAX_FAILED_SECTIONS],
+        ':failedCount': len(failed_sections)
+    }
+    if job_metrics is not None:
+        update_expression += ", metrics = :metrics"
+        values[':metrics'] = job_metrics
+    jobs_table.update_item(
+        Key={'jobId': job_id},
+        UpdateExpression=update_expression,
+        ExpressionAttributeNames={"#s": "status"},
+        ExpressionAttributeValues=values
+    )
+    return manifest
+
+def extract_requirements_distributed(source, max_workers=None, processes=False, mode=None, traversal=None):
+    """
+    Local equivalent of the distributed pipeline: tasks are processed by a `LocalWorkQueue` and
+    merged in document order.
+
+    Returns:
+        list[SectionResult]: All section results in document order.
+    """
+    with LocalWorkQueue(max_workers=max_workers, processes=processes) as queue:
+        for task in iter_tasks(source, 'local', mode=mode, traversal=traversal):
+            queue.send(task)
+        return merge_task_results(queue.results())
@@ -0,0 +1,167 @@
+import io
+import os
+from typing import NamedTuple
+
+from lxml import etree
+
+"""
+Description:
+    Streaming ingestion of XML documents. Sections are emitted one by one while the document
+    is being parsed with `lxml.etree.iterparse`, and processed subtrees are freed, so memory
+    stays flat for very large publications and processing can start before the whole file
+    has been read (e.g. while an S3 object is still downloading).
+
+    XPaths are built while parsing. Because following siblings are not known yet when a section
+    is emitted, every step carries its position (e.g. `/doc/section[1]/section[2]`), which is
+    a valid, unambiguous XPath for the same element.
+
+    Nested sections can be read in two ways:
+    - "full": a section's text includes the text of all its nested sections (as `itertext()`).
+    - "own": a section's text only includes the text it owns directly; nested sections are
+      emitted on their own. No clause text is sent to the LLM more than once.
+"""
+
+class XmlSection(NamedTuple):
+    index: int    # position of the section in document order (start tags), starting at 0
+    xpath: str    # XPath of the <section> element
+    title: str    # text of its first <title>, or an empty string
+    text: str     # text of the section (see "full" and "own" traversal above)
+    context: tuple = ()  # titles of the enclosing sections, outermost first
+
+def open_source(source):
+    """
+    Normalizes the supported inputs into something `iterparse` can read.
+
+    Args:
+        source (str | os.PathLike | bytes | file-like): A file path, XML content as a string or
+            bytes, or a binary stream such as an open file or an S3 `StreamingBody`.
+
+    Returns:
+        tuple[str | file-like, str | None]: The iterparse source and an encoding override.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source), None
+    if isinstance(source, str):
+        # A byte order mark (e.g. from a file decoded as UTF-8) or leading whitespace would
+        # otherwise make XML content look like a path, and is not allowed before the declaration
+        content = source.lstrip().lstrip('\ufeff').lstrip()
+        if content.startswith('<'):
+            # XML content received as text, e.g. an API Gateway request body
+            return io.BytesIO(content.encode('utf-8')), 'utf-8'
+        return source, None
+    if isinstance(source, os.PathLike):
+        return os.fspath(source), None
+    if hasattr(source, 'read'):
+        return source, None
+    raise TypeError(f"Unsupported XML source: {type(source).__name__}")
+
+def _step_name(elem):
+    qname = etree.QName(elem)
+    return f"{elem.prefix}:{qname.localname}" if elem.prefix else qname.localname
+
+def _iter_own_text(elem, tag):
+    """Yields the text pieces of `elem`, skipping nested `tag` elements but keeping their tails."""
+    if elem.text:
+        yield elem.text
+    for child in elem:
+        if isinstance(child.tag, str) and etree.QName(child).localname != tag:
+            yield from _iter_own_text(child, tag)
+        if child.tail:
+            yield child.tail
+
+def _find_own_title(elem, tag):
+    """Returns the first <title> of `elem` that is not inside a nested `tag` element."""
+    for child in elem:
+        if not isinstance(child.tag, str):
+            continue
+        name = etree.QName(child).localname
+        if name == 'title':
+            return child
+        if name != tag:
+            title_node = _find_own_title(child, tag)
+            if title_node is not None:
+                return title_node
+    return None
+
+def iter_sections(source, tag='section', traversal='full'):
+    """
+    Yields the <section> elements of an XML document as soon as they have been parsed.
+
+    Sections are emitted at their end tag, i.e. leaf-first: nested sections come before the
+    section that contains them. Use `XmlSection.index` to restore document order.
+
+    Args:
+        source (str | os.PathLike | bytes | file-like): See `open_source`.
+        tag (str, optional): Local name of the elements to emit. Defaults to 'section'.
+        traversal (str, optional): "full" or "own", see the module description. Defaults to "full".
+
+    Yields:
+        XmlSection: One record per section.
+    """
+    xml_source, encoding = open_source(source)
+    context = etree.iterparse(
+        xml_source,
+        events=('start', 'end'),
+        recover=True,
+        huge_tree=True,
+        encoding=encoding
+    )
+
+    # Stack of [xpath, child tag counters] for the currently open elements
+    path = []
+    # Start-order indices and titles of the currently open sections
+    open_sections = []
+    open_titles = []
+    next_index = 0
+    own = traversal == 'own'
+    if traversal not in ('full', 'own'):
+        raise ValueError(f"Unknown section traversal: '{traversal}'")
+
+    for event, elem in context:
+        if not isinstance(elem.tag, str):
+            continue  # comments and processing instructions
+
+        if event == 'start':
+            name = _step_name(elem)
+            if path:
+                counters = path[-1][1]
+                counters[name] = counters.get(name, 0) + 1
+                xpath = f"{path[-1][0]}/{name}[{counters[name]}]"
+            else:
+                xpath = f"/{name}"
+            path.append([xpath, {}])
+            if etree.QName(elem).localname == tag:
+                open_sections.append(next_index)
+                open_titles.append(None)
+                next_index += 1
+            continue
+
+        xpath = path.pop()[0]
+        name = etree.QName(elem).localname
+        if name == 'title' and open_titles and open_titles[-1] is None:
+            # First title inside the innermost open section, used as context for nested sections
+            open_titles[-1] = elem.text.strip() if elem.text else ""
+        if name == tag:
+            if own:
+                title_node = _find_own_title(elem, tag)
+                text = " ".join(_iter_own_text(elem, tag)).strip()
+            else:
+                title_node = elem.find('.//{*}title')
+                text = " ".join(elem.itertext()).strip()
+            title = title_node.text.strip() if title_node is not None and title_node.text else ""
+            open_titles.pop()
+            ancestor_titles = tuple(ancestor_title or "" for ancestor_title in open_titles)
+            yield XmlSection(open_sections.pop(), xpath, title, text, ancestor_titles)
+            if own:
+                # Enclosing sections do not need the text of this one
+                elem.clear(keep_tail=True)
+
+        # Free processed subtrees, unless an enclosing section still needs their text
+        if not open_sections:
+            elem.clear(keep_tail=True)
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+    del context